@@ -0,0 +1,278 @@
+# arxiv_cache.py - Size-bounded, persistent cache for arXiv API results
+import os
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_CACHE_PATH = Path(__file__).parent / "cache" / "arxiv_cache.sqlite3"
+
+
+class ArxivCacheBackend(ABC):
+    """Base class for arXiv result caches.
+
+    Backends store JSON-serialisable dicts under string keys. Entries are
+    fresh for `ttl` seconds, then kept as stale for another `stale_ttl` seconds
+    so they can be served while a refresh runs (or while arXiv is down).
+    Least-recently-used entries are evicted once either `max_entries` or
+    `max_bytes` is exceeded.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 600,
+        stale_ttl: float = 7 * 24 * 3600,
+        max_entries: int = 1000,
+        max_bytes: int = 50 * 1024 * 1024,
+    ):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._counter_lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return the cached value for key, or None if missing or expired"""
+        found = self._lookup(key)
+        if found is None or found[1] >= self.ttl:
+            self._record("miss")
+            return None
+        self._record("hit")
+        return found[0]
+
+    def get_with_staleness(self, key: str) -> Optional[tuple[dict, bool]]:
+        """Return (value, is_stale) for key, including expired-but-kept entries"""
+        found = self._lookup(key)
+        if found is None:
+            self._record("miss")
+            return None
+        stale = found[1] >= self.ttl
+        self._record("stale" if stale else "hit")
+        return found[0], stale
+
+    @abstractmethod
+    def _lookup(self, key: str) -> Optional[tuple[dict, float]]:
+        """Return (value, age_seconds), dropping entries past the stale window"""
+
+    @abstractmethod
+    def set(self, key: str, data: dict) -> None:
+        """Store data under key and evict old entries if over the limits"""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove every entry from the cache"""
+
+    @abstractmethod
+    def _usage(self) -> tuple[int, int]:
+        """Return (entry_count, total_bytes) currently stored"""
+
+    def _record(self, outcome: str) -> None:
+        with self._counter_lock:
+            if outcome == "hit":
+                self.hits += 1
+            elif outcome == "stale":
+                self.stale_hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current usage for monitoring"""
+        entries, size = self._usage()
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "backend": type(self).__name__,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "stale_ttl": self.stale_ttl,
+        }
+
+
+class MemoryCacheBackend(ArxivCacheBackend):
+    """Process-local LRU cache (useful for tests and read-only filesystems)"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._entries: OrderedDict = OrderedDict()  # key -> (payload, size, created)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _lookup(self, key: str) -> Optional[tuple[dict, float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            age = time.time() - entry[2]
+            if age >= self.ttl + self.stale_ttl:
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+        return json.loads(entry[0]), age
+
+    def set(self, key: str, data: dict) -> None:
+        payload = json.dumps(data)
+        size = len(payload.encode())
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (payload, size, time.time())
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _drop(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _usage(self) -> tuple[int, int]:
+        with self._lock:
+            return len(self._entries), self._bytes
+
+
+class SQLiteCacheBackend(ArxivCacheBackend):
+    """On-disk LRU cache shared by every worker process on the host"""
+
+    def __init__(self, path: Path = DEFAULT_CACHE_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # One connection per process, guarded by a lock; SQLite's file locking
+        # takes care of concurrent access from other uvicorn workers.
+        self._conn = sqlite3.connect(str(self.path), timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)")
+
+    def _lookup(self, key: str) -> Optional[tuple[dict, float]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] >= self.ttl + self.stale_ttl:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+        return json.loads(row[0]), now - row[1]
+
+    def set(self, key: str, data: dict) -> None:
+        payload = json.dumps(data)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload.encode()), now, now),
+            )
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+
+    def _evict(self) -> None:
+        """Delete least-recently-accessed rows until both limits hold (lock held)"""
+        count, size = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        if count <= self.max_entries and size <= self.max_bytes:
+            return
+
+        victims = []
+        for key, entry_size in self._conn.execute("SELECT key, size FROM entries ORDER BY accessed ASC"):
+            if count <= self.max_entries and size <= self.max_bytes:
+                break
+            victims.append((key,))
+            count -= 1
+            size -= entry_size
+
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+        self.evictions += len(victims)
+
+    def _usage(self) -> tuple[int, int]:
+        with self._lock:
+            count, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        return count, size
+
+
+# Global instance - lazy initialization
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ArxivCacheBackend:
+    """Get or create the configured arXiv cache backend.
+
+    Configured through the environment:
+        ARXIV_CACHE_BACKEND      "sqlite" (default) or "memory"
+        ARXIV_CACHE_PATH         SQLite file location
+        ARXIV_CACHE_TTL          Entry lifetime in seconds (default 600)
+        ARXIV_CACHE_STALE_TTL    How long expired entries stay servable (default 7 days)
+        ARXIV_CACHE_MAX_ENTRIES  Entry count limit (default 1000)
+        ARXIV_CACHE_MAX_BYTES    Total payload size limit (default 50MB)
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            options = {
+                "ttl": float(os.getenv("ARXIV_CACHE_TTL", "600")),
+                "stale_ttl": float(os.getenv("ARXIV_CACHE_STALE_TTL", str(7 * 24 * 3600))),
+                "max_entries": int(os.getenv("ARXIV_CACHE_MAX_ENTRIES", "1000")),
+                "max_bytes": int(os.getenv("ARXIV_CACHE_MAX_BYTES", str(50 * 1024 * 1024))),
+            }
+            backend = os.getenv("ARXIV_CACHE_BACKEND", "sqlite").lower()
+            if backend == "memory":
+                _cache = MemoryCacheBackend(**options)
+            else:
+                path = Path(os.getenv("ARXIV_CACHE_PATH", str(DEFAULT_CACHE_PATH)))
+                try:
+                    _cache = SQLiteCacheBackend(path=path, **options)
+                except (sqlite3.Error, OSError) as e:
+                    print(f"WARNING: Could not open arXiv cache at {path} ({e}), using in-memory cache")
+                    _cache = MemoryCacheBackend(**options)
+            print(f"[CACHE] arXiv cache backend: {type(_cache).__name__}")
+        return _cache
+
+
+def set_cache(cache: Optional[ArxivCacheBackend]) -> None:
+    """Replace the global cache backend (pass None to rebuild from environment)"""
+    global _cache
+    with _cache_lock:
+        _cache = cache
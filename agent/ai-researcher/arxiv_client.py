@@ -0,0 +1,208 @@
+# arxiv_client.py - asyncio-native arXiv API client with connection pooling
+import asyncio
+import os
+import weakref
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+from arxiv_cache import get_cache
+from arxiv_index import index_entries
+from arxiv_tool import (
+    ARXIV_SEARCH_MODE,
+    ARXIV_TIMEOUT,
+    MAX_ID_LIST,
+    _id_list_url,
+    _id_lookup_result,
+    _is_upstream_failure,
+    _local_answer,
+    _local_fallback,
+    _normalize_query,
+    _plan_id_lookup,
+    _save_to_cache,
+    _search_cache_key,
+    _search_url,
+    _store_id_entries,
+    _use_stale_ids,
+    arxiv_breaker,
+    parse_arxiv_xml,
+)
+
+
+class AsyncArxivClient:
+    """Pooled arXiv client that coalesces identical in-flight requests.
+
+    Every request goes through one keep-alive `httpx.AsyncClient`. Concurrent
+    callers asking for the same cache key await the same upstream request
+    ("single-flight") and all receive its parsed `{"entries": [...]}` result.
+    Cache and local-index reads and writes are SQLite calls, so they run in
+    worker threads and never block the event loop.
+    """
+
+    def __init__(
+        self,
+        timeout: float = ARXIV_TIMEOUT,
+        max_connections: int = 10,
+        max_keepalive_connections: int = 5,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self._http = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+            ),
+            transport=transport,
+        )
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._background: set[asyncio.Task] = set()
+        self.upstream_requests = 0
+        self.coalesced_requests = 0
+
+    async def search(self, topic: str, max_results: int = 5, mode: Optional[str] = None) -> dict:
+        """Search arXiv, answering from the cache, the local index or a shared in-flight request"""
+        mode = mode or ARXIV_SEARCH_MODE
+        query = _normalize_query(topic)
+        cache_key = _search_cache_key(query, max_results)
+
+        cached = await asyncio.to_thread(get_cache().get_with_staleness, cache_key)
+        if cached and not cached[1]:
+            print(f"[CACHE] Using cached arXiv results for: {topic}")
+            return cached[0]
+
+        def store(xml_content: str) -> dict:
+            data = parse_arxiv_xml(xml_content)
+            _save_to_cache(cache_key, data)
+            index_entries(data["entries"])
+            return data
+
+        async def fetch() -> dict:
+            return await asyncio.to_thread(store, await self.fetch_text(_search_url(query, max_results)))
+
+        local_result = await asyncio.to_thread(_local_answer, query, max_results, mode)
+        if local_result is not None:
+            if mode == "local_first":
+                self._spawn(self._single_flight(cache_key, fetch))
+            return local_result
+
+        if cached:
+            # Stale-while-revalidate: answer now, refresh (once per key) in the background
+            print(f"[CACHE] Serving stale arXiv results for: {topic} (refreshing in background)")
+            self._spawn(self._single_flight(cache_key, fetch))
+            return cached[0]
+
+        try:
+            return await self._single_flight(cache_key, fetch)
+        except Exception as e:
+            return await asyncio.to_thread(_local_fallback, query, max_results, e)
+
+    async def lookup_ids(self, ids: list[str]) -> dict:
+        """Fetch metadata for arXiv IDs, only requesting the ones not cached"""
+        normalized, found, missing, stale = await asyncio.to_thread(_plan_id_lookup, ids)
+        if len(found):
+            print(f"[CACHE] {len(found)}/{len(normalized)} arXiv IDs served from cache")
+
+        batches = [missing[i:i + MAX_ID_LIST] for i in range(0, len(missing), MAX_ID_LIST)]
+
+        async def fetch(batch: list[str]) -> dict:
+            batch_found = {}
+            xml_content = await self.fetch_text(_id_list_url(batch))
+            await asyncio.to_thread(_store_id_entries, batch, xml_content, batch_found)
+            return batch_found
+
+        results = await asyncio.gather(*(
+            self._single_flight(f"ids:{','.join(batch)}", lambda batch=batch: fetch(batch))
+            for batch in batches
+        ), return_exceptions=True)
+        for batch, batch_found in zip(batches, results):
+            if isinstance(batch_found, Exception):
+                _use_stale_ids(batch, stale, found, batch_found)
+            else:
+                found.update(batch_found)
+
+        return _id_lookup_result(normalized, found)
+
+    async def fetch_text(self, url: str) -> str:
+        """GET an arXiv API URL through the circuit breaker and return the Atom body"""
+        probe = arxiv_breaker.check()
+        self.upstream_requests += 1
+        print(f"[API] Making request to arXiv API: {url}")
+        try:
+            try:
+                resp = await self._http.get(url)
+            except httpx.HTTPError:
+                arxiv_breaker.record_failure()
+                raise
+
+            if _is_upstream_failure(resp.status_code):
+                arxiv_breaker.record_failure()
+            else:
+                arxiv_breaker.record_success()
+        finally:
+            # A cancelled probe must not leave the breaker stuck half-open
+            if probe:
+                arxiv_breaker.release_probe()
+
+        if resp.status_code >= 400:
+            print(f"ArXiv API request failed: {resp.status_code} - {resp.text}")
+            raise ValueError(f"Bad response from arXiv API: {resp}\n{resp.text}")
+        return resp.text
+
+    async def _single_flight(self, key: str, factory: Callable[[], Awaitable[dict]]) -> dict:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced_requests += 1
+            print(f"[API] Joining in-flight arXiv request for key {key}")
+        # Shield so one cancelled caller does not cancel the request for the others
+        return await asyncio.shield(task)
+
+    def _spawn(self, coro: Awaitable) -> None:
+        """Run a background refresh, keeping a reference until it finishes"""
+        async def run():
+            try:
+                await coro
+            except Exception as e:
+                print(f"WARNING: Background arXiv refresh failed: {e}")
+
+        task = asyncio.ensure_future(run())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def stats(self) -> dict:
+        return {
+            "upstream_requests": self.upstream_requests,
+            "coalesced_requests": self.coalesced_requests,
+            "inflight": len(self._inflight),
+            "background_refreshes": len(self._background),
+            "breaker": arxiv_breaker.stats(),
+        }
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+
+# One client per event loop - httpx connection pools cannot be shared across loops
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncArxivClient]" = weakref.WeakKeyDictionary()
+
+
+def get_arxiv_client() -> AsyncArxivClient:
+    """Get or create the arXiv client for the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = AsyncArxivClient(
+            max_connections=int(os.getenv("ARXIV_MAX_CONNECTIONS", "10")),
+        )
+        _clients[loop] = client
+    return client
+
+
+async def close_arxiv_client() -> None:
+    """Close the client bound to the running event loop, if any"""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
@@ -0,0 +1,134 @@
+# arxiv_harvest.py - Paginated bulk harvesting of arXiv search results
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from arxiv_client import get_arxiv_client
+from arxiv_index import index_entries
+from arxiv_tool import _normalize_query, _search_url, iter_arxiv_entries
+
+# arXiv asks API clients to wait 3 seconds between successive calls and caps
+# a single query at 2000 results per page / 30000 results overall.
+ARXIV_POLITE_DELAY = float(os.getenv("ARXIV_POLITE_DELAY", "3"))
+MAX_PAGE_SIZE = 2000
+MAX_HARVEST_RESULTS = 30000
+DEFAULT_SCHEDULE_PATH = Path(__file__).parent / "cache" / "arxiv_schedule.sqlite3"
+
+
+class PoliteScheduler:
+    """Spaces out upstream requests so they start at least `delay` seconds apart.
+
+    Each caller reserves the next free slot and sleeps until it comes up. With
+    a `path` the slots are kept in SQLite, so every uvicorn worker on the host
+    shares one request rate; without one the spacing only covers this process.
+    """
+
+    def __init__(self, delay: float = ARXIV_POLITE_DELAY, path: Optional[Path] = None):
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        self._conn = None
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(path), timeout=10, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS slots (name TEXT PRIMARY KEY, next_slot REAL NOT NULL)")
+
+    def _reserve(self) -> float:
+        """Claim the next request slot and return how long to wait for it"""
+        now = time.time()
+        with self._lock:
+            if self._conn is None:
+                slot = max(now, self._next_slot)
+                self._next_slot = slot + self.delay
+                return slot - now
+            # BEGIN IMMEDIATE takes the write lock, so two workers never get the same slot
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT next_slot FROM slots WHERE name = 'arxiv'").fetchone()
+                slot = max(now, row[0] if row else 0.0)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO slots (name, next_slot) VALUES ('arxiv', ?)", (slot + self.delay,)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return slot - now
+
+    async def wait_turn(self) -> None:
+        wait = await asyncio.to_thread(self._reserve)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+# Global instance - lazy initialization
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> PoliteScheduler:
+    """Get or create the polite-delay scheduler shared by every worker on the host
+
+    ARXIV_SCHEDULE_PATH sets the SQLite file; if it cannot be opened the
+    spacing falls back to this process only.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            path = Path(os.getenv("ARXIV_SCHEDULE_PATH", str(DEFAULT_SCHEDULE_PATH)))
+            try:
+                _scheduler = PoliteScheduler(path=path)
+            except (sqlite3.Error, OSError) as e:
+                print(f"WARNING: arXiv request schedule unavailable at {path}, spacing per process: {e}")
+                _scheduler = PoliteScheduler()
+        return _scheduler
+
+
+async def harvest_arxiv(topic: str, max_results: int = 1000, page_size: int = 200, start: int = 0) -> AsyncIterator[dict]:
+    """Page through arXiv search results and yield entries one at a time.
+
+    Only one page is held in memory at a time, so memory use does not grow
+    with `max_results`. Pages are not written to the result cache, but their
+    entries are added to the local search index.
+
+    Args:
+        topic: Free-text topic, same syntax as search_arxiv_papers
+        max_results: Total number of entries to yield at most
+        page_size: Entries requested per upstream call
+        start: Offset of the first result (must not be negative)
+    """
+    if start < 0:
+        raise ValueError(f"start must not be negative, got {start}")
+    query = _normalize_query(topic)
+    max_results = max(0, min(max_results, MAX_HARVEST_RESULTS - start))
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    client = get_arxiv_client()
+    scheduler = get_scheduler()
+
+    harvested = 0
+    offset = start
+    while harvested < max_results:
+        batch = min(page_size, max_results - harvested)
+        await scheduler.wait_turn()
+        page = await client.fetch_text(_search_url(query, batch, start=offset))
+
+        page_entries = []
+        for entry in iter_arxiv_entries(page):
+            page_entries.append(entry)
+            yield entry
+        del page
+        # Feed the local index one page at a time
+        await asyncio.to_thread(index_entries, page_entries)
+        received = len(page_entries)
+        harvested += received
+        offset += received
+        print(f"[HARVEST] {topic}: {harvested}/{max_results} entries")
+
+        # A short page means the result set is exhausted
+        if received < batch:
+            break
@@ -0,0 +1,165 @@
+# arxiv_index.py - Local BM25 index over arXiv metadata we have already seen
+import os
+import json
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterable, Optional
+
+DEFAULT_INDEX_PATH = Path(__file__).parent / "cache" / "arxiv_index.sqlite3"
+
+# Relative BM25 weights of the indexed columns: title, summary, authors, categories
+COLUMN_WEIGHTS = (3.0, 1.0, 1.5, 0.5)
+
+_TOKEN_RE = re.compile(r"[A-Za-z0-9]+")
+
+# Words so common in queries and abstracts that matching them says nothing about relevance
+STOPWORDS = frozenset("""
+a about an and are as at based be between by can do does for from how in into is it its
+new of on or over paper papers recent study survey that the their this to towards using via
+what when which with
+""".split())
+
+
+def key_terms(topic: str) -> list[str]:
+    """Distinct lowercase query tokens without stopwords (all tokens if only stopwords remain)"""
+    tokens = [token.lower() for token in _TOKEN_RE.findall(topic.replace("+", " "))]
+    terms = [token for token in tokens if token not in STOPWORDS] or tokens
+    return list(dict.fromkeys(terms))
+
+
+class ArxivIndex:
+    """Full-text index of arXiv entries backed by SQLite FTS5.
+
+    FTS5 ranks matches with BM25, so topical queries are answered locally in
+    milliseconds. The index lives on disk next to the result cache and is
+    shared by every worker process.
+    """
+
+    def __init__(self, path: Path = DEFAULT_INDEX_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS papers (
+                rowid INTEGER PRIMARY KEY,
+                paper_key TEXT UNIQUE NOT NULL,
+                data TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(title, summary, authors, categories)"
+        )
+
+    @staticmethod
+    def _paper_key(entry: dict) -> Optional[str]:
+        # Index papers by their version-less arXiv ID so new versions replace old ones
+        if entry.get("id"):
+            return re.sub(r"v\d+$", "", entry["id"])
+        return entry.get("pdf") or entry.get("title")
+
+    def add_entries(self, entries: Iterable[dict]) -> int:
+        """Insert or update entries, returning how many were written"""
+        written = 0
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for entry in entries:
+                    key = self._paper_key(entry)
+                    if not key:
+                        continue
+                    fields = (
+                        entry.get("title") or "",
+                        entry.get("summary") or "",
+                        " ".join(a for a in entry.get("authors") or [] if a),
+                        " ".join(c for c in entry.get("categories") or [] if c),
+                    )
+                    row = self._conn.execute("SELECT rowid FROM papers WHERE paper_key = ?", (key,)).fetchone()
+                    if row is None:
+                        rowid = self._conn.execute(
+                            "INSERT INTO papers (paper_key, data) VALUES (?, ?)", (key, json.dumps(entry))
+                        ).lastrowid
+                    else:
+                        rowid = row[0]
+                        self._conn.execute("UPDATE papers SET data = ? WHERE rowid = ?", (json.dumps(entry), rowid))
+                        self._conn.execute("DELETE FROM papers_fts WHERE rowid = ?", (rowid,))
+                    self._conn.execute(
+                        "INSERT INTO papers_fts (rowid, title, summary, authors, categories) VALUES (?, ?, ?, ?, ?)",
+                        (rowid, *fields),
+                    )
+                    written += 1
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return written
+
+    def search_scored(self, topic: str, limit: int = 5, require_all: bool = False) -> list[tuple[dict, float]]:
+        """Return up to `limit` (entry, score) pairs, best first.
+
+        The score is the weighted BM25 relevance (higher is better). With
+        require_all, an entry must match every key term of the topic rather
+        than any of them.
+        """
+        terms = key_terms(topic)
+        if not terms:
+            return []
+        # Quote each term so FTS5 operators in user text are taken literally
+        match = (" AND " if require_all else " OR ").join(f'"{term}"' for term in terms)
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                SELECT papers.data, -bm25(papers_fts, {', '.join(str(w) for w in COLUMN_WEIGHTS)}) AS score
+                FROM papers_fts
+                JOIN papers ON papers.rowid = papers_fts.rowid
+                WHERE papers_fts MATCH ?
+                ORDER BY score DESC
+                LIMIT ?
+                """,
+                (match, limit),
+            ).fetchall()
+        return [(json.loads(data), score) for data, score in rows]
+
+    def search(self, topic: str, limit: int = 5, require_all: bool = False, min_score: float = 0.0) -> list[dict]:
+        """Return up to `limit` entries ranked by BM25 relevance to topic, dropping those below min_score"""
+        return [entry for entry, score in self.search_scored(topic, limit, require_all) if score >= min_score]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+
+
+# Global instance - lazy initialization
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> Optional[ArxivIndex]:
+    """Get or create the local arXiv index (None if it cannot be opened)"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            path = Path(os.getenv("ARXIV_INDEX_PATH", str(DEFAULT_INDEX_PATH)))
+            try:
+                _index = ArxivIndex(path)
+            except (sqlite3.Error, OSError) as e:
+                print(f"WARNING: Local arXiv index unavailable at {path}: {e}")
+                return None
+        return _index
+
+
+def index_entries(entries: Iterable[dict]) -> None:
+    """Add parsed arXiv entries to the local index, never failing the caller"""
+    index = get_index()
+    if index is None:
+        return
+    try:
+        index.add_entries(entries)
+    except sqlite3.Error as e:
+        print(f"WARNING: Failed to index arXiv entries: {e}")
@@ -1,107 +1,415 @@
 # Step1: Access arXiv using URL
 import requests
 import hashlib
-import time
+import os
+import re
+import threading
+from typing import Optional
 
+from arxiv_cache import get_cache
+from arxiv_index import get_index, index_entries
+from circuit_breaker import CircuitBreaker, CircuitOpenError
 
-def search_arxiv_papers(topic: str, max_results: int = 5) -> dict:
+
+ARXIV_API_URL = os.getenv("ARXIV_API_URL", "http://export.arxiv.org/api/query")
+ARXIV_TIMEOUT = float(os.getenv("ARXIV_TIMEOUT", "15"))
+
+# How searches use the local BM25 index (arxiv_index.py):
+#   upstream     - always query arXiv (the index is still populated)
+#   local_first  - answer from the index when it has enough confident hits, refresh upstream in the background
+#   local_only   - never leave the box
+ARXIV_SEARCH_MODE = os.getenv("ARXIV_SEARCH_MODE", "upstream")
+# local_first only skips arXiv when every result matches all key terms with at least this BM25 score
+ARXIV_LOCAL_MIN_SCORE = float(os.getenv("ARXIV_LOCAL_MIN_SCORE", "1.0"))
+SEARCH_MODES = ("upstream", "local_first", "local_only")
+
+# Shared keep-alive session for the synchronous code path
+_session = requests.Session()
+
+# Shared by the sync and async paths: after repeated upstream failures stop
+# calling arXiv and serve stale cache / local index results until a probe succeeds
+arxiv_breaker = CircuitBreaker(
+    "arxiv",
+    failure_threshold=int(os.getenv("ARXIV_BREAKER_THRESHOLD", "3")),
+    reset_timeout=float(os.getenv("ARXIV_BREAKER_RESET", "30")),
+)
+
+
+def _is_upstream_failure(status_code: int) -> bool:
+    """Server errors and throttling count against the breaker, bad queries do not"""
+    return status_code >= 500 or status_code == 429
+
+
+def _normalize_query(topic: str) -> str:
+    """Turn a free-text topic into an arXiv search_query term, rejecting bad characters"""
     query = "+".join(topic.lower().split())
     for char in list('()" '):
         if char in query:
             print(f"Invalid character '{char}' in query: {query}")
             raise ValueError(f"Cannot have character: '{char}' in query: {query}")
+    return query
 
-    # Create cache key from normalized query
-    cache_key = hashlib.md5(f"{query}_{max_results}".encode()).hexdigest()
 
-    # Check if we have cached results
-    cached_result = _get_from_cache(cache_key)
-    if cached_result:
-        print(f"[CACHE] Using cached arXiv results for: {topic}")
-        return cached_result
+def _search_cache_key(query: str, max_results: int) -> str:
+    """Create cache key from normalized query"""
+    return hashlib.md5(f"{query}_{max_results}".encode()).hexdigest()
 
-    url = (
-            "http://export.arxiv.org/api/query"
+
+def _search_url(query: str, max_results: int, start: int = 0) -> str:
+    return (
+            f"{ARXIV_API_URL}"
             f"?search_query=all:{query}"
+            f"&start={start}"
             f"&max_results={max_results}"
             "&sortBy=submittedDate"
             "&sortOrder=descending"
         )
+
+
+def _local_answer(query: str, max_results: int, mode: str) -> Optional[dict]:
+    """Return the local index result to serve for this mode, or None to go upstream"""
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode: {mode}. Expected one of {SEARCH_MODES}")
+    if mode == "upstream":
+        return None
+
+    index = get_index()
+    if index is None:
+        entries = []
+    elif mode == "local_only":
+        # Best effort: nothing else will answer
+        entries = index.search(query, max_results)
+    else:
+        # Only confident answers replace the live API: all key terms matched, scoring above the floor
+        entries = index.search(query, max_results, require_all=True, min_score=ARXIV_LOCAL_MIN_SCORE)
+    if mode == "local_only" or len(entries) >= max_results:
+        print(f"[INDEX] Serving {len(entries)} arXiv results from local index for: {query}")
+        return {"entries": entries, "source": "local"}
+    return None
+
+
+def _local_fallback(query: str, max_results: int, error: Exception) -> dict:
+    """Serve whatever the local index has when arXiv is unavailable, else re-raise"""
+    index = get_index()
+    entries = index.search(query, max_results) if index is not None else []
+    if not entries:
+        raise error
+    print(f"[INDEX] arXiv unavailable ({error}), serving {len(entries)} local results for: {query}")
+    return {"entries": entries, "source": "local"}
+
+
+def search_arxiv_papers(topic: str, max_results: int = 5, mode: Optional[str] = None) -> dict:
+    mode = mode or ARXIV_SEARCH_MODE
+    query = _normalize_query(topic)
+    cache_key = _search_cache_key(query, max_results)
+
+    # Check if we have cached results (expired entries are kept for stale-while-revalidate)
+    cached = get_cache().get_with_staleness(cache_key)
+    if cached and not cached[1]:
+        print(f"[CACHE] Using cached arXiv results for: {topic}")
+        return cached[0]
+
+    local_result = _local_answer(query, max_results, mode)
+    if local_result is not None:
+        if mode == "local_first":
+            _refresh_in_background(query, max_results, cache_key)
+        return local_result
+
+    if cached:
+        print(f"[CACHE] Serving stale arXiv results for: {topic} (refreshing in background)")
+        _refresh_in_background(query, max_results, cache_key)
+        return cached[0]
+
+    try:
+        return _search_upstream(query, max_results, cache_key)
+    except Exception as e:
+        return _local_fallback(query, max_results, e)
+
+
+def _upstream_get(url: str) -> str:
+    """GET an arXiv API URL through the circuit breaker and return the body"""
+    probe = arxiv_breaker.check()
     print(f"[API] Making request to arXiv API: {url}")
-    resp = requests.get(url)
+    try:
+        try:
+            resp = _session.get(url, timeout=ARXIV_TIMEOUT)
+        except requests.RequestException:
+            arxiv_breaker.record_failure()
+            raise
+
+        if _is_upstream_failure(resp.status_code):
+            arxiv_breaker.record_failure()
+        else:
+            arxiv_breaker.record_success()
+    finally:
+        if probe:
+            arxiv_breaker.release_probe()
 
     if not resp.ok:
         print(f"ArXiv API request failed: {resp.status_code} - {resp.text}")
         raise ValueError(f"Bad response from arXiv API: {resp}\n{resp.text}")
+    return resp.text
 
-    data = parse_arxiv_xml(resp.text)
 
-    # Store in cache
+def _search_upstream(query: str, max_results: int, cache_key: str) -> dict:
+    data = parse_arxiv_xml(_upstream_get(_search_url(query, max_results)))
+
+    # Store in cache and local index
     _save_to_cache(cache_key, data)
+    index_entries(data["entries"])
 
     return data
 
 
-# Simple in-memory cache with timestamps
-_arxiv_cache = {}
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def _refresh_in_background(query: str, max_results: int, cache_key: str) -> None:
+    """Refresh a cache entry from arXiv on a daemon thread (one refresh per key)"""
+    with _refreshing_lock:
+        if cache_key in _refreshing:
+            return
+        _refreshing.add(cache_key)
+
+    def refresh():
+        try:
+            _search_upstream(query, max_results, cache_key)
+        except Exception as e:
+            print(f"WARNING: Background arXiv refresh failed for {query}: {e}")
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(cache_key)
+
+    threading.Thread(target=refresh, daemon=True).start()
+
+
+async def asearch_arxiv_papers(topic: str, max_results: int = 5, mode: Optional[str] = None) -> dict:
+    """Async variant of search_arxiv_papers.
+
+    Uses the pooled client from arxiv_client.py, so identical concurrent
+    queries share a single upstream request.
+    """
+    from arxiv_client import get_arxiv_client
+    return await get_arxiv_client().search(topic, max_results, mode=mode)
+
+
+# Batch metadata lookup by arXiv ID (id_list queries)
+MAX_ID_LIST = int(os.getenv("ARXIV_MAX_ID_LIST", "250"))  # IDs per upstream request
+
+_ARXIV_ID_RE = re.compile(
+    r"^(?:\d{4}\.\d{4,5}|[a-z][a-z\-]*(?:\.[A-Z]{2})?/\d{7})(?:v\d+)?$"
+)
+
+
+def _normalize_arxiv_id(raw_id: str) -> str:
+    """Reduce 'arXiv:2401.00001', abs/pdf URLs etc. to the bare identifier"""
+    arxiv_id = raw_id.strip()
+    arxiv_id = re.sub(r"^(?:https?://)?(?:export\.)?arxiv\.org/(?:abs|pdf)/", "", arxiv_id)
+    arxiv_id = re.sub(r"^arxiv:", "", arxiv_id, flags=re.IGNORECASE)
+    if arxiv_id.endswith(".pdf"):
+        arxiv_id = arxiv_id[:-4]
+    return arxiv_id
+
+
+def _strip_version(arxiv_id: str) -> str:
+    return re.sub(r"v\d+$", "", arxiv_id)
+
+
+def _id_cache_key(arxiv_id: str) -> str:
+    return f"id:{arxiv_id}"
+
+
+def _id_list_url(arxiv_ids: list[str]) -> str:
+    return f"{ARXIV_API_URL}?id_list={','.join(arxiv_ids)}&max_results={len(arxiv_ids)}"
 
-def _get_from_cache(cache_key: str):
-    """Retrieve from cache if exists and not expired (10 minutes TTL)"""
-    if cache_key in _arxiv_cache:
-        data, timestamp = _arxiv_cache[cache_key]
-        if time.time() - timestamp < 600:  # 10 minute cache
-            return data
+
+def _plan_id_lookup(ids: list[str]) -> tuple[list[str], dict, list[str], dict]:
+    """Normalize and dedupe ids, answer what we can from the per-ID cache.
+
+    Returns (normalized_ids, found, missing, stale) where found maps id -> entry,
+    missing lists the valid ids that still have to be fetched upstream and
+    stale holds expired cache entries to fall back on if that fetch fails.
+    """
+    normalized = list(dict.fromkeys(_normalize_arxiv_id(i) for i in ids if i and i.strip()))
+    found = {}
+    missing = []
+    stale = {}
+    cache = get_cache()
+    for arxiv_id in normalized:
+        if not _ARXIV_ID_RE.match(arxiv_id):
+            print(f"Skipping invalid arXiv ID: {arxiv_id}")
+            continue
+        cached = cache.get_with_staleness(_id_cache_key(arxiv_id))
+        if cached and not cached[1]:
+            found[arxiv_id] = cached[0]
         else:
-            # Expired, remove it
-            del _arxiv_cache[cache_key]
-    return None
+            missing.append(arxiv_id)
+            if cached:
+                stale[arxiv_id] = cached[0]
+    return normalized, found, missing, stale
+
+
+def _use_stale_ids(batch: list[str], stale: dict, found: dict, error: Exception) -> None:
+    """Fill a failed batch from stale cache entries, re-raising if there are none"""
+    usable = {arxiv_id: stale[arxiv_id] for arxiv_id in batch if arxiv_id in stale}
+    if not usable:
+        raise error
+    print(f"[CACHE] arXiv unavailable ({error}), serving {len(usable)} stale ID entries")
+    found.update(usable)
+
+
+def _store_id_entries(requested: list[str], xml_content: str, found: dict) -> None:
+    """Match entries of an id_list response to the requested ids and cache each one"""
+    by_base = {_strip_version(arxiv_id): arxiv_id for arxiv_id in requested}
+    requested_set = set(requested)
+    for entry in iter_arxiv_entries(xml_content):
+        entry_id = entry.get("id")
+        if not entry_id:
+            continue
+        arxiv_id = entry_id if entry_id in requested_set else by_base.get(_strip_version(entry_id))
+        if arxiv_id is None:
+            continue
+        found[arxiv_id] = entry
+        _save_to_cache(_id_cache_key(arxiv_id), entry)
+    index_entries(found[arxiv_id] for arxiv_id in requested if arxiv_id in found)
+
+
+def _id_lookup_result(normalized: list[str], found: dict) -> dict:
+    return {
+        "entries": [found[arxiv_id] for arxiv_id in normalized if arxiv_id in found],
+        "missing": [arxiv_id for arxiv_id in normalized if arxiv_id not in found],
+    }
+
+
+def lookup_arxiv_ids(ids: list[str]) -> dict:
+    """Fetch metadata for a list of arXiv IDs.
+
+    Each ID is cached on its own, so only the IDs not already cached are sent
+    upstream, batched into id_list requests of up to MAX_ID_LIST IDs.
+
+    Returns:
+        {"entries": [...], "missing": [ids that could not be resolved]}
+    """
+    normalized, found, missing, stale = _plan_id_lookup(ids)
+    if len(found):
+        print(f"[CACHE] {len(found)}/{len(normalized)} arXiv IDs served from cache")
+
+    for i in range(0, len(missing), MAX_ID_LIST):
+        batch = missing[i:i + MAX_ID_LIST]
+        print(f"[API] Looking up {len(batch)} arXiv IDs")
+        try:
+            _store_id_entries(batch, _upstream_get(_id_list_url(batch)), found)
+        except Exception as e:
+            _use_stale_ids(batch, stale, found, e)
+
+    return _id_lookup_result(normalized, found)
+
+
+async def alookup_arxiv_ids(ids: list[str]) -> dict:
+    """Async variant of lookup_arxiv_ids using the pooled client"""
+    from arxiv_client import get_arxiv_client
+    return await get_arxiv_client().lookup_ids(ids)
+
+
+# Cache lookups go through the configured backend (SQLite on disk by default,
+# shared between uvicorn workers and kept across restarts) - see arxiv_cache.py
 
 def _save_to_cache(cache_key: str, data: dict):
     """Save to cache with current timestamp"""
-    _arxiv_cache[cache_key] = (data, time.time())
+    get_cache().set(cache_key, data)
 
 
 # Step2: Parse XML
+import io
 import xml.etree.ElementTree as ET
-def parse_arxiv_xml(xml_content: str) -> dict:
-    """Parse the XML content from arXiv API response."""
+from typing import Iterator, Union
+
+# lxml is optional; when installed its iterparse is used as a faster path
+try:
+    from lxml import etree as LXML_ET
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_ET = None
+    LXML_AVAILABLE = False
+
+_ATOM = "{http://www.w3.org/2005/Atom}"
+_ENTRY = _ATOM + "entry"
+_ID = _ATOM + "id"
+_TITLE = _ATOM + "title"
+_SUMMARY = _ATOM + "summary"
+_AUTHOR = _ATOM + "author"
+_NAME = _ATOM + "name"
+_CATEGORY = _ATOM + "category"
+_LINK = _ATOM + "link"
 
-    entries = []
-    ns = {
-        "atom": "http://www.w3.org/2005/Atom",
-        "arxiv": "http://arxiv.org/schemas/atom"
+
+def _entry_from_element(entry) -> dict:
+    """Build an entry dict in a single pass over the <entry> children"""
+    arxiv_id = None
+    title = None
+    summary = None
+    authors = []
+    categories = []
+    pdf_link = None
+    for child in entry:
+        tag = child.tag
+        if tag == _ID:
+            # http://arxiv.org/abs/2401.00001v1 -> 2401.00001v1
+            arxiv_id = (child.text or "").strip().rsplit("/abs/", 1)[-1]
+        elif tag == _TITLE:
+            title = child.text or ""
+        elif tag == _SUMMARY:
+            summary = child.text or ""
+        elif tag == _AUTHOR:
+            authors.append(child.findtext(_NAME))
+        elif tag == _CATEGORY:
+            categories.append(child.get("term"))
+        elif tag == _LINK and pdf_link is None and child.get("type") == "application/pdf":
+            # PDF link (rel="related" and type="application/pdf")
+            pdf_link = child.get("href")
+
+    return {
+        "id": arxiv_id,
+        "title": title,
+        "summary": (summary or "").strip(),
+        "authors": authors,
+        "categories": categories,
+        "pdf": pdf_link
     }
-    root = ET.fromstring(xml_content)
-    # Loop through each <entry> in Atom namespace
-    for entry in root.findall("atom:entry", ns):
-        # Extract authors
-        authors = [
-            author.findtext("atom:name", namespaces=ns)
-            for author in entry.findall("atom:author", ns)
-        ]
-        
-        # Extract categories (term attribute)
-        categories = [
-            cat.attrib.get("term")
-            for cat in entry.findall("atom:category", ns)
-        ]
-        
-        # Extract PDF link (rel="related" and type="application/pdf")
-        pdf_link = None
-        for link in entry.findall("atom:link", ns):
-            if link.attrib.get("type") == "application/pdf":
-                pdf_link = link.attrib.get("href")
-                break
-
-        entries.append({
-            "title": entry.findtext("atom:title", namespaces=ns),
-            "summary": entry.findtext("atom:summary", namespaces=ns).strip(),
-            "authors": authors,
-            "categories": categories,
-            "pdf": pdf_link
-        })
-
-    return {"entries": entries}
+
+
+def iter_arxiv_entries(xml_content: Union[str, bytes], use_lxml: bool = LXML_AVAILABLE) -> Iterator[dict]:
+    """Incrementally parse an arXiv Atom feed, yielding one entry dict at a time.
+
+    Each <entry> element is released as soon as it has been converted, so
+    memory stays proportional to a single entry rather than the whole feed.
+    """
+    if isinstance(xml_content, str):
+        xml_content = xml_content.encode("utf-8")
+    source = io.BytesIO(xml_content)
+
+    if use_lxml and LXML_AVAILABLE:
+        for _, elem in LXML_ET.iterparse(source, events=("end",), tag=_ENTRY):
+            yield _entry_from_element(elem)
+            # Free the element and the already-processed siblings kept by the parent
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+        return
+
+    root = None
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if root is None:
+            root = elem
+        elif event == "end" and elem.tag == _ENTRY:
+            yield _entry_from_element(elem)
+            root.clear()
+
+
+def parse_arxiv_xml(xml_content: str) -> dict:
+    """Parse the XML content from arXiv API response."""
+    return {"entries": list(iter_arxiv_entries(xml_content))}
 
 
 
@@ -110,7 +418,7 @@ from langchain_core.tools import tool
 
 
 @tool
-def arxiv_search(topic: str) -> list[dict]:
+async def arxiv_search(topic: str) -> list[dict]:
     """Search for recently uploaded arXiv papers
 
     Args:
@@ -121,9 +429,25 @@ def arxiv_search(topic: str) -> list[dict]:
     """
     print("ARXIV Agent called")
     print(f"Searching arXiv for papers about: {topic}")
-    papers = search_arxiv_papers(topic)
+    papers = await asearch_arxiv_papers(topic)
     if len(papers) == 0:
         print(f"No papers found for topic: {topic}")
         raise ValueError(f"No papers found for topic: {topic}")
     print(f"Found {len(papers['entries'])} papers about {topic}")
-    return papers
\ No newline at end of file
+    return papers
+
+
+@tool
+async def arxiv_lookup(ids: list[str]) -> dict:
+    """Fetch metadata for specific arXiv papers by ID in a single call
+
+    Args:
+        ids: arXiv identifiers such as "2401.00001", "arXiv:2401.00001v2" or abs/pdf URLs
+
+    Returns:
+        Dict with "entries" (paper metadata) and "missing" (IDs that were not found)
+    """
+    print(f"ARXIV lookup called for {len(ids)} IDs")
+    result = await alookup_arxiv_ids(ids)
+    print(f"Resolved {len(result['entries'])} of {len(ids)} arXiv IDs")
+    return result
\ No newline at end of file
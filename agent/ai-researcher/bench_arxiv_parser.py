@@ -0,0 +1,112 @@
+# bench_arxiv_parser.py - Compare arXiv Atom parsers on large synthetic feeds
+#
+# Usage: python bench_arxiv_parser.py [entry_count ...]   (default: 1000 10000)
+import sys
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+from arxiv_tool import LXML_AVAILABLE, iter_arxiv_entries
+
+
+def legacy_parse_arxiv_xml(xml_content: str) -> dict:
+    """The original ET.fromstring + findall implementation, kept as the baseline"""
+    entries = []
+    ns = {
+        "atom": "http://www.w3.org/2005/Atom",
+        "arxiv": "http://arxiv.org/schemas/atom"
+    }
+    root = ET.fromstring(xml_content)
+    for entry in root.findall("atom:entry", ns):
+        authors = [
+            author.findtext("atom:name", namespaces=ns)
+            for author in entry.findall("atom:author", ns)
+        ]
+        categories = [
+            cat.attrib.get("term")
+            for cat in entry.findall("atom:category", ns)
+        ]
+        pdf_link = None
+        for link in entry.findall("atom:link", ns):
+            if link.attrib.get("type") == "application/pdf":
+                pdf_link = link.attrib.get("href")
+                break
+        entries.append({
+            "title": entry.findtext("atom:title", namespaces=ns),
+            "summary": entry.findtext("atom:summary", namespaces=ns).strip(),
+            "authors": authors,
+            "categories": categories,
+            "pdf": pdf_link
+        })
+    return {"entries": entries}
+
+
+def make_feed(count: int) -> str:
+    """Build an Atom feed shaped like an arXiv API response"""
+    summary = "We study a problem in machine learning. " * 30
+    parts = [
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<feed xmlns="http://www.w3.org/2005/Atom" '
+        'xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/" '
+        'xmlns:arxiv="http://arxiv.org/schemas/atom">'
+        f'<opensearch:totalResults>{count}</opensearch:totalResults>'
+    ]
+    for i in range(count):
+        arxiv_id = f"2401.{i:05d}v1"
+        parts.append(
+            f'<entry><id>http://arxiv.org/abs/{arxiv_id}</id>'
+            f'<updated>2024-01-01T00:00:00Z</updated><published>2024-01-01T00:00:00Z</published>'
+            f'<title>Synthetic paper number {i}</title>'
+            f'<summary>  {summary}  </summary>'
+            '<author><name>Ada Lovelace</name></author>'
+            '<author><name>Alan Turing</name><arxiv:affiliation>Cambridge</arxiv:affiliation></author>'
+            '<author><name>Grace Hopper</name></author>'
+            '<arxiv:primary_category term="cs.LG" scheme="http://arxiv.org/schemas/atom"/>'
+            f'<link href="http://arxiv.org/abs/{arxiv_id}" rel="alternate" type="text/html"/>'
+            f'<link title="pdf" href="http://arxiv.org/pdf/{arxiv_id}" rel="related" type="application/pdf"/>'
+            '<category term="cs.LG" scheme="http://arxiv.org/schemas/atom"/>'
+            '<category term="stat.ML" scheme="http://arxiv.org/schemas/atom"/>'
+            '</entry>'
+        )
+    parts.append("</feed>")
+    return "".join(parts)
+
+
+def measure(parse, xml_content: str) -> tuple[float, float]:
+    """Return (seconds, peak MiB) for consuming every entry produced by parse"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    count = 0
+    for _ in parse(xml_content):
+        count += 1
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / (1024 * 1024)
+
+
+def main(sizes: list[int]) -> None:
+    parsers = {
+        "legacy fromstring+findall": lambda xml: legacy_parse_arxiv_xml(xml)["entries"],
+        "iterparse (stdlib)": lambda xml: iter_arxiv_entries(xml, use_lxml=False),
+    }
+    if LXML_AVAILABLE:
+        parsers["iterparse (lxml)"] = lambda xml: iter_arxiv_entries(xml, use_lxml=True)
+    else:
+        print("lxml not installed - skipping the lxml fast path")
+
+    for size in sizes:
+        xml_content = make_feed(size)
+        print(f"\n{size} entries ({len(xml_content) / (1024 * 1024):.1f} MiB feed)")
+        for name, parse in parsers.items():
+            # Time without tracemalloc overhead, then measure memory separately
+            started = time.perf_counter()
+            for _ in parse(xml_content):
+                pass
+            elapsed = time.perf_counter() - started
+            _, peak = measure(parse, xml_content)
+            print(f"  {name:<28} {elapsed * 1000:9.1f} ms   peak {peak:8.2f} MiB")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 10000])
@@ -0,0 +1,88 @@
+# bench_pdf_extract.py - Compare sequential and process-pool PDF text extraction
+#
+# Usage: python bench_pdf_extract.py [path/to/paper.pdf ...]
+# Without arguments, synthetic 10-, 40- and 80-page papers are generated.
+import io
+import sys
+import time
+
+from pdf_extract import PDF_EXTRACT_WORKERS, extract_pdf_pages, get_extract_pool, shutdown_extract_pool
+
+
+def legacy_extract(content: bytes) -> str:
+    """The original read_pdf loop with string concatenation, kept as the baseline"""
+    import PyPDF2
+
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(content))
+    text = ""
+    for page in pdf_reader.pages:
+        text += page.extract_text() + "\n"
+    return text.strip()
+
+
+def make_pdf(num_pages: int, lines_per_page: int = 60) -> bytes:
+    """Write a plain-text PDF with Helvetica pages, no third-party libraries"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    sentence = "Transformers attend over graph structured inputs to learn representations"
+    for p in range(num_pages):
+        lines = [f"({p + 1}.{i} {sentence} {i * p}) Tj T*" for i in range(lines_per_page)]
+        stream = ("BT /F1 9 Tf 11 TL 40 780 Td " + " ".join(lines) + " ET").encode()
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{i} 0 R" for i in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % num_pages
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def timed(fn, *args, **kwargs) -> float:
+    started = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - started
+
+
+def main(paths: list[str]) -> None:
+    if paths:
+        documents = [(path, open(path, "rb").read()) for path in paths]
+    else:
+        documents = [(f"synthetic {n} pages", make_pdf(n)) for n in (10, 40, 80)]
+
+    # Start the workers up front so pool start-up is not billed to the first run
+    pool = get_extract_pool()
+    list(pool.map(abs, range(PDF_EXTRACT_WORKERS)))
+
+    print(f"Process pool workers: {PDF_EXTRACT_WORKERS}")
+    for name, content in documents:
+        legacy = timed(legacy_extract, content)
+        sequential = timed(extract_pdf_pages, content, parallel=False)
+        parallel = timed(extract_pdf_pages, content, parallel=True)
+        print(
+            f"{name:<22} legacy {legacy * 1000:8.1f} ms   sequential {sequential * 1000:8.1f} ms   "
+            f"parallel {parallel * 1000:8.1f} ms   speed-up x{legacy / parallel:4.2f}"
+        )
+    shutdown_extract_pool()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
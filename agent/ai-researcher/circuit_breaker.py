@@ -0,0 +1,90 @@
+# circuit_breaker.py - Stop calling an upstream service after repeated failures
+import threading
+import time
+from typing import Optional
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a call is refused because the circuit is open"""
+
+
+class CircuitBreaker:
+    """Classic closed / open / half-open circuit breaker.
+
+    - closed: calls go through; `failure_threshold` consecutive failures open it
+    - open: calls are refused for `reset_timeout` seconds
+    - half_open: a single probe call is let through; success closes the
+      circuit, failure opens it again
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.rejected_calls = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def _acquire(self) -> Optional[bool]:
+        """None if the call is refused, else whether it is the half-open probe"""
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probe_in_flight = False
+            if self.state == "closed":
+                return False
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                print(f"[CIRCUIT] {self.name}: sending probe request")
+                return True
+            self.rejected_calls += 1
+            return None
+
+    def allow_request(self) -> bool:
+        """Return True if a call may be made now (claims the probe when half-open)"""
+        return self._acquire() is not None
+
+    def check(self) -> bool:
+        """Raise CircuitOpenError unless a call may be made now.
+
+        Returns True if this call is the half-open probe; the caller must then
+        call release_probe() when it finishes, whatever the outcome.
+        """
+        probe = self._acquire()
+        if probe is None:
+            raise CircuitOpenError(f"{self.name} circuit is open - upstream calls are paused after repeated failures")
+        return probe
+
+    def release_probe(self) -> None:
+        """Free the probe slot if the probe ended without a verdict (cancelled or crashed)"""
+        with self._lock:
+            if self.state == "half_open":
+                self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != "closed":
+                print(f"[CIRCUIT] {self.name}: closed again after successful call")
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"[CIRCUIT] {self.name}: opened after {self.consecutive_failures} consecutive failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "rejected_calls": self.rejected_calls,
+        }
@@ -0,0 +1,103 @@
+# latex_cache.py - Content-hash cache of compiled LaTeX documents
+import hashlib
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_COMPILE_CACHE_DIR = Path("output") / ".cache"
+
+
+class CompileCache:
+    """Compiled PDFs keyed by SHA-256 of the LaTeX source and engine version.
+
+    Identical documents (e.g. a model retrying the same render) skip
+    tectonic entirely. Files are evicted least-recently-used once the
+    directory exceeds `max_bytes`.
+    """
+
+    def __init__(self, root: Path = DEFAULT_COMPILE_CACHE_DIR, max_bytes: int = 500 * 1024 ** 2):
+        self.root = Path(root).absolute()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(latex_content: str, engine_version: str) -> str:
+        digest = hashlib.sha256(engine_version.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(latex_content.encode("utf-8"))
+        return digest.hexdigest()
+
+    def path_for(self, key: str) -> Path:
+        # Two levels deep so PDF listings of output/ never pick these up
+        return self.root / key[:2] / f"{key}.pdf"
+
+    def restore(self, key: str, dest: Path) -> bool:
+        """Copy the cached PDF for key to dest; False on a miss"""
+        path = self.path_for(key)
+        try:
+            # Touch so eviction keeps recently used documents
+            os.utime(path)
+            shutil.copyfile(path, dest)
+        except FileNotFoundError:
+            # Never cached, or evicted by another worker process in the meantime
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def put(self, key: str, pdf_path: Path) -> Path:
+        path = self.path_for(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        shutil.copyfile(pdf_path, tmp_path)
+        os.replace(tmp_path, path)
+        self._evict()
+        return path
+
+    def _evict(self) -> None:
+        """Remove least-recently-used files once the directory exceeds max_bytes"""
+        files = []
+        for p in self.root.glob("*/*.pdf"):
+            try:
+                stat = p.stat()
+            except FileNotFoundError:
+                # Already evicted by another worker process
+                continue
+            files.append((stat.st_mtime, stat.st_size, p))
+        total = sum(size for _, size, _ in files)
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "max_bytes": self.max_bytes}
+
+
+# Global instance - lazy initialization
+_compile_cache = None
+_compile_cache_lock = threading.Lock()
+
+
+def get_compile_cache() -> Optional[CompileCache]:
+    """Get or create the compile cache (LATEX_CACHE_DIR, LATEX_CACHE_MAX_BYTES)"""
+    global _compile_cache
+    with _compile_cache_lock:
+        if _compile_cache is None:
+            root = Path(os.getenv("LATEX_CACHE_DIR", str(DEFAULT_COMPILE_CACHE_DIR)))
+            try:
+                _compile_cache = CompileCache(
+                    root=root,
+                    max_bytes=int(os.getenv("LATEX_CACHE_MAX_BYTES", str(500 * 1024 ** 2))),
+                )
+            except OSError as e:
+                print(f"WARNING: LaTeX compile cache unavailable at {root}: {e}")
+                return None
+        return _compile_cache
@@ -0,0 +1,375 @@
+# latex_compiler.py - Bounded asyncio scheduler for tectonic compiles
+import asyncio
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import weakref
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+LATEX_COMPILE_WORKERS = int(os.getenv("LATEX_COMPILE_WORKERS", "2"))
+LATEX_COMPILE_QUEUE = int(os.getenv("LATEX_COMPILE_QUEUE", "8"))
+LATEX_COMPILE_TIMEOUT = float(os.getenv("LATEX_COMPILE_TIMEOUT", "180"))
+# How long a new job waits for room in a full queue before it is rejected
+LATEX_QUEUE_WAIT = float(os.getenv("LATEX_QUEUE_WAIT", "30"))
+
+# Pinned bundle: a local bundle file/directory (--bundle) or URL (--web-bundle);
+# empty uses tectonic's default web bundle
+TECTONIC_BUNDLE = os.getenv("TECTONIC_BUNDLE", "")
+# Downloaded packages and format files, shared by every worker and kept across restarts
+TECTONIC_CACHE_DIR = Path(os.getenv("TECTONIC_CACHE_DIR", str(Path(__file__).parent / "cache" / "tectonic")))
+# Never touch the network; only packages already in the cache/bundle are used
+TECTONIC_ONLY_CACHED = os.getenv("TECTONIC_ONLY_CACHED", "0") == "1"
+# Compile WARMUP_TEMPLATE at startup so the first user render finds a hot cache
+LATEX_WARMUP = os.getenv("LATEX_WARMUP", "1") == "1"
+LATEX_WARMUP_TIMEOUT = float(os.getenv("LATEX_WARMUP_TIMEOUT", "600"))
+
+# Representative of what the agent writes: the packages it uses and the
+# constructs (title block, sections, math, lists, tables, links) that pull
+# in most of the fonts and format files
+WARMUP_TEMPLATE = r"""\documentclass{article}
+\usepackage[utf8]{inputenc}
+\usepackage{amsmath,amssymb,amsthm}
+\usepackage{graphicx}
+\usepackage{booktabs}
+\usepackage{geometry}
+\usepackage{hyperref}
+\title{Warm-up}
+\author{Research Agent}
+\begin{document}
+\maketitle
+\begin{abstract}
+Warm-up document.
+\end{abstract}
+\section{Introduction}
+Inline math $\alpha + \beta$ and a link \href{https://arxiv.org}{arXiv}.
+\begin{equation}
+  \mathcal{L}(\theta) = \sum_{i=1}^{n} \log p_\theta(x_i) \quad \forall \theta \in \mathbb{R}^d
+\end{equation}
+\begin{itemize}
+  \item \textbf{Bold}, \emph{emphasis} and \texttt{monospace}
+\end{itemize}
+\begin{table}[h]
+  \centering
+  \begin{tabular}{lr}
+    \toprule
+    Model & Score \\
+    \midrule
+    Baseline & 0.5 \\
+    \bottomrule
+  \end{tabular}
+  \caption{Results}
+\end{table}
+\end{document}
+"""
+
+
+class CompileQueueFullError(RuntimeError):
+    """Too many compiles are waiting; the caller should retry later"""
+
+
+class CompileTimeoutError(RuntimeError):
+    """tectonic did not finish within the per-job timeout and was killed"""
+
+
+@dataclass
+class CompileResult:
+    returncode: int
+    stdout: str
+    stderr: str
+    seconds: float   # time tectonic ran
+    waited: float    # time spent in the queue
+
+
+@dataclass
+class _Job:
+    tex_filename: str
+    output_dir: Path
+    timeout: float
+    future: asyncio.Future
+    enqueued: float
+
+
+class CompileScheduler:
+    """Runs tectonic in at most `workers` subprocesses at a time.
+
+    Jobs wait in a queue of `max_queue` entries; when it is full, compile()
+    waits up to `queue_wait` seconds for room and then raises
+    CompileQueueFullError, so a burst of paper generations backs off instead
+    of piling up tectonic processes. Subprocesses are awaited with asyncio,
+    so the event loop keeps serving other chats during a compile.
+    """
+
+    def __init__(
+        self,
+        workers: int = LATEX_COMPILE_WORKERS,
+        max_queue: int = LATEX_COMPILE_QUEUE,
+        timeout: float = LATEX_COMPILE_TIMEOUT,
+        queue_wait: float = LATEX_QUEUE_WAIT,
+    ):
+        self.workers = workers
+        self.timeout = timeout
+        self.queue_wait = queue_wait
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._workers: list[asyncio.Task] = []
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.rejected = 0
+        self._durations: deque = deque(maxlen=200)
+        self._waits: deque = deque(maxlen=200)
+
+    def _start_workers(self) -> None:
+        if not self._workers:
+            self._workers = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    async def compile(self, tex_filename: str, output_dir: Path, timeout: Optional[float] = None) -> CompileResult:
+        """Compile output_dir/tex_filename with tectonic and wait for the result"""
+        self._start_workers()
+        job = _Job(
+            tex_filename, Path(output_dir), timeout or self.timeout,
+            asyncio.get_running_loop().create_future(), time.monotonic(),
+        )
+        try:
+            await asyncio.wait_for(self._queue.put(job), self.queue_wait)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise CompileQueueFullError(
+                f"LaTeX compile queue is full ({self._queue.maxsize} waiting); try again shortly"
+            ) from None
+        return await job.future
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                # The caller gave up while the job was queued
+                if job.future.cancelled():
+                    continue
+                self.running += 1
+                try:
+                    result = await self._run(job)
+                except Exception as e:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+                else:
+                    if not job.future.done():
+                        job.future.set_result(result)
+                finally:
+                    self.running -= 1
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: _Job) -> CompileResult:
+        started = time.monotonic()
+        self._waits.append(started - job.enqueued)
+        process = await asyncio.create_subprocess_exec(
+            *tectonic_command(job.tex_filename, job.output_dir),
+            cwd=str(job.output_dir),
+            env=tectonic_env(),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), job.timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            self.timed_out += 1
+            raise CompileTimeoutError(f"tectonic exceeded {job.timeout:.0f}s compiling {job.tex_filename}") from None
+        except asyncio.CancelledError:
+            process.kill()
+            # Reap it even while being cancelled, so no zombie tectonic is left behind
+            await asyncio.shield(process.wait())
+            raise
+
+        seconds = time.monotonic() - started
+        self._durations.append(seconds)
+        if process.returncode == 0:
+            self.completed += 1
+        else:
+            self.failed += 1
+        return CompileResult(
+            process.returncode,
+            stdout.decode("utf-8", errors="replace"),
+            stderr.decode("utf-8", errors="replace"),
+            seconds,
+            started - job.enqueued,
+        )
+
+    def stats(self) -> dict:
+        durations = sorted(self._durations)
+
+        def percentile(values: list, p: float) -> Optional[float]:
+            return round(values[min(len(values) - 1, int(p * len(values)))], 3) if values else None
+
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "queue_depth": self._queue.qsize(),
+            "queue_limit": self._queue.maxsize,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timed_out": self.timed_out,
+            "rejected": self.rejected,
+            "compile_seconds_p50": percentile(durations, 0.5),
+            "compile_seconds_p95": percentile(durations, 0.95),
+            "compile_seconds_max": round(durations[-1], 3) if durations else None,
+            "queue_wait_seconds_max": round(max(self._waits), 3) if self._waits else None,
+        }
+
+    async def aclose(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+
+def tectonic_command(tex_filename: str, output_dir: Path) -> list[str]:
+    """tectonic argv for one compile, honouring the bundle and offline settings"""
+    command = ["tectonic", tex_filename, "--outdir", str(output_dir)]
+    if TECTONIC_BUNDLE:
+        is_url = TECTONIC_BUNDLE.startswith(("http://", "https://"))
+        command += ["--web-bundle" if is_url else "--bundle", TECTONIC_BUNDLE]
+    if TECTONIC_ONLY_CACHED:
+        command.append("--only-cached")
+    return command
+
+
+def tectonic_env() -> dict:
+    """Environment for tectonic: the shared, persistent package/format cache"""
+    TECTONIC_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    return {**os.environ, "TECTONIC_CACHE_DIR": str(TECTONIC_CACHE_DIR)}
+
+
+_engine_version: Optional[str] = None
+
+
+async def tectonic_version() -> str:
+    """`tectonic --version` plus the pinned bundle, looked up once per process.
+
+    Used as part of the compile cache key, so changing either invalidates
+    earlier builds.
+    """
+    global _engine_version
+    if _engine_version is None:
+        try:
+            process = await asyncio.create_subprocess_exec(
+                "tectonic", "--version",
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            stdout, _ = await asyncio.wait_for(process.communicate(), 10)
+        except (OSError, asyncio.TimeoutError):
+            return "unknown"
+        version = stdout.decode("utf-8", errors="replace").strip() or "unknown"
+        _engine_version = f"{version} bundle={TECTONIC_BUNDLE or 'default'}"
+    return _engine_version
+
+
+# Warm-up state, reported by /api/latex/metrics
+warmup_status: dict = {"state": "disabled" if not LATEX_WARMUP else "pending", "seconds": None, "error": None}
+_warmup_task: Optional[asyncio.Task] = None
+
+
+def _claim_warm_up(lock_path: Path) -> bool:
+    """Take the cross-process warm-up lock; False while another worker holds it.
+
+    A lock older than the warm-up timeout belongs to a worker that died
+    mid-compile and is taken over.
+    """
+    for _ in range(2):
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                age = time.time() - lock_path.stat().st_mtime
+            except FileNotFoundError:
+                continue  # released in the meantime
+            if age < LATEX_WARMUP_TIMEOUT + 60:
+                return False
+            lock_path.unlink(missing_ok=True)
+            continue
+        with os.fdopen(fd, "w") as f:
+            f.write(str(os.getpid()))
+        return True
+    return False
+
+
+async def warm_up_tectonic() -> None:
+    """Compile WARMUP_TEMPLATE so packages and format files are cached.
+
+    Runs once per cache directory, not once per uvicorn worker: the first
+    worker takes a lock file and compiles in its own temporary directory,
+    the others skip. A marker keyed by engine version and template makes
+    later restarts skip too, until either changes or the cache is wiped.
+    """
+    if shutil.which("tectonic") is None:
+        warmup_status.update(state="skipped", error="tectonic is not installed")
+        return
+    warmup_dir = TECTONIC_CACHE_DIR / "warmup"
+    warmup_dir.mkdir(parents=True, exist_ok=True)
+    key = hashlib.sha256(f"{await tectonic_version()}\0{WARMUP_TEMPLATE}".encode("utf-8")).hexdigest()[:16]
+    marker = warmup_dir / f"{key}.done"
+    if marker.exists():
+        warmup_status.update(state="done", error=None)
+        print("[LATEX] tectonic cache already warm")
+        return
+    lock_path = warmup_dir / "warmup.lock"
+    if not _claim_warm_up(lock_path):
+        warmup_status.update(state="skipped", error="warm-up is running in another worker")
+        return
+    warmup_status["state"] = "running"
+    print("[LATEX] Warming up tectonic cache...")
+    try:
+        with tempfile.TemporaryDirectory(dir=warmup_dir) as workdir:
+            (Path(workdir) / "warmup.tex").write_text(WARMUP_TEMPLATE)
+            result = await get_compile_scheduler().compile("warmup.tex", Path(workdir), timeout=LATEX_WARMUP_TIMEOUT)
+        if result.returncode == 0:
+            # Before releasing the lock, so no other worker starts a redundant run
+            marker.touch()
+    except Exception as e:
+        warmup_status.update(state="failed", error=str(e))
+        print(f"WARNING: tectonic warm-up failed: {e}")
+        return
+    finally:
+        lock_path.unlink(missing_ok=True)
+    if result.returncode != 0:
+        warmup_status.update(state="failed", seconds=round(result.seconds, 1), error=result.stderr.strip()[-500:])
+        print(f"WARNING: tectonic warm-up compile failed after {result.seconds:.1f}s")
+        return
+    warmup_status.update(state="done", seconds=round(result.seconds, 1))
+    print(f"[LATEX] tectonic warm-up finished in {result.seconds:.1f}s")
+
+
+def start_warm_up() -> None:
+    """Run the warm-up in the background (if LATEX_WARMUP is on) without delaying startup"""
+    global _warmup_task
+    if LATEX_WARMUP and _warmup_task is None:
+        _warmup_task = asyncio.ensure_future(warm_up_tectonic())
+
+
+# One scheduler per event loop - its queue and worker tasks are bound to the loop
+_schedulers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, CompileScheduler]" = weakref.WeakKeyDictionary()
+
+
+def get_compile_scheduler() -> CompileScheduler:
+    """Get or create the compile scheduler for the running event loop"""
+    loop = asyncio.get_running_loop()
+    scheduler = _schedulers.get(loop)
+    if scheduler is None:
+        scheduler = CompileScheduler()
+        _schedulers[loop] = scheduler
+    return scheduler
+
+
+async def close_compile_scheduler() -> None:
+    """Stop the workers of the running event loop's scheduler, if any"""
+    scheduler = _schedulers.pop(asyncio.get_running_loop(), None)
+    if scheduler is not None:
+        await scheduler.aclose()
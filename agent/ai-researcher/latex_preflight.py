@@ -0,0 +1,203 @@
+# latex_preflight.py - Fast structural checks of LaTeX source and tectonic log parsing
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+# Diagnostics reported back to the model per render attempt
+MAX_DIAGNOSTICS = 20
+
+# Environments whose bodies are not LaTeX and must not be checked
+_VERBATIM_ENVS = ("verbatim", "verbatim*", "lstlisting", "minted", "comment")
+# Spans whose contents are not LaTeX markup: verbatim-like environments,
+# \verb|...|, \url/\href targets (URL-encoding like %20 is not a comment)
+# and comments. One alternation scanned left to right, so whichever starts
+# first wins: a % inside \verb is not a comment, and a commented-out
+# \begin{verbatim} opens nothing.
+_LITERAL_RE = re.compile(
+    r"\\begin\{(?P<env>" + "|".join(re.escape(env) for env in _VERBATIM_ENVS) + r")\}.*?\\end\{(?P=env)\}"
+    r"|\\verb\*?(?P<delim>[^\sA-Za-z*])[^\n]*?(?P=delim)"
+    r"|\\(?:url|href)\s*\{[^{}\n]*\}"
+    r"|(?<!\\)%[^\n]*",
+    re.DOTALL,
+)
+_ENV_RE = re.compile(r"\\(begin|end)\s*\{([^{}]*)\}")
+_PREAMBLE_ONLY_RE = re.compile(r"\\(documentclass|usepackage)\b")
+_TITLE_MACRO_RE = re.compile(r"\\(author|title|date)\b")
+
+# tectonic's own messages ("error: paper.tex:12: Undefined control sequence")
+_TECTONIC_MSG_RE = re.compile(r"^(?P<severity>error|warning): (?:(?P<file>[^:\n]+\.tex):(?P<line>\d+): )?(?P<message>.+)$")
+# Classic TeX errors ("! Undefined control sequence." followed by "l.12 \foo")
+_TEX_ERROR_RE = re.compile(r"^! (?P<message>.+)$")
+_TEX_LINE_RE = re.compile(r"^l\.(?P<line>\d+)")
+
+
+@dataclass
+class LatexDiagnostic:
+    line: Optional[int]
+    message: str
+    severity: str = "error"
+
+    def __str__(self) -> str:
+        where = f"line {self.line}" if self.line else "document"
+        return f"{self.severity} ({where}): {self.message}"
+
+
+def format_diagnostics(diagnostics: list[LatexDiagnostic]) -> str:
+    lines = [f"- {d}" for d in diagnostics[:MAX_DIAGNOSTICS]]
+    if len(diagnostics) > MAX_DIAGNOSTICS:
+        lines.append(f"- ... and {len(diagnostics) - MAX_DIAGNOSTICS} more")
+    return "\n".join(lines)
+
+
+class LatexValidationError(ValueError):
+    """The LaTeX source has structural errors; raised before tectonic runs"""
+
+    def __init__(self, diagnostics: list[LatexDiagnostic]):
+        self.diagnostics = diagnostics
+        super().__init__(
+            "LaTeX pre-flight check failed; fix these problems and call render_latex_pdf again:\n"
+            + format_diagnostics(diagnostics)
+        )
+
+
+class LatexCompileError(RuntimeError):
+    """tectonic ran but did not produce a PDF"""
+
+    def __init__(self, diagnostics: list[LatexDiagnostic], output: str = ""):
+        self.diagnostics = diagnostics
+        if diagnostics:
+            detail = format_diagnostics(diagnostics)
+        else:
+            # Nothing we could parse: pass on the end of the raw output
+            detail = output.strip()[-1500:] or "no output from tectonic"
+        super().__init__(f"LaTeX compilation failed:\n{detail}")
+
+
+def _blank_out(source: str, pattern: re.Pattern) -> str:
+    """Replace matches with spaces, keeping newlines so line numbers stay valid"""
+    return pattern.sub(lambda m: re.sub(r"[^\n]", " ", m.group(0)), source)
+
+
+def preflight_latex(source: str) -> list[LatexDiagnostic]:
+    """Check LaTeX source for structural errors without compiling it.
+
+    Detects a missing \\documentclass, \\begin{document} or \\end{document},
+    unbalanced braces, unbalanced or mis-nested environments, preamble-only
+    commands in the body and \\author/\\title/\\date placed where they have no
+    effect. Comments, verbatim-like environments, \\verb and \\url/\\href
+    targets are ignored. Returns diagnostics ordered by line; any with
+    severity "error" will make tectonic fail.
+    """
+    text = _blank_out(source, _LITERAL_RE)
+    # Escaped braces are literal characters
+    text = text.replace("\\\\", "  ").replace("\\{", "  ").replace("\\}", "  ")
+    diagnostics = []
+
+    def line_of(offset: int) -> int:
+        return text.count("\n", 0, offset) + 1
+
+    # Document skeleton
+    if not re.search(r"\\documentclass\b", text):
+        diagnostics.append(LatexDiagnostic(None, "missing \\documentclass"))
+    begin_doc = [m.start() for m in re.finditer(r"\\begin\s*\{document\}", text)]
+    end_doc = [m.start() for m in re.finditer(r"\\end\s*\{document\}", text)]
+    if not begin_doc:
+        diagnostics.append(LatexDiagnostic(None, "missing \\begin{document}"))
+    if not end_doc:
+        diagnostics.append(LatexDiagnostic(None, "missing \\end{document} (the document appears truncated)"))
+    if len(begin_doc) > 1:
+        diagnostics.append(LatexDiagnostic(line_of(begin_doc[1]), "\\begin{document} appears more than once"))
+    body_start = begin_doc[0] if begin_doc else None
+    body_end = end_doc[0] if end_doc else len(text)
+    if body_end < len(text) and text[body_end:].split("}", 1)[-1].strip():
+        diagnostics.append(LatexDiagnostic(
+            line_of(body_end), "text after \\end{document} is ignored", "warning"
+        ))
+
+    # Braces
+    open_braces = []
+    for match in re.finditer(r"[{}]", text):
+        offset = match.start()
+        if match.group() == "{":
+            open_braces.append(offset)
+        elif open_braces:
+            open_braces.pop()
+        else:
+            diagnostics.append(LatexDiagnostic(line_of(offset), "unmatched closing brace '}'"))
+    for offset in open_braces:
+        diagnostics.append(LatexDiagnostic(line_of(offset), "unclosed brace '{'"))
+
+    # Environments
+    envs = []  # (name, offset)
+    for match in _ENV_RE.finditer(text):
+        kind, name = match.group(1), match.group(2).strip()
+        if kind == "begin":
+            envs.append((name, match.start()))
+        elif envs and envs[-1][0] == name:
+            envs.pop()
+        elif any(open_name == name for open_name, _ in envs):
+            # Closing an outer environment: everything opened since is unclosed
+            while envs[-1][0] != name:
+                inner, offset = envs.pop()
+                diagnostics.append(LatexDiagnostic(
+                    line_of(match.start()),
+                    f"\\end{{{name}}} closes \\begin{{{name}}} while \\begin{{{inner}}} from line {line_of(offset)} is still open",
+                ))
+            envs.pop()
+        else:
+            diagnostics.append(LatexDiagnostic(line_of(match.start()), f"\\end{{{name}}} without matching \\begin{{{name}}}"))
+    for name, offset in envs:
+        if name != "document":  # reported above as a missing \end{document}
+            diagnostics.append(LatexDiagnostic(line_of(offset), f"\\begin{{{name}}} is never closed"))
+
+    # Preamble-only and title commands
+    if body_start is not None:
+        maketitle = re.search(r"\\maketitle\b", text[body_start:])
+        maketitle_at = body_start + maketitle.start() if maketitle else None
+        for match in _PREAMBLE_ONLY_RE.finditer(text, body_start):
+            diagnostics.append(LatexDiagnostic(
+                line_of(match.start()), f"\\{match.group(1)} can only be used in the preamble (before \\begin{{document}})"
+            ))
+        for match in _TITLE_MACRO_RE.finditer(text, body_start, body_end):
+            if maketitle_at is not None and match.start() > maketitle_at:
+                diagnostics.append(LatexDiagnostic(
+                    line_of(match.start()),
+                    f"\\{match.group(1)} after \\maketitle has no effect; move it to the preamble",
+                    "warning",
+                ))
+            else:
+                diagnostics.append(LatexDiagnostic(
+                    line_of(match.start()), f"\\{match.group(1)} should be in the preamble", "warning"
+                ))
+
+    return sorted(diagnostics, key=lambda d: d.line or 0)
+
+
+def parse_tectonic_log(output: str) -> list[LatexDiagnostic]:
+    """Turn tectonic's stderr (or a TeX .log) into line-level diagnostics"""
+    diagnostics = []
+    pending: Optional[LatexDiagnostic] = None
+    for raw in output.splitlines():
+        line = raw.rstrip()
+        match = _TECTONIC_MSG_RE.match(line)
+        if match:
+            message = match.group("message").strip()
+            # tectonic's closing summary adds nothing the model can act on
+            if message.startswith("halted on potentially-recoverable error"):
+                continue
+            number = int(match.group("line")) if match.group("line") else None
+            diagnostics.append(LatexDiagnostic(number, message, match.group("severity")))
+            continue
+        match = _TEX_ERROR_RE.match(line)
+        if match:
+            pending = LatexDiagnostic(None, match.group("message").strip())
+            diagnostics.append(pending)
+            continue
+        match = _TEX_LINE_RE.match(line)
+        if match and pending is not None and pending.line is None:
+            pending.line = int(match.group("line"))
+            pending = None
+
+    # Errors first, then warnings, each in line order; drop exact repeats
+    unique = list({(d.severity, d.line, d.message): d for d in diagnostics}.values())
+    return sorted(unique, key=lambda d: (d.severity != "error", d.line or 0))
@@ -1,12 +1,12 @@
 # main.py - Fixed version
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from fastapi.responses import FileResponse, JSONResponse, RedirectResponse, Response, StreamingResponse
 import json
 import asyncio
 from functools import lru_cache
 import time
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 import os
 from pathlib import Path
@@ -49,19 +49,22 @@ class State(TypedDict):
     user_name: str  # User name for PDF authorship
 
 # Import your tools
-from arxiv_tool import arxiv_search
-from read_pdf import read_pdf
+from arxiv_tool import arxiv_search, arxiv_lookup
+from read_pdf import read_pdf, read_pdfs, query_paper
 from write_pdf import render_latex_pdf
+from pdf_prefetch import PDF_PREFETCH_TOP_N, get_prefetcher, prefetch_search_results
+from langchain_core.runnables import RunnableConfig
 from langgraph.prebuilt import ToolNode
 
-tools = [arxiv_search, read_pdf, render_latex_pdf]
+tools = [arxiv_search, arxiv_lookup, read_pdf, read_pdfs, query_paper, render_latex_pdf]
 
 # Custom tool node that can pass user_id to tools
-def custom_tool_node(state: State):
+async def custom_tool_node(state: State, config: RunnableConfig):
     """Custom tool node that passes user_id and user_name to tools that need it"""
     messages = state["messages"]
     user_id = state.get("user_id")
     user_name = state.get("user_name")
+    thread_id = config.get("configurable", {}).get("thread_id")
 
     last_message = messages[-1]
     if not hasattr(last_message, 'tool_calls') or not last_message.tool_calls:
@@ -90,9 +93,18 @@ def custom_tool_node(state: State):
                     if user_name and "user_name" not in tool_args:
                         tool_args["user_name"] = user_name
                     print(f"DEBUG: render_latex_pdf args: user_id={user_id}, user_name={user_name}")
+
+                # Don't download a PDF twice if a prefetch of it is still running
+                if PDF_PREFETCH_TOP_N > 0 and tool_name in ("read_pdf", "read_pdfs"):
+                    urls = tool_args.get("urls") or [tool_args.get("url")]
+                    await get_prefetcher().wait_for([url for url in urls if url])
                 
-                # Call the tool
-                result = tool_to_call.invoke(tool_args)
+                # Call the tool (sync tools run in a worker thread, async ones on the loop)
+                result = await tool_to_call.ainvoke(tool_args)
+
+                # Speculatively fetch the top hits the model is likely to read next
+                if tool_name == "arxiv_search":
+                    prefetch_search_results(thread_id, result)
                 
                 # Create tool message
                 from langchain_core.messages import ToolMessage
@@ -215,7 +227,10 @@ Write each section in full detail. Do not summarize. Provide comprehensive analy
 
 **Critical Tools:**
 - `arxiv_search(topic)` - Find papers on arXiv
-- `read_pdf(url)` - Extract full paper text
+- `arxiv_lookup(ids)` - Fetch metadata for papers you already know by arXiv ID (many IDs in one call)
+- `read_pdf(url, pages=None, sections=None)` - Extract paper text; pass `sections` (e.g. ["abstract", "method", "results"]) or `pages` (e.g. "1-3") to read only part of a long paper. Long papers come back as a digest with a paper_id
+- `read_pdfs(urls, sections=None)` - Read several papers in one call (concurrently); use this instead of consecutive read_pdf calls
+- `query_paper(paper_id, question, k)` - Retrieve the k most relevant passages of a paper already read with read_pdf; prefer this over re-reading full text
 - `render_latex_pdf(content, topic)` - Compile LaTeX to PDF
   IMPORTANT:
   - Always provide a descriptive topic when generating PDFs
@@ -282,6 +297,10 @@ class TitleRequest(BaseModel):
 class TitleResponse(BaseModel):
     title: str
 
+class DeletePapersRequest(BaseModel):
+    user_id: str
+    filenames: List[str] = Field(..., min_length=1)  # always explicit; there is no delete-all
+
 # ==================== HELPER FUNCTIONS ====================
 
 async def generate_conversation_title(first_message: str, response: str = "") -> str:
@@ -389,6 +408,30 @@ def load_conversation_history(conversation_id: str) -> List[Dict[str, Any]]:
         print(f"Error loading conversation history: {e}")
         return []
 
+# ==================== LIFECYCLE ====================
+
+@app.on_event("startup")
+async def warm_up_latex():
+    from latex_compiler import start_warm_up
+    from upload_outbox import get_outbox
+    start_warm_up()
+    # Resume uploads left pending by a previous run
+    get_outbox()
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    from arxiv_client import close_arxiv_client
+    from pdf_extract import shutdown_extract_pool
+    from latex_compiler import close_compile_scheduler
+    from upload_outbox import stop_outbox
+    from supabase_async import close_async_storage
+    get_prefetcher().cancel_all()
+    stop_outbox()
+    await close_arxiv_client()
+    await close_async_storage()
+    await close_compile_scheduler()
+    shutdown_extract_pool()
+
 # ==================== ENDPOINTS ====================
 
 @app.get("/")
@@ -399,6 +442,45 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "research-agent"}
 
+@app.get("/api/arxiv/cache/stats")
+async def arxiv_cache_stats():
+    """Hit/miss counters and usage of the arXiv result cache"""
+    from arxiv_cache import get_cache
+    from arxiv_client import get_arxiv_client
+    from arxiv_index import get_index
+    index = get_index()
+    return {
+        **get_cache().stats(),
+        "client": get_arxiv_client().stats(),
+        "index_entries": index.count() if index is not None else None,
+        "pdf_prefetch": get_prefetcher().stats(),
+    }
+
+@app.get("/api/uploads/outbox")
+async def upload_outbox_status(events: int = 50):
+    """Pending/finished counts, recent events and failed jobs of the PDF upload outbox"""
+    from upload_outbox import get_outbox
+    outbox = get_outbox()
+    if outbox is None:
+        raise HTTPException(status_code=503, detail="Upload outbox unavailable")
+    return {
+        **outbox.stats(),
+        "events": outbox.recent_events(events),
+        "failed": outbox.failed_jobs(),
+    }
+
+@app.get("/api/latex/metrics")
+async def latex_metrics():
+    """Queue depth and compile-time metrics of the LaTeX compile scheduler"""
+    from latex_cache import get_compile_cache
+    from latex_compiler import get_compile_scheduler, warmup_status
+    compile_cache = get_compile_cache()
+    return {
+        **get_compile_scheduler().stats(),
+        "cache": compile_cache.stats() if compile_cache is not None else None,
+        "warmup": warmup_status,
+    }
+
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """
@@ -443,8 +525,13 @@ async def chat(request: ChatRequest):
         
         # Run the graph
         result = None
-        for s in graph.stream(input_data, config, stream_mode="values"):
-            result = s["messages"][-1]
+        try:
+            async for s in graph.astream(input_data, config, stream_mode="values"):
+                result = s["messages"][-1]
+        finally:
+            # Prefetches only serve the run that queued them: drop what is left once it
+            # ends, whether it finished, failed or the client went away
+            get_prefetcher().cancel(request.conversation_id)
         
         if not result:
             raise HTTPException(status_code=500, detail="No response from agent")
@@ -629,7 +716,7 @@ async def chat_stream(request: ChatRequest):
                     "user_id": request.user_id
                 }
                 yield f"data: {json.dumps(final_data)}\n\n"
-                
+
             except Exception as e:
                 error_data = {
                     "type": "error",
@@ -637,6 +724,10 @@ async def chat_stream(request: ChatRequest):
                     "user_id": request.user_id
                 }
                 yield f"data: {json.dumps(error_data)}\n\n"
+            finally:
+                # Prefetches only serve the run that queued them: drop what is left once the
+                # stream ends, including when the client disconnects mid-stream
+                get_prefetcher().cancel(request.conversation_id)
         
         return StreamingResponse(
             generate(),
@@ -656,6 +747,36 @@ async def chat_stream(request: ChatRequest):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/arxiv/harvest")
+async def arxiv_harvest(topic: str, max_results: int = 1000, page_size: int = 200, start: int = 0):
+    """
+    Stream arXiv search results as NDJSON (one entry per line)
+    Pages through upstream results with arXiv's polite delay between calls
+    """
+    from arxiv_tool import _normalize_query
+    from arxiv_harvest import harvest_arxiv
+
+    if start < 0:
+        raise HTTPException(status_code=400, detail="start must not be negative")
+    try:
+        _normalize_query(topic)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def generate():
+        try:
+            async for entry in harvest_arxiv(topic, max_results=max_results, page_size=page_size, start=start):
+                yield json.dumps(entry) + "\n"
+        except Exception as e:
+            print(f"Error during arXiv harvest: {e}")
+            yield json.dumps({"error": str(e)}) + "\n"
+
+    return StreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/api/generate-title", response_model=TitleResponse)
 async def generate_title(request: TitleRequest):
     """Generate a title for a conversation"""
@@ -670,41 +791,103 @@ async def generate_title(request: TitleRequest):
         return TitleResponse(title=fallback_title)
 
 @app.get("/api/papers/download/{filename}")
-async def download_paper(filename: str, user_id: str = None):
-    """Download generated PDF paper from Supabase or local storage"""
+async def download_paper(filename: str, request: Request, user_id: str = None, mode: str = None):
+    """Download generated PDF paper from Supabase or local storage.
+
+    mode=redirect (default: PAPER_DOWNLOAD_MODE) answers 302 to a cached
+    signed Supabase URL, so no bytes pass through this process. Otherwise
+    responses are streamed, support Range requests and carry an ETag
+    (If-None-Match answers 304), and Supabase downloads are kept in a local
+    hot-file cache so repeat downloads are served from disk. A cached copy
+    not validated for SERVED_PDF_REVALIDATE seconds is checked against
+    Supabase by ETag first, so deleted or replaced objects are not served.
+    """
+    from paper_download import (
+        PAPER_DOWNLOAD_MODE, etag_matches, fill_cache, get_served_pdf_cache, local_etag,
+        signed_download_url, tee_to_cache,
+    )
+    from supabase_async import get_async_storage
+    mode = mode or PAPER_DOWNLOAD_MODE
+    if mode not in ("proxy", "redirect"):
+        raise HTTPException(status_code=400, detail="mode must be 'proxy' or 'redirect'")
+    if_none_match = request.headers.get("if-none-match")
+    disposition = {"Content-Disposition": f"attachment; filename={filename}"}
+
+    def from_disk(path: Path, etag: str) -> Response:
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        # FileResponse streams from disk and handles Range/If-Range itself
+        return FileResponse(
+            path=path,
+            media_type="application/pdf",
+            filename=filename,
+            headers={**disposition, "ETag": etag},
+        )
+
     try:
         # Try Supabase first if user_id is provided
+        if user_id and mode == "redirect":
+            storage = get_async_storage()
+            signed = await signed_download_url(storage, user_id, filename) if storage else None
+            if signed:
+                url, remaining = signed
+                # The browser may reuse the redirect for as long as the URL stays valid
+                return RedirectResponse(
+                    url, status_code=302, headers={"Cache-Control": f"private, max-age={int(remaining)}"}
+                )
+            print(f"[FASTAPI] Could not sign {user_id}/{filename}; falling back to proxying")
+
         if user_id:
-            from supabase_storage import get_storage
-            storage = get_storage()
+            cache = get_served_pdf_cache()
+            cached = await asyncio.to_thread(cache.get, user_id, filename) if cache else None
+            if cached and cached[2]:
+                print(f"[FASTAPI] Serving cached copy: {user_id}/{filename}")
+                return from_disk(*cached[:2])
+
+            storage = get_async_storage()
 
             if storage:
-                print(f"[FASTAPI] Attempting Supabase download: {user_id}/{filename}")
-                success, content, error = storage.download_pdf(user_id, filename)
-
-                if success and content:
-                    print(f"[FASTAPI] ✓ Downloaded from Supabase: {len(content)} bytes")
-                    from fastapi.responses import Response
-                    return Response(
-                        content=content,
+                print(f"[FASTAPI] Streaming from Supabase: {user_id}/{filename}")
+                # A stale cached copy is revalidated: 304 keeps it, 200 replaces it, an error drops it
+                upstream = await storage.open_pdf_stream(
+                    user_id, filename, if_none_match=cached[1] if cached else None
+                )
+                if cached:
+                    if upstream is not None and upstream.status_code == 304:
+                        await asyncio.to_thread(cache.mark_validated, user_id, filename)
+                        return from_disk(*cached[:2])
+                    if upstream is None or upstream.status_code >= 500:
+                        print(f"[FASTAPI] Storage unavailable; serving unvalidated copy: {user_id}/{filename}")
+                        return from_disk(*cached[:2])
+                    if upstream.status_code != 200:
+                        # Deleted or no longer readable in storage
+                        await asyncio.to_thread(cache.invalidate, user_id, filename)
+                if upstream is not None and upstream.status_code == 200:
+                    etag = upstream.headers.get("ETag")
+                    if etag_matches(if_none_match, etag):
+                        await upstream.aclose()
+                        return Response(status_code=304, headers={"ETag": etag})
+                    if cache and request.headers.get("range"):
+                        # Byte ranges need a seekable file: fetch it once, then serve the range
+                        return from_disk(*await fill_cache(upstream, cache, user_id, filename))
+                    headers = dict(disposition)
+                    if etag:
+                        headers["ETag"] = etag
+                    if "content-length" in upstream.headers:
+                        headers["Content-Length"] = upstream.headers["content-length"]
+                    return StreamingResponse(
+                        tee_to_cache(upstream, cache, user_id, filename),
                         media_type="application/pdf",
-                        headers={"Content-Disposition": f"attachment; filename={filename}"}
+                        headers=headers,
                     )
-                else:
-                    print(f"[FASTAPI] Supabase download failed: {error}")
 
         # Fallback to local output directory
         output_dir = Path(__file__).parent / "output"
         file_path = output_dir / filename
 
-        if file_path.exists():
+        if file_path.is_file():
             print(f"[FASTAPI] Serving file from local storage: {file_path}")
-            return FileResponse(
-                path=file_path,
-                media_type="application/pdf",
-                filename=filename,
-                headers={"Content-Disposition": f"attachment; filename={filename}"}
-            )
+            return from_disk(file_path, local_etag(file_path))
         else:
             raise HTTPException(status_code=404, detail="PDF file not found in Supabase or local storage")
 
@@ -716,6 +899,57 @@ async def download_paper(filename: str, user_id: str = None):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Failed to download PDF: {str(e)}")
 
+@app.get("/api/papers/storage")
+async def list_stored_papers(
+    user_id: str, signed: bool = False, sort_by: str = "name", order: str = "asc", search: str = None
+):
+    """List every PDF of a user in Supabase Storage.
+
+    signed=true adds a signed download URL per paper, signed in bulk
+    (SUPABASE_BULK_BATCH_SIZE paths per request).
+    """
+    import httpx
+    from paper_download import SIGNED_URL_TTL
+    from supabase_async import get_async_storage
+    storage = get_async_storage()
+    if storage is None:
+        raise HTTPException(status_code=503, detail="Supabase storage not configured")
+    try:
+        entries = [entry async for entry in storage.iter_user_pdfs(user_id, sort_by=sort_by, order=order, search=search)]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Failed to list papers: {e}")
+    urls = await storage.get_signed_urls(
+        user_id, [entry["name"] for entry in entries], SIGNED_URL_TTL, download=True
+    ) if signed else {}
+    papers = []
+    for entry in entries:
+        paper = {
+            "filename": entry["name"],
+            "size": (entry.get("metadata") or {}).get("size"),
+            "created": entry.get("created_at"),
+            "updated": entry.get("updated_at"),
+        }
+        if signed:
+            paper["url"] = urls.get(entry["name"])
+        papers.append(paper)
+    return {"papers": papers, "count": len(papers)}
+
+@app.post("/api/papers/delete")
+async def delete_papers(request: DeletePapersRequest):
+    """Delete the named PDFs of a user from Supabase Storage in bulk"""
+    from supabase_async import get_async_storage
+    storage = get_async_storage()
+    if storage is None:
+        raise HTTPException(status_code=503, detail="Supabase storage not configured")
+    filenames = list(dict.fromkeys(request.filenames))
+    # Also drops the served-PDF and signed-URL caches of deleted papers
+    deleted, error = await storage.delete_pdfs(request.user_id, filenames)
+    if error and not deleted:
+        raise HTTPException(status_code=502, detail=error)
+    return {"deleted": deleted, "count": len(deleted), "requested": len(filenames), "error": error}
+
 @app.get("/api/papers/list")
 async def list_papers():
     """List all generated PDF papers"""
@@ -736,7 +970,8 @@ async def list_papers():
                 })
             
             # Also look for PDFs inside subdirectories
-            subdirs = [d for d in path.iterdir() if d.is_dir()]
+            # Skip hidden directories such as the compile cache (output/.cache)
+            subdirs = [d for d in path.iterdir() if d.is_dir() and not d.name.startswith(".")]
             for subdir in subdirs:
                 subdir_pdfs = list(subdir.glob("*.pdf"))
                 for pdf_file in subdir_pdfs:
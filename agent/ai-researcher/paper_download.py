@@ -0,0 +1,295 @@
+# paper_download.py - Streaming, range-capable downloads of generated PDFs with a hot-file cache
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import AsyncIterator, Iterable, Optional
+
+import httpx
+
+from supabase_async import AsyncSupabaseStorage
+
+DEFAULT_SERVED_CACHE_DIR = Path(__file__).parent / "cache" / "served_pdfs"
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+# A cached copy validated longer ago than this is checked against Supabase (by ETag) before serving
+SERVED_PDF_REVALIDATE = float(os.getenv("SERVED_PDF_REVALIDATE", "300"))
+
+# "proxy" streams bytes through this process; "redirect" answers 302 to a signed Supabase URL
+PAPER_DOWNLOAD_MODE = os.getenv("PAPER_DOWNLOAD_MODE", "proxy")
+SIGNED_URL_TTL = int(os.getenv("SIGNED_URL_TTL", "3600"))
+# A cached URL is not handed out when it has less than this left to live
+SIGNED_URL_EXPIRY_MARGIN = int(os.getenv("SIGNED_URL_EXPIRY_MARGIN", "300"))
+SIGNED_URL_CACHE_SIZE = int(os.getenv("SIGNED_URL_CACHE_SIZE", "10000"))
+
+
+def etag_matches(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+    """RFC 9110 weak comparison of an If-None-Match header against our ETag"""
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == bare for candidate in if_none_match.split(","))
+
+
+def local_etag(path: Path) -> str:
+    stat = path.stat()
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+class ServedPdfCache:
+    """Recently served PDFs on local disk, so repeat downloads skip Supabase.
+
+    Keyed by user and filename. Each file has an .etag sidecar whose mtime
+    records when the copy was last known to match Supabase; copies older
+    than `revalidate_after` are revalidated with If-None-Match before being
+    served. Uploads and deletes through the storage clients drop entries
+    right away (see forget_pdfs). Files are evicted least-recently-used once
+    the directory exceeds `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        root: Path = DEFAULT_SERVED_CACHE_DIR,
+        max_bytes: int = 1024 ** 3,
+        revalidate_after: float = SERVED_PDF_REVALIDATE,
+    ):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.revalidate_after = revalidate_after
+        self.hits = 0
+        self.misses = 0
+
+    def path_for(self, user_id: str, filename: str) -> Path:
+        key = hashlib.sha256(f"{user_id}/{filename}".encode("utf-8")).hexdigest()
+        return self.root / key[:2] / f"{key}.pdf"
+
+    def get(self, user_id: str, filename: str) -> Optional[tuple[Path, str, bool]]:
+        """(path, etag, fresh) of a cached copy, if there is one; stale copies need revalidating"""
+        path = self.path_for(user_id, filename)
+        etag_path = path.with_suffix(".etag")
+        try:
+            etag = etag_path.read_text().strip()
+            validated = etag_path.stat().st_mtime
+            # Touch so eviction keeps recently used documents
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path, etag, time.time() - validated < self.revalidate_after
+
+    def mark_validated(self, user_id: str, filename: str) -> None:
+        """Record that Supabase confirmed the cached copy is current"""
+        try:
+            os.utime(self.path_for(user_id, filename).with_suffix(".etag"))
+        except FileNotFoundError:
+            pass
+
+    def temp_path(self, user_id: str, filename: str) -> Path:
+        path = self.path_for(user_id, filename)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.{id(path)}.tmp")
+
+    def commit(self, user_id: str, filename: str, tmp_path: Path, etag: str) -> Path:
+        """Move a fully written temp file into place, then record its ETag.
+
+        The old sidecar goes first and the new one is only written once the
+        PDF is in place, so a reader never pairs an ETag with the wrong bytes:
+        in between, get() sees a miss.
+        """
+        path = self.path_for(user_id, filename)
+        etag_path = path.with_suffix(".etag")
+        etag_path.unlink(missing_ok=True)
+        os.replace(tmp_path, path)
+        etag_tmp = etag_path.with_name(f"{etag_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        etag_tmp.write_text(etag)
+        os.replace(etag_tmp, etag_path)
+        self._evict()
+        return path
+
+    def invalidate(self, user_id: str, filename: str) -> None:
+        path = self.path_for(user_id, filename)
+        path.unlink(missing_ok=True)
+        path.with_suffix(".etag").unlink(missing_ok=True)
+
+    def _evict(self) -> None:
+        """Remove least-recently-used files once the directory exceeds max_bytes"""
+        files = []
+        for p in self.root.glob("*/*.pdf"):
+            try:
+                stat = p.stat()
+            except FileNotFoundError:
+                # Already evicted or invalidated by another worker process
+                continue
+            files.append((stat.st_mtime, stat.st_size, p))
+        total = sum(size for _, size, _ in files)
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            path.with_suffix(".etag").unlink(missing_ok=True)
+            total -= size
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "max_bytes": self.max_bytes}
+
+
+# Global instance - lazy initialization
+_served_cache = None
+_served_cache_lock = threading.Lock()
+
+
+def get_served_pdf_cache() -> Optional[ServedPdfCache]:
+    """Get or create the served-PDF cache (SERVED_PDF_CACHE_DIR, SERVED_PDF_CACHE_MAX_BYTES)"""
+    global _served_cache
+    with _served_cache_lock:
+        if _served_cache is None:
+            root = Path(os.getenv("SERVED_PDF_CACHE_DIR", str(DEFAULT_SERVED_CACHE_DIR)))
+            try:
+                _served_cache = ServedPdfCache(
+                    root=root,
+                    max_bytes=int(os.getenv("SERVED_PDF_CACHE_MAX_BYTES", str(1024 ** 3))),
+                    revalidate_after=SERVED_PDF_REVALIDATE,
+                )
+            except OSError as e:
+                print(f"WARNING: Served PDF cache unavailable at {root}: {e}")
+                return None
+        return _served_cache
+
+
+class SignedUrlCache:
+    """Signed download URLs per (user_id, filename), reused until shortly before expiry.
+
+    Signing is a round trip to Supabase; with this cache, a repeat download
+    in redirect mode costs nothing but a dictionary lookup. Bounded to
+    `max_entries`, least recently used first out.
+    """
+
+    def __init__(self, margin: float = SIGNED_URL_EXPIRY_MARGIN, max_entries: int = SIGNED_URL_CACHE_SIZE):
+        self.margin = margin
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple[str, str], tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: str, filename: str) -> Optional[tuple[str, float]]:
+        """(url, seconds of validity left beyond the margin), if a usable URL is cached"""
+        key = (user_id, filename)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                url, expires_at = entry
+                remaining = expires_at - self.margin - time.time()
+                if remaining > 0:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return url, remaining
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, user_id: str, filename: str, url: str, expires_in: float, signed_at: float) -> None:
+        with self._lock:
+            self._entries[(user_id, filename)] = (url, signed_at + expires_in)
+            self._entries.move_to_end((user_id, filename))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str, filename: str) -> None:
+        with self._lock:
+            self._entries.pop((user_id, filename), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+signed_url_cache = SignedUrlCache()
+
+
+def forget_pdfs(user_id: str, filenames: Iterable[str]) -> None:
+    """Drop cached copies and signed URLs of objects that were overwritten or deleted.
+
+    The served-PDF cache is shared on disk by all workers; signed URLs are
+    per process, and a stale one for a deleted object only leads to a 404
+    from Supabase.
+    """
+    cache = get_served_pdf_cache()
+    for filename in filenames:
+        signed_url_cache.invalidate(user_id, filename)
+        if cache is not None:
+            cache.invalidate(user_id, filename)
+
+
+async def signed_download_url(storage: AsyncSupabaseStorage, user_id: str, filename: str) -> Optional[tuple[str, float]]:
+    """(signed url, seconds it stays usable) from the cache or freshly signed; None if signing failed"""
+    cached = signed_url_cache.get(user_id, filename)
+    if cached is not None:
+        return cached
+    # Time the URL from before the request, so its expiry is never overestimated
+    signed_at = time.time()
+    url = await storage.get_signed_url(user_id, filename, SIGNED_URL_TTL, download=filename)
+    if url is None:
+        return None
+    signed_url_cache.put(user_id, filename, url, SIGNED_URL_TTL, signed_at)
+    return url, max(0.0, SIGNED_URL_TTL - signed_url_cache.margin)
+
+
+async def tee_to_cache(
+    upstream: httpx.Response,
+    cache: Optional[ServedPdfCache],
+    user_id: str,
+    filename: str,
+) -> AsyncIterator[bytes]:
+    """Yield the upstream body chunk by chunk while writing it into the cache.
+
+    The cached copy is only committed once the whole body arrived; a client
+    that disconnects early leaves nothing behind. Disk writes, the commit
+    and eviction run in worker threads so the event loop never waits on them.
+    """
+    out = None
+    if cache is not None:
+        tmp_path = await asyncio.to_thread(cache.temp_path, user_id, filename)
+        out = await asyncio.to_thread(open, tmp_path, "wb")
+    hasher = hashlib.sha256()
+    complete = False
+    try:
+        async for chunk in upstream.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+            if out is not None:
+                await asyncio.to_thread(out.write, chunk)
+                hasher.update(chunk)
+            yield chunk
+        complete = True
+    finally:
+        await upstream.aclose()
+        if out is not None:
+            etag = (upstream.headers.get("ETag") or f'"{hasher.hexdigest()}"') if complete else None
+            await asyncio.to_thread(_finish_cache_write, cache, user_id, filename, out, tmp_path, etag)
+
+
+def _finish_cache_write(cache: ServedPdfCache, user_id: str, filename: str, out, tmp_path: Path, etag: Optional[str]) -> None:
+    """Close a cache temp file, then commit it under etag, or discard it if the body was incomplete"""
+    out.close()
+    if etag is not None:
+        cache.commit(user_id, filename, tmp_path, etag)
+    else:
+        tmp_path.unlink(missing_ok=True)
+
+
+async def fill_cache(upstream: httpx.Response, cache: ServedPdfCache, user_id: str, filename: str) -> tuple[Path, str]:
+    """Download the whole upstream body into the cache (for Range requests on a miss)"""
+    async for _ in tee_to_cache(upstream, cache, user_id, filename):
+        pass
+    cached = await asyncio.to_thread(cache.get, user_id, filename)
+    if cached is None:
+        raise OSError(f"Cached copy of {filename} disappeared")
+    path, etag, _ = cached
+    return path, etag
@@ -0,0 +1,150 @@
+# paper_index.py - Local BM25 passage index over papers read with read_pdf
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from pdf_cache import normalize_pdf_url
+
+DEFAULT_PAPER_INDEX_PATH = Path(__file__).parent / "cache" / "paper_index.sqlite3"
+
+# Passages are windows of PASSAGE_WORDS words overlapping by PASSAGE_OVERLAP,
+# so a sentence cut at a window edge is still whole in the neighbouring one.
+PASSAGE_WORDS = int(os.getenv("PAPER_PASSAGE_WORDS", "180"))
+PASSAGE_OVERLAP = int(os.getenv("PAPER_PASSAGE_OVERLAP", "30"))
+MAX_PASSAGES_PER_QUERY = 20
+
+_TOKEN_RE = re.compile(r"[A-Za-z0-9]+")
+
+
+def paper_id_for(url: str, sha256: str) -> str:
+    """Short stable ID the model can pass back: the arXiv ID, else a content hash prefix"""
+    key = normalize_pdf_url(url)
+    if key.startswith("arxiv:"):
+        return key[len("arxiv:"):]
+    return sha256[:12]
+
+
+def chunk_pages(pages: list[str], words: int = PASSAGE_WORDS, overlap: int = PASSAGE_OVERLAP) -> list[tuple[int, str]]:
+    """Split page texts into overlapping passages, returning (0-based start page, text)"""
+    tokens = []  # (page, word)
+    for page_index, text in enumerate(pages):
+        tokens.extend((page_index, word) for word in text.split())
+    step = max(1, words - overlap)
+    passages = []
+    for start in range(0, len(tokens), step):
+        window = tokens[start:start + words]
+        passages.append((window[0][0], " ".join(word for _, word in window)))
+        if start + words >= len(tokens):
+            break
+    return passages
+
+
+class PaperIndex:
+    """Passages of read papers in SQLite FTS5, ranked with BM25.
+
+    Papers are indexed once per content hash; reading the same PDF again (or
+    through another URL) is a no-op. Lives on disk next to the other caches.
+    """
+
+    def __init__(self, path: Path = DEFAULT_PAPER_INDEX_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS papers (
+                paper_id TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                pages INTEGER NOT NULL,
+                passages INTEGER NOT NULL,
+                indexed REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS passages_fts USING fts5(text, paper_id UNINDEXED, page UNINDEXED)"
+        )
+
+    def add_paper(self, paper_id: str, url: str, sha256: str, pages: list[str]) -> int:
+        """Index the pages of a paper, returning the number of passages (0 if already indexed)"""
+        with self._lock:
+            row = self._conn.execute("SELECT sha256 FROM papers WHERE paper_id = ?", (paper_id,)).fetchone()
+            if row is not None and row[0] == sha256:
+                return 0
+
+        passages = chunk_pages(pages)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute("DELETE FROM passages_fts WHERE paper_id = ?", (paper_id,))
+                self._conn.executemany(
+                    "INSERT INTO passages_fts (text, paper_id, page) VALUES (?, ?, ?)",
+                    ((text, paper_id, page) for page, text in passages),
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO papers (paper_id, url, sha256, pages, passages, indexed) VALUES (?, ?, ?, ?, ?, ?)",
+                    (paper_id, url, sha256, len(pages), len(passages), time.time()),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(passages)
+
+    def has_paper(self, paper_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM papers WHERE paper_id = ?", (paper_id,)).fetchone() is not None
+
+    def query(self, paper_id: str, question: str, k: int = 5) -> list[dict]:
+        """Return the k passages of paper_id most relevant to question, best first"""
+        tokens = _TOKEN_RE.findall(question)
+        if not tokens:
+            return []
+        # Quote each token so FTS5 operators in user text are taken literally
+        match = " OR ".join(f'"{token}"' for token in tokens)
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT page, text, bm25(passages_fts) FROM passages_fts
+                WHERE passages_fts MATCH ? AND paper_id = ?
+                ORDER BY bm25(passages_fts)
+                LIMIT ?
+                """,
+                (match, paper_id, min(k, MAX_PASSAGES_PER_QUERY)),
+            ).fetchall()
+        # bm25() is lower-is-better; report it as a positive score
+        return [{"page": page + 1, "text": text, "score": round(-score, 3)} for page, text, score in rows]
+
+    def stats(self) -> dict:
+        with self._lock:
+            papers, passages = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(passages), 0) FROM papers"
+            ).fetchone()
+        return {"papers": papers, "passages": passages}
+
+
+# Global instance - lazy initialization
+_paper_index = None
+_paper_index_lock = threading.Lock()
+
+
+def get_paper_index() -> Optional[PaperIndex]:
+    """Get or create the passage index (None if it cannot be opened)"""
+    global _paper_index
+    with _paper_index_lock:
+        if _paper_index is None:
+            path = Path(os.getenv("PAPER_INDEX_PATH", str(DEFAULT_PAPER_INDEX_PATH)))
+            try:
+                _paper_index = PaperIndex(path)
+            except (sqlite3.Error, OSError) as e:
+                print(f"WARNING: Paper passage index unavailable at {path}: {e}")
+                return None
+        return _paper_index
@@ -0,0 +1,261 @@
+# pdf_cache.py - Content-addressed on-disk cache for downloaded PDFs
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+DEFAULT_PDF_CACHE_DIR = Path(__file__).parent / "cache" / "pdfs"
+
+_ARXIV_PDF_RE = re.compile(
+    r"^(?:https?://)?(?:www\.|export\.)?arxiv\.org/(?:abs|pdf)/(?P<id>.+?)(?:\.pdf)?/?$",
+    re.IGNORECASE,
+)
+
+
+def normalize_pdf_url(url: str) -> str:
+    """Map equivalent PDF URLs to one cache key.
+
+    arXiv abs/pdf links (http or https, with or without .pdf, export. mirror)
+    become "arxiv:<id>"; other URLs are lower-cased in scheme/host and lose
+    their fragment.
+    """
+    url = url.strip()
+    match = _ARXIV_PDF_RE.match(url.split("#", 1)[0].split("?", 1)[0])
+    if match:
+        return f"arxiv:{match.group('id')}"
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, ""))
+
+
+def _is_immutable(key: str) -> bool:
+    """Versioned arXiv PDFs (e.g. arxiv:2401.00001v2) never change"""
+    return key.startswith("arxiv:") and re.search(r"v\d+$", key) is not None
+
+
+@dataclass
+class CachedPdf:
+    key: str
+    sha256: str
+    path: Path
+    size: int
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched: float
+
+
+class PdfCache:
+    """Blob store keyed by SHA-256 with a SQLite index of URL -> blob.
+
+    Identical documents reached through different URLs share one blob. Blobs
+    are evicted least-recently-used once their total size exceeds `max_bytes`.
+    Entries older than `revalidate_after` seconds are revalidated with
+    ETag / Last-Modified before being reused.
+    """
+
+    def __init__(self, root: Path = DEFAULT_PDF_CACHE_DIR, max_bytes: int = 2 * 1024 ** 3, revalidate_after: float = 24 * 3600):
+        self.root = Path(root)
+        self.blob_dir = self.root / "blobs"
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.revalidate_after = revalidate_after
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.root / "index.sqlite3"), timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS urls (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS blobs (
+                sha256 TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                accessed REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS urls_sha256 ON urls(sha256)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS blobs_accessed ON blobs(accessed)")
+
+    def blob_path(self, sha256: str) -> Path:
+        return self.blob_dir / sha256[:2] / sha256
+
+    def lookup(self, url: str) -> Optional[CachedPdf]:
+        """Return the cached document for url, if its blob is still on disk"""
+        key = normalize_pdf_url(url)
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT urls.sha256, blobs.size, urls.etag, urls.last_modified, urls.fetched
+                FROM urls JOIN blobs ON blobs.sha256 = urls.sha256
+                WHERE urls.key = ?
+                """,
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            path = self.blob_path(row[0])
+            if not path.exists():
+                # Blob removed behind our back (e.g. another worker evicted it)
+                self._conn.execute("DELETE FROM urls WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE blobs SET accessed = ? WHERE sha256 = ?", (time.time(), row[0]))
+        return CachedPdf(key, row[0], path, row[1], row[2], row[3], row[4])
+
+    @contextmanager
+    def pinned(self, entry: CachedPdf) -> Iterator[Optional[Path]]:
+        """Yield a private hard link to entry's blob, or None if it was evicted since lookup.
+
+        Eviction only unlinks the blob's own name, so the link stays readable
+        (by path, including from extraction worker processes) until the
+        context exits. A blob that is already gone is forgotten, making the
+        lookup a miss.
+        """
+        link = self.temp_path()
+        try:
+            os.link(entry.path, link)
+        except FileNotFoundError:
+            self.forget(entry)
+            link = None
+        except OSError:
+            # No hard links on this filesystem: read the shared blob directly
+            yield entry.path
+            return
+        try:
+            yield link
+        finally:
+            if link is not None:
+                link.unlink(missing_ok=True)
+
+    def forget(self, entry: CachedPdf) -> None:
+        """Drop the URL mapping of an entry whose blob disappeared"""
+        with self._lock:
+            self._conn.execute("DELETE FROM urls WHERE key = ? AND sha256 = ?", (entry.key, entry.sha256))
+
+    def is_fresh(self, entry: CachedPdf) -> bool:
+        return _is_immutable(entry.key) or time.time() - entry.fetched < self.revalidate_after
+
+    def mark_revalidated(self, entry: CachedPdf) -> None:
+        """Record a 304 Not Modified answer for entry"""
+        with self._lock:
+            self._conn.execute("UPDATE urls SET fetched = ? WHERE key = ?", (time.time(), entry.key))
+
+    def record(self, outcome: str) -> None:
+        """Count a lookup outcome: hit, revalidated or miss"""
+        with self._lock:
+            if outcome == "hit":
+                self.hits += 1
+            elif outcome == "revalidated":
+                self.revalidated += 1
+            else:
+                self.misses += 1
+
+    def temp_path(self) -> Path:
+        """A unique path inside the cache for streaming a download into"""
+        return self.blob_dir / f"download.{os.getpid()}.{threading.get_ident()}.{time.monotonic_ns()}.tmp"
+
+    def store_file(self, url: str, tmp_path: Path, sha256: str, size: int, etag: Optional[str] = None, last_modified: Optional[str] = None) -> CachedPdf:
+        """Move an already-hashed temp file into the blob store and point url at it"""
+        path = self.blob_path(sha256)
+        if path.exists():
+            Path(tmp_path).unlink(missing_ok=True)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, path)
+        return self._index(url, sha256, size, etag, last_modified)
+
+    def _index(self, url: str, sha256: str, size: int, etag: Optional[str], last_modified: Optional[str]) -> CachedPdf:
+        key = normalize_pdf_url(url)
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO blobs (sha256, size, accessed) VALUES (?, ?, ?)",
+                (sha256, size, now),
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO urls (key, url, sha256, etag, last_modified, fetched) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, url, sha256, etag, last_modified, now),
+            )
+            self._conn.execute("COMMIT")
+            self._evict(keep=sha256)
+        return CachedPdf(key, sha256, self.blob_path(sha256), size, etag, last_modified, now)
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        """Delete least-recently-used blobs until under max_bytes (lock held).
+
+        The blob named by `keep` (the one just stored) is never evicted.
+        """
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        victims = []
+        for sha256, size in self._conn.execute("SELECT sha256, size FROM blobs ORDER BY accessed ASC"):
+            if total <= self.max_bytes:
+                break
+            if sha256 == keep:
+                continue
+            victims.append(sha256)
+            total -= size
+        for sha256 in victims:
+            self._conn.execute("DELETE FROM urls WHERE sha256 = ?", (sha256,))
+            self._conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+            self.blob_path(sha256).unlink(missing_ok=True)
+        print(f"[PDF CACHE] Evicted {len(victims)} PDFs to stay under {self.max_bytes} bytes")
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        return {
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "blobs": count,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+# Global instance - lazy initialization
+_pdf_cache = None
+_pdf_cache_lock = threading.Lock()
+
+
+def get_pdf_cache() -> Optional[PdfCache]:
+    """Get or create the PDF cache (None if the cache directory is unusable)
+
+    Configured through PDF_CACHE_DIR, PDF_CACHE_MAX_BYTES (default 2GB) and
+    PDF_CACHE_REVALIDATE_AFTER (seconds, default 1 day).
+    """
+    global _pdf_cache
+    with _pdf_cache_lock:
+        if _pdf_cache is None:
+            root = Path(os.getenv("PDF_CACHE_DIR", str(DEFAULT_PDF_CACHE_DIR)))
+            try:
+                _pdf_cache = PdfCache(
+                    root=root,
+                    max_bytes=int(os.getenv("PDF_CACHE_MAX_BYTES", str(2 * 1024 ** 3))),
+                    revalidate_after=float(os.getenv("PDF_CACHE_REVALIDATE_AFTER", str(24 * 3600))),
+                )
+            except (sqlite3.Error, OSError) as e:
+                print(f"WARNING: PDF cache unavailable at {root}: {e}")
+                return None
+        return _pdf_cache
@@ -0,0 +1,158 @@
+# pdf_extract.py - PyPDF2 text extraction, optionally spread over a process pool
+import io
+import mmap
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import BinaryIO, Iterable, Iterator, Optional, Union
+
+from pdf_sections import outline_pages
+
+# Documents with fewer pages are extracted in-process; below this size the
+# cost of shipping the PDF to the workers outweighs the parallel speed-up.
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "24"))
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+MAX_PAGE_SPEC_PAGES = 5000
+
+# Raw PDF bytes, a path to a PDF file, or a seekable binary file object
+PdfSource = Union[bytes, str, BinaryIO]
+
+
+@contextmanager
+def _open_reader(source: PdfSource):
+    """Yield a PdfReader; files on disk are memory-mapped instead of read into memory"""
+    # Imported lazily so importing this module (and text-cache hits) stay cheap
+    import PyPDF2
+
+    if isinstance(source, (bytes, bytearray)):
+        yield PyPDF2.PdfReader(io.BytesIO(source))
+    elif hasattr(source, "read"):
+        source.seek(0)
+        yield PyPDF2.PdfReader(source)
+    else:
+        with open(source, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield PyPDF2.PdfReader(mapped)
+
+
+def _extract_range(source: PdfSource, start: int, stop: int) -> list[str]:
+    """Worker entry point: extract pages [start, stop) of the document"""
+    with _open_reader(source) as reader:
+        return [reader.pages[i].extract_text() for i in range(start, stop)]
+
+
+# Global pool - lazy initialization
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_extract_pool() -> ProcessPoolExecutor:
+    """Get or create the shared extraction process pool.
+
+    Workers are started with "spawn" so they never inherit the server's
+    threads, sockets or SQLite connections.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_EXTRACT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def shutdown_extract_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+def extract_pdf_pages(source: PdfSource, parallel: Optional[bool] = None) -> list[str]:
+    """Return the text of every page, in page order.
+
+    Args:
+        source: PDF bytes, a path to a PDF file or an open binary file (paths
+            are cheapest to hand to worker processes; file objects are always
+            extracted in-process)
+        parallel: False disables the process pool. Otherwise (None or True)
+            it is used only when there are several workers and the document
+            has at least PDF_PARALLEL_MIN_PAGES pages; smaller documents are
+            always cheaper to extract in-process
+    """
+    with _open_reader(source) as reader:
+        num_pages = len(reader.pages)
+        workers = PDF_EXTRACT_WORKERS
+        use_pool = (
+            parallel is not False
+            and workers > 1
+            and num_pages >= max(2, PDF_PARALLEL_MIN_PAGES)
+            and not hasattr(source, "read")
+        )
+
+        if not use_pool:
+            pages = []
+            for i, page in enumerate(reader.pages, 1):
+                print(f"Extracting text from page {i}/{num_pages}")
+                pages.append(page.extract_text())
+            return pages
+
+    # One contiguous page range per worker; results are joined back in order
+    chunk = -(-num_pages // workers)
+    ranges = [(start, min(start + chunk, num_pages)) for start in range(0, num_pages, chunk)]
+    print(f"Extracting {num_pages} pages in parallel across {len(ranges)} workers")
+    pool = get_extract_pool()
+    futures = [pool.submit(_extract_range, source, start, stop) for start, stop in ranges]
+    pages = []
+    for future in futures:
+        pages.extend(future.result())
+    return pages
+
+
+def parse_page_spec(spec: str) -> list[int]:
+    """Turn a 1-based page spec such as "1-3,5" into sorted 0-based page indices"""
+    pages = set()
+    for part in spec.replace(" ", "").split(","):
+        if not part:
+            continue
+        first, sep, last = part.partition("-")
+        if not first.isdigit() or (sep and not last.isdigit()):
+            raise ValueError(f"Invalid page range '{part}' (expected e.g. \"1-3,5\")")
+        start, stop = int(first), int(last) if sep else int(first)
+        if start < 1:
+            raise ValueError(f"Invalid page range '{part}': pages are numbered from 1")
+        if stop < start:
+            raise ValueError(f"Invalid page range '{part}': end is before start")
+        pages.update(range(start - 1, stop))
+        if len(pages) > MAX_PAGE_SPEC_PAGES:
+            raise ValueError(f"Page spec '{spec}' selects more than {MAX_PAGE_SPEC_PAGES} pages")
+    if not pages:
+        raise ValueError("Empty page spec")
+    return sorted(pages)
+
+
+def iter_pdf_pages(
+    source: PdfSource,
+    pages: Optional[Iterable[int]] = None,
+    sections: Optional[set[str]] = None,
+) -> Iterator[tuple[int, str]]:
+    """Lazily yield (page_index, text) pairs, extracting each page only when it is consumed.
+
+    Args:
+        source: PDF bytes, a path to a PDF file or an open binary file
+        pages: 0-based page indices to extract (out-of-range ones are skipped);
+            all pages by default
+        sections: Canonical section names the caller is looking for; when no
+            pages are given and the PDF has an outline, only the pages those
+            sections span are extracted
+    """
+    with _open_reader(source) as reader:
+        num_pages = len(reader.pages)
+        if pages is None and sections:
+            pages = outline_pages(reader, sections)
+        indices = range(num_pages) if pages is None else sorted(i for i in set(pages) if 0 <= i < num_pages)
+        for i in indices:
+            yield i, reader.pages[i].extract_text()
@@ -0,0 +1,132 @@
+# pdf_prefetch.py - Speculative background download of top arXiv search hits
+import asyncio
+import os
+import weakref
+from typing import Iterable, Optional
+
+from read_pdf import _cached_text, read_full_paper
+
+# Opt-in: number of top search results to prefetch (0 disables prefetching)
+PDF_PREFETCH_TOP_N = int(os.getenv("PDF_PREFETCH_TOP_N", "0"))
+PDF_PREFETCH_CONCURRENCY = int(os.getenv("PDF_PREFETCH_CONCURRENCY", "2"))
+# How long a read_pdf call waits for a prefetch of the same URL that is already running
+PDF_PREFETCH_WAIT = float(os.getenv("PDF_PREFETCH_WAIT", "30"))
+
+
+class PdfPrefetcher:
+    """Downloads and pre-extracts PDFs in the background, per conversation.
+
+    Prefetches go through the normal read_pdf path, so the PDF, its
+    extracted text and (for long papers) its passage index all end up in the
+    caches and the model's next read_pdf is a cache hit. At most
+    `concurrency` prefetches run at a time.
+
+    Prefetches live as long as the graph run that queued them: the chat
+    endpoints cancel the conversation's prefetches when the run ends. That
+    drops the queued ones; one that is already downloading runs to completion
+    in its worker thread, so its result is still cached.
+    """
+
+    def __init__(self, concurrency: int = PDF_PREFETCH_CONCURRENCY):
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks: dict[str, dict[str, asyncio.Task]] = {}  # thread_id -> url -> task
+        self.scheduled = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.skipped = 0
+
+    def schedule(self, thread_id: str, urls: Iterable[str]) -> int:
+        """Queue urls for prefetching on behalf of a conversation, returning how many were queued"""
+        tasks = self._tasks.setdefault(thread_id, {})
+        queued = 0
+        for url in urls:
+            if url in tasks or self._find(url) is not None:
+                continue
+            task = asyncio.ensure_future(self._prefetch(url))
+            tasks[url] = task
+            task.add_done_callback(lambda t, thread_id=thread_id, url=url: self._done(thread_id, url, t))
+            queued += 1
+        self.scheduled += queued
+        return queued
+
+    async def _prefetch(self, url: str) -> None:
+        async with self._semaphore:
+            cached = await asyncio.to_thread(_cached_text, url)
+            if cached is not None:
+                cached[1].close()
+                self.skipped += 1
+                return
+            await asyncio.to_thread(read_full_paper, url)
+            print(f"[PREFETCH] Cached {url}")
+
+    def _done(self, thread_id: str, url: str, task: asyncio.Task) -> None:
+        tasks = self._tasks.get(thread_id)
+        if tasks is not None:
+            tasks.pop(url, None)
+            if not tasks:
+                del self._tasks[thread_id]
+        if task.cancelled():
+            self.cancelled += 1
+        elif task.exception() is not None:
+            self.failed += 1
+            print(f"WARNING: Prefetch of {url} failed: {task.exception()}")
+        else:
+            self.completed += 1
+
+    def _find(self, url: str) -> Optional[asyncio.Task]:
+        for tasks in self._tasks.values():
+            if url in tasks:
+                return tasks[url]
+        return None
+
+    async def wait_for(self, urls: Iterable[str], timeout: float = PDF_PREFETCH_WAIT) -> None:
+        """Let running prefetches of urls finish, so a read does not download them a second time"""
+        pending = [task for task in map(self._find, urls) if task is not None]
+        if pending:
+            await asyncio.wait(pending, timeout=timeout)
+
+    def cancel(self, thread_id: str) -> None:
+        """Drop the queued prefetches of a conversation"""
+        for task in list(self._tasks.get(thread_id, {}).values()):
+            task.cancel()
+
+    def cancel_all(self) -> None:
+        for thread_id in list(self._tasks):
+            self.cancel(thread_id)
+
+    def stats(self) -> dict:
+        return {
+            "top_n": PDF_PREFETCH_TOP_N,
+            "pending": sum(len(tasks) for tasks in self._tasks.values()),
+            "scheduled": self.scheduled,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "skipped": self.skipped,
+        }
+
+
+# One prefetcher per event loop - its tasks and semaphore are bound to the loop
+_prefetchers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, PdfPrefetcher]" = weakref.WeakKeyDictionary()
+
+
+def get_prefetcher() -> PdfPrefetcher:
+    """Get or create the prefetcher for the running event loop"""
+    loop = asyncio.get_running_loop()
+    prefetcher = _prefetchers.get(loop)
+    if prefetcher is None:
+        prefetcher = PdfPrefetcher()
+        _prefetchers[loop] = prefetcher
+    return prefetcher
+
+
+def prefetch_search_results(thread_id: Optional[str], result) -> int:
+    """Queue the top PDF_PREFETCH_TOP_N PDF links of an arxiv_search result"""
+    if PDF_PREFETCH_TOP_N <= 0 or not thread_id or not isinstance(result, dict):
+        return 0
+    urls = [entry["pdf"] for entry in result.get("entries", [])[:PDF_PREFETCH_TOP_N] if entry.get("pdf")]
+    queued = get_prefetcher().schedule(thread_id, urls)
+    if queued:
+        print(f"[PREFETCH] Queued {queued} PDFs for conversation {thread_id}")
+    return queued
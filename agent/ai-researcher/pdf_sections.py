@@ -0,0 +1,130 @@
+# pdf_sections.py - Locate paper sections (abstract, method, results, ...) from headings
+import re
+from typing import Iterable, Optional
+
+# Canonical section name -> heading titles that introduce it (lower-case)
+SECTION_ALIASES = {
+    "abstract": ("abstract",),
+    "introduction": ("introduction",),
+    "related_work": ("related work", "prior work", "literature review"),
+    "background": ("background", "preliminaries"),
+    "method": ("method", "methods", "methodology", "approach", "proposed method", "our approach", "model"),
+    "experiments": ("experiments", "experiment", "experimental setup", "evaluation", "experimental evaluation"),
+    "results": ("results", "experimental results", "results and discussion", "findings"),
+    "discussion": ("discussion", "analysis", "limitations"),
+    "conclusion": ("conclusion", "conclusions", "concluding remarks", "conclusion and future work", "conclusions and future work"),
+    "references": ("references", "bibliography"),
+    "appendix": ("appendix", "appendices", "supplementary material"),
+}
+_ALIAS_TO_SECTION = {alias: name for name, aliases in SECTION_ALIASES.items() for alias in aliases}
+
+# "3 Method", "3. Method", "III. METHOD", "A Appendix" or an unnumbered known title
+_HEADING_RE = re.compile(
+    r"^\s*(?:(?P<num>\d{1,2}|[IVX]{1,5}|[A-H])[.)]?\s+)?(?P<title>[A-Za-z][A-Za-z &\-:]{2,60}?)\s*$"
+)
+# IEEE style "Abstract—We propose ..." with the body on the same line
+_INLINE_ABSTRACT_RE = re.compile(r"^\s*abstract\s*[—\-:.]\s*(?P<rest>\S.*)$", re.IGNORECASE)
+
+
+def normalize_section_name(name: str) -> Optional[str]:
+    """Map user input such as "Methodology" or "related work" to a canonical section"""
+    key = name.strip().lower().replace("_", " ")
+    if key.replace(" ", "_") in SECTION_ALIASES:
+        return key.replace(" ", "_")
+    return _ALIAS_TO_SECTION.get(key)
+
+
+def classify_heading(line: str) -> Optional[str]:
+    """Return the canonical section a heading line starts, "other" for a
+    numbered top-level heading we do not know, or None if it is not a heading.
+    """
+    match = _HEADING_RE.match(line)
+    if not match:
+        return None
+    title = match.group("title").strip().rstrip(":").lower()
+    section = _ALIAS_TO_SECTION.get(title)
+    if section:
+        return section
+    # Unknown titles only count as boundaries when numbered and title-cased
+    if match.group("num") and match.group("num").isdigit() and match.group("title")[0].isupper():
+        return "other"
+    return None
+
+
+def find_sections(pages: Iterable[tuple[int, str]], wanted: set[str]) -> dict[str, str]:
+    """Collect the text of the wanted sections from (page_number, text) pairs.
+
+    Pages are consumed lazily and iteration stops as soon as every wanted
+    section has been closed by a following heading, so callers that extract
+    pages on demand only pay for the pages they need.
+    """
+    found: dict[str, list[str]] = {}
+    current: Optional[str] = None
+    remaining = set(wanted)
+
+    for _, text in pages:
+        for line in text.splitlines():
+            inline = _INLINE_ABSTRACT_RE.match(line)
+            section = "abstract" if inline else classify_heading(line)
+            if section is not None:
+                if current in remaining and current in found:
+                    remaining.discard(current)
+                if not remaining:
+                    return {name: "\n".join(lines).strip() for name, lines in found.items()}
+                # Keep the first occurrence of each section (later ones are usually references to it)
+                current = section if section not in found else None
+                if current in wanted:
+                    found[current] = [inline.group("rest")] if inline else []
+                continue
+            if current in wanted:
+                found[current].append(line)
+
+    return {name: "\n".join(lines).strip() for name, lines in found.items()}
+
+
+def outline_pages(reader, wanted: set[str]) -> Optional[list[int]]:
+    """Use the PDF outline (bookmarks) to find the 0-based pages holding the wanted sections.
+
+    Returns None when the document has no usable outline.
+    """
+    try:
+        outline = reader.outline
+    except Exception:
+        return None
+
+    # Top-level bookmarks only; nested lists are subsections
+    starts = []
+    for item in outline:
+        if isinstance(item, list):
+            continue
+        try:
+            starts.append((classify_heading(item.title) or "other", reader.get_destination_page_number(item)))
+        except Exception:
+            continue
+    if not starts or not any(section in wanted for section, _ in starts):
+        return None
+
+    pages = set()
+    num_pages = len(reader.pages)
+    for i, (section, start) in enumerate(starts):
+        if section not in wanted:
+            continue
+        # Include the next section's first page: it holds the end of this one
+        end = starts[i + 1][1] if i + 1 < len(starts) else num_pages - 1
+        pages.update(range(start, min(max(end, start), num_pages - 1) + 1))
+    # The abstract is rarely bookmarked but always on the first page
+    if "abstract" in wanted:
+        pages.add(0)
+    return sorted(pages)
+
+
+def list_headings(pages: Iterable[tuple[int, str]]) -> list[str]:
+    """Top-level heading lines found in the pages, in document order"""
+    headings = []
+    for _, text in pages:
+        for line in text.splitlines():
+            if _INLINE_ABSTRACT_RE.match(line):
+                headings.append("Abstract")
+            elif classify_heading(line) is not None:
+                headings.append(line.strip())
+    return headings
@@ -0,0 +1,161 @@
+# pdf_text_cache.py - On-disk cache of extracted PDF text, sliceable by page
+import os
+import mmap
+import struct
+import threading
+from importlib import metadata
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_TEXT_CACHE_DIR = Path(__file__).parent / "cache" / "pdf_text"
+
+# Bump when the extraction logic changes so old cache files are ignored
+EXTRACTOR_REVISION = 1
+
+# File layout: MAGIC | page_count (u32) | page_count + 1 body offsets (u64) | UTF-8 body
+_MAGIC = b"RTXC1\0"
+_HEADER = struct.Struct("<6sI")
+
+
+def extractor_version() -> str:
+    """Identify the extractor without importing PyPDF2"""
+    try:
+        pypdf2_version = metadata.version("PyPDF2")
+    except metadata.PackageNotFoundError:
+        pypdf2_version = "unknown"
+    return f"pypdf2-{pypdf2_version}-r{EXTRACTOR_REVISION}"
+
+
+class PdfText:
+    """Memory-mapped extracted text of one PDF; pages are decoded on demand"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, self.page_count = _HEADER.unpack_from(self._mmap, 0)
+            if magic != _MAGIC:
+                raise ValueError(f"Not a text cache file: {path}")
+            self._offsets = struct.unpack_from(f"<{self.page_count + 1}Q", self._mmap, _HEADER.size)
+        except BaseException:
+            # Truncated or foreign file: don't leak the mapping
+            self._mmap.close()
+            raise
+        self._body_start = _HEADER.size + 8 * (self.page_count + 1)
+
+    def page(self, index: int) -> str:
+        """Text of page `index` (0-based)"""
+        start = self._body_start + self._offsets[index]
+        end = self._body_start + self._offsets[index + 1]
+        return self._mmap[start:end].decode("utf-8")
+
+    def pages(self, start: int = 0, stop: Optional[int] = None) -> list[str]:
+        stop = self.page_count if stop is None else min(stop, self.page_count)
+        return [self.page(i) for i in range(start, stop)]
+
+    def text(self) -> str:
+        """All pages joined the way read_pdf has always returned them"""
+        return "\n".join(self.pages()).strip()
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PdfTextCache:
+    """Extracted text keyed by document SHA-256 and extractor version"""
+
+    def __init__(self, root: Path = DEFAULT_TEXT_CACHE_DIR, max_bytes: int = 512 * 1024 ** 2):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.version = extractor_version()
+        self.hits = 0
+        self.misses = 0
+
+    def path_for(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / f"{sha256}.{self.version}.txtc"
+
+    def get(self, sha256: str) -> Optional[PdfText]:
+        path = self.path_for(sha256)
+        try:
+            text = PdfText(path)
+        except (OSError, ValueError, struct.error):
+            self.misses += 1
+            return None
+        # Touch so eviction keeps recently used documents
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted by another worker since we mapped it; the mapping stays valid
+            pass
+        self.hits += 1
+        return text
+
+    def put(self, sha256: str, pages: list[str]) -> Path:
+        encoded = [page.encode("utf-8", errors="replace") for page in pages]
+        offsets = [0]
+        for chunk in encoded:
+            offsets.append(offsets[-1] + len(chunk))
+
+        path = self.path_for(sha256)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, len(encoded)))
+            f.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+            for chunk in encoded:
+                f.write(chunk)
+        os.replace(tmp_path, path)
+        self._evict()
+        return path
+
+    def _evict(self) -> None:
+        """Remove least-recently-used files once the directory exceeds max_bytes"""
+        files = []
+        for p in self.root.glob("*/*.txtc"):
+            try:
+                stat = p.stat()
+            except FileNotFoundError:
+                # Already evicted by another worker process
+                continue
+            files.append((stat.st_mtime, stat.st_size, p))
+        total = sum(size for _, size, _ in files)
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "extractor": self.version}
+
+
+# Global instance - lazy initialization
+_text_cache = None
+_text_cache_lock = threading.Lock()
+
+
+def get_text_cache() -> Optional[PdfTextCache]:
+    """Get or create the extracted-text cache (PDF_TEXT_CACHE_DIR, PDF_TEXT_CACHE_MAX_BYTES)"""
+    global _text_cache
+    with _text_cache_lock:
+        if _text_cache is None:
+            root = Path(os.getenv("PDF_TEXT_CACHE_DIR", str(DEFAULT_TEXT_CACHE_DIR)))
+            try:
+                _text_cache = PdfTextCache(
+                    root=root,
+                    max_bytes=int(os.getenv("PDF_TEXT_CACHE_MAX_BYTES", str(512 * 1024 ** 2))),
+                )
+            except OSError as e:
+                print(f"WARNING: PDF text cache unavailable at {root}: {e}")
+                return None
+        return _text_cache
@@ -1,30 +1,441 @@
 from langchain_core.tools import tool
-import io
-import PyPDF2
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+import tracemalloc
+from contextlib import ExitStack, closing, contextmanager
+from typing import Iterable, Iterator, Optional
 import requests
 
+from pdf_cache import get_pdf_cache
+from pdf_extract import PdfSource, extract_pdf_pages, iter_pdf_pages, parse_page_spec
+from paper_index import get_paper_index, paper_id_for
+from pdf_sections import SECTION_ALIASES, find_sections, list_headings, normalize_section_name
+from pdf_text_cache import PdfText, get_text_cache
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PDF_DOWNLOAD_TIMEOUT = float(os.getenv("PDF_DOWNLOAD_TIMEOUT", "60"))    # per socket operation
+PDF_DOWNLOAD_DEADLINE = float(os.getenv("PDF_DOWNLOAD_DEADLINE", "120"))  # whole download
+PDF_MAX_BYTES = int(os.getenv("PDF_MAX_BYTES", str(100 * 1024 * 1024)))
+PDF_SPOOL_MEMORY = int(os.getenv("PDF_SPOOL_MEMORY", str(8 * 1024 * 1024)))
+PDF_TRACE_MEMORY = os.getenv("PDF_TRACE_MEMORY", "0") == "1"
+# Longer papers are indexed for query_paper and answered with a digest instead of the full text
+READ_PDF_MAX_CHARS = int(os.getenv("READ_PDF_MAX_CHARS", "12000"))
+DIGEST_ABSTRACT_CHARS = 1500
+READ_PDFS_MAX_URLS = int(os.getenv("READ_PDFS_MAX_URLS", "10"))
+READ_PDFS_CONCURRENCY = int(os.getenv("READ_PDFS_CONCURRENCY", "4"))
+_CHUNK_SIZE = 256 * 1024
+
+# Shared keep-alive session for PDF downloads
+_session = requests.Session()
+
+
+def _stream_to(response: requests.Response, out, url: str) -> tuple[str, int]:
+    """Copy the response body to out in chunks, enforcing size and deadline.
+
+    Returns (sha256, size) of the body.
+    """
+    declared = response.headers.get("Content-Length")
+    if declared and declared.isdigit() and int(declared) > PDF_MAX_BYTES:
+        raise ValueError(f"PDF too large: {declared} bytes (limit {PDF_MAX_BYTES}) from {url}")
+
+    deadline = time.monotonic() + PDF_DOWNLOAD_DEADLINE
+    hasher = hashlib.sha256()
+    size = 0
+    for chunk in response.iter_content(chunk_size=_CHUNK_SIZE):
+        size += len(chunk)
+        if size > PDF_MAX_BYTES:
+            raise ValueError(f"PDF exceeds {PDF_MAX_BYTES} bytes, aborting download from {url}")
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"PDF download exceeded {PDF_DOWNLOAD_DEADLINE}s deadline: {url}")
+        hasher.update(chunk)
+        out.write(chunk)
+    return hasher.hexdigest(), size
+
+
+@contextmanager
+def download_pdf(url: str) -> Iterator[tuple[str, PdfSource]]:
+    """Yield (sha256, source) for the PDF at url without holding the body in memory.
+
+    The body is streamed in chunks, bounded by PDF_MAX_BYTES and
+    PDF_DOWNLOAD_DEADLINE. With the PDF cache enabled it is written straight
+    into the cache and `source` is the blob path (memory-mapped for
+    extraction). Otherwise it goes to a spooled temporary file that only
+    stays in memory up to PDF_SPOOL_MEMORY bytes.
+
+    Cached copies older than the revalidation window are checked with
+    If-None-Match / If-Modified-Since, so an unchanged paper costs a 304
+    instead of a full download.
+    """
+    cache = get_pdf_cache()
+    with ExitStack() as stack:
+        entry = cache.lookup(url) if cache is not None else None
+        # Read cached blobs through a pinned link, so eviction by another worker cannot pull them away
+        blob = stack.enter_context(cache.pinned(entry)) if entry is not None else None
+        if blob is None:
+            entry = None
+        if entry is not None and cache.is_fresh(entry):
+            cache.record("hit")
+            print(f"[PDF CACHE] Using cached PDF for: {url}")
+            yield entry.sha256, str(blob)
+            return
+
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        with _session.get(url, headers=headers, timeout=PDF_DOWNLOAD_TIMEOUT, stream=True) as response:
+            if response.status_code == 304 and entry is not None:
+                cache.mark_revalidated(entry)
+                cache.record("revalidated")
+                print(f"[PDF CACHE] Cached PDF still valid for: {url}")
+                yield entry.sha256, str(blob)
+                return
+
+            if not response.ok:
+                raise ValueError(f"Failed to download PDF: {response.status_code} from {url}")
+
+            if cache is None:
+                with tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MEMORY) as spool:
+                    sha256, _ = _stream_to(response, spool, url)
+                    yield sha256, spool
+                return
+
+            cache.record("miss")
+            tmp_path = cache.temp_path()
+            try:
+                with open(tmp_path, "wb") as out:
+                    sha256, size = _stream_to(response, out, url)
+                with open(tmp_path, "rb") as f:
+                    is_pdf = f.read(4) == b"%PDF"
+                # Only keep real PDFs - arXiv sometimes answers with an HTML placeholder page
+                if is_pdf:
+                    stored = cache.store_file(
+                        url, tmp_path, sha256, size,
+                        response.headers.get("ETag"), response.headers.get("Last-Modified"),
+                    )
+                    yield sha256, str(stack.enter_context(cache.pinned(stored)) or stored.path)
+                else:
+                    yield sha256, str(tmp_path)
+            finally:
+                tmp_path.unlink(missing_ok=True)
+
+
+def _current_rss() -> Optional[int]:
+    """Resident set size of this process in bytes, where /proc provides it"""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+@contextmanager
+def _report_peak_memory(label: str):
+    """Log how much memory one read_pdf call used.
+
+    Reports the change in current RSS across the call (Linux) and, labelled
+    as such, the process-lifetime peak RSS; ru_maxrss never goes down, so it
+    says nothing about this call on its own. With PDF_TRACE_MEMORY=1 also
+    the peak of Python allocations made during the call (approximate if
+    calls overlap).
+    """
+    rss_before = _current_rss()
+    tracing = PDF_TRACE_MEMORY and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    try:
+        yield
+    finally:
+        parts = []
+        if tracing:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            parts.append(f"python peak={peak / 1024 ** 2:.1f} MiB")
+        rss_after = _current_rss()
+        if rss_before is not None and rss_after is not None:
+            parts.append(f"RSS={rss_after / 1024 ** 2:.1f} MiB ({(rss_after - rss_before) / 1024 ** 2:+.1f} MiB)")
+        if resource:
+            # ru_maxrss is reported in KiB on Linux
+            process_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            parts.append(f"process peak RSS={process_peak / 1024:.1f} MiB")
+        if parts:
+            print(f"[MEMORY] {label}: {', '.join(parts)}")
+
+
+def _cached_text(url: str) -> Optional[tuple[str, PdfText]]:
+    """(sha256, extracted text) of a fresh cached download of url, without touching the network"""
+    pdf_cache = get_pdf_cache()
+    text_cache = get_text_cache()
+    entry = pdf_cache.lookup(url) if pdf_cache is not None else None
+    if entry is None or text_cache is None or not pdf_cache.is_fresh(entry):
+        return None
+    cached_text = text_cache.get(entry.sha256)
+    if cached_text is None:
+        return None
+    pdf_cache.record("hit")
+    return entry.sha256, cached_text
+
+
+def read_pdf_document(url: str, parallel: Optional[bool] = None) -> tuple[str, list[str]]:
+    """Return (sha256, page texts) of the PDF at url, using the PDF and extracted-text caches.
+
+    `parallel` is passed on to extract_pdf_pages.
+    """
+    text_cache = get_text_cache()
+
+    # Fast path: a fresh cached download whose text was already extracted
+    cached = _cached_text(url)
+    if cached is not None:
+        sha256, cached_text = cached
+        with cached_text:
+            print(f"[TEXT CACHE] Using extracted text ({cached_text.page_count} pages) for: {url}")
+            return sha256, cached_text.pages()
+
+    with _report_peak_memory(f"read_pdf {url}"), download_pdf(url) as (sha256, source):
+        if text_cache is not None:
+            cached_text = text_cache.get(sha256)
+            if cached_text is not None:
+                with cached_text:
+                    return sha256, cached_text.pages()
+
+        pages = extract_pdf_pages(source, parallel=parallel)
+        if text_cache is not None:
+            text_cache.put(sha256, pages)
+        return sha256, pages
+
+
+def read_pdf_text(url: str) -> str:
+    """Return the full text of the PDF at url"""
+    _, pages = read_pdf_document(url)
+    return "\n".join(pages).strip()
+
+
+def iter_pdf_text(
+    url: str,
+    pages: Optional[Iterable[int]] = None,
+    sections: Optional[set[str]] = None,
+) -> Iterator[tuple[int, str]]:
+    """Lazily yield (page_index, text) for the requested pages of the PDF at url.
+
+    Cached text is sliced page by page; otherwise the PDF is downloaded and
+    only the pages actually consumed are extracted. Partial reads do not fill
+    the extracted-text cache, since they never see the whole document.
+
+    Args:
+        url: The URL of the PDF
+        pages: 0-based page indices (see parse_page_spec); all pages by default
+        sections: Canonical section names, used to narrow the pages through
+            the PDF outline when no pages are given
+    """
+    cached = _cached_text(url)
+    if cached is not None:
+        _, cached_text = cached
+    else:
+        with download_pdf(url) as (sha256, source):
+            text_cache = get_text_cache()
+            cached_text = text_cache.get(sha256) if text_cache is not None else None
+            if cached_text is None:
+                yield from iter_pdf_pages(source, pages, sections)
+                return
+
+    with cached_text:
+        indices = range(cached_text.page_count) if pages is None else sorted(set(pages))
+        for i in indices:
+            if 0 <= i < cached_text.page_count:
+                yield i, cached_text.page(i)
+
+
+def read_pdf_sections(url: str, sections: Iterable[str], pages: Optional[Iterable[int]] = None) -> dict[str, str]:
+    """Return {section: text} for the requested sections of the PDF at url.
+
+    Sections are detected from headings ("3 Method", "RESULTS", ...), so
+    extraction stops once the last requested section has ended. With `pages`
+    (0-based indices) only those pages are searched, and a section is cut
+    to the part inside them. Sections that could not be found are left out
+    of the result.
+    """
+    wanted = set()
+    for name in sections:
+        section = normalize_section_name(name)
+        if section is None:
+            raise ValueError(f"Unknown section '{name}'. Known sections: {', '.join(SECTION_ALIASES)}")
+        wanted.add(section)
+
+    with closing(iter_pdf_text(url, pages=pages, sections=wanted)) as selected:
+        return find_sections(selected, wanted)
+
+
+def _paper_digest(paper_id: str, pages: list[str], text: str) -> str:
+    """Short stand-in for a long paper: ID, size, abstract and section outline"""
+    numbered = list(enumerate(pages))
+    abstract = find_sections(numbered[:2], {"abstract"}).get("abstract", "")
+    if len(abstract) > DIGEST_ABSTRACT_CHARS:
+        abstract = abstract[:DIGEST_ABSTRACT_CHARS].rsplit(" ", 1)[0] + " ..."
+    headings = list_headings(numbered)
+    lines = [
+        f"paper_id: {paper_id}",
+        f"Length: {len(pages)} pages, {len(text)} characters (too long to return in full)",
+    ]
+    if abstract:
+        lines.append(f"Abstract: {abstract}")
+    if headings:
+        lines.append(f"Sections: {'; '.join(headings)}")
+    lines.append(
+        f'Use query_paper("{paper_id}", question) to retrieve the passages you need, '
+        "or read_pdf with `sections` / `pages` for a specific part."
+    )
+    return "\n".join(lines)
+
+
+def read_full_paper(url: str, parallel: Optional[bool] = None) -> str:
+    """Full text of a short paper, or an indexed digest of a long one"""
+    sha256, pages = read_pdf_document(url, parallel=parallel)
+    text = "\n".join(pages).strip()
+    index = get_paper_index()
+    if index is None or len(text) <= READ_PDF_MAX_CHARS:
+        return text
+
+    paper_id = paper_id_for(url, sha256)
+    added = index.add_paper(paper_id, url, sha256, pages)
+    if added:
+        print(f"[PAPER INDEX] Indexed {added} passages of {paper_id}")
+    return _paper_digest(paper_id, pages, text)
+
+
+def read_pdf_content(
+    url: str,
+    pages: Optional[str] = None,
+    sections: Optional[list[str]] = None,
+    parallel: Optional[bool] = None,
+) -> str:
+    """What read_pdf returns for url: the requested sections or pages, else the full text or a digest.
+
+    Given both, `sections` are looked for within `pages` only.
+    """
+    page_indices = parse_page_spec(pages) if pages else None
+    if sections:
+        found = read_pdf_sections(url, sections, pages=page_indices)
+        parts = [f"## {name.replace('_', ' ').title()}\n{text}" for name, text in found.items()]
+        missing = [name for name in sections if normalize_section_name(name) not in found]
+        if missing:
+            where = f" on pages {pages}" if pages else ""
+            hint = "try other `pages`" if pages else "try `pages` instead"
+            parts.append(f"(Sections not found{where}: {', '.join(missing)}; {hint})")
+        return "\n\n".join(parts)
+    if pages:
+        with closing(iter_pdf_text(url, pages=page_indices)) as selected:
+            text = "\n\n".join(f"[Page {i + 1}]\n{page_text.strip()}" for i, page_text in selected)
+        return text or f"(No pages {pages} in this document)"
+    return read_full_paper(url, parallel=parallel)
+
+
+async def read_pdfs_content(urls: list[str], sections: Optional[list[str]] = None) -> list[tuple[str, Optional[str], Optional[str]]]:
+    """Read several PDFs concurrently, returning (url, text, error) in input order.
+
+    Downloads overlap in worker threads (at most READ_PDFS_CONCURRENCY at a
+    time) and long documents are extracted on the shared process pool, so the
+    batch takes about as long as its slowest paper. One failing URL does not
+    affect the others.
+    """
+    semaphore = asyncio.Semaphore(READ_PDFS_CONCURRENCY)
+
+    async def read_one(url: str) -> tuple[str, Optional[str], Optional[str]]:
+        async with semaphore:
+            try:
+                text = await asyncio.to_thread(read_pdf_content, url, sections=sections)
+                return url, text, None
+            except Exception as e:
+                print(f"Error reading PDF {url}: {str(e)}")
+                return url, None, str(e) or type(e).__name__
+
+    # Duplicate URLs are read once
+    return await asyncio.gather(*(read_one(url) for url in dict.fromkeys(urls)))
+
+
 @tool
-def read_pdf(url: str) -> str:
+def read_pdf(url: str, pages: Optional[str] = None, sections: Optional[list[str]] = None) -> str:
     """Read and extract text from a PDF file given its URL.
 
+    Long papers are indexed and returned as a digest with a paper_id; use
+    query_paper to retrieve passages from them. To read a specific part,
+    pass `sections` (e.g. ["abstract", "method", "results"]) or `pages`
+    (e.g. "1-3,5"); with both, the sections are looked for on those pages.
+
     Args:
         url: The URL of the PDF file to read
+        pages: Optional 1-based page ranges to read, e.g. "1-3,5"
+        sections: Optional section names to read: abstract, introduction,
+            related_work, background, method, experiments, results,
+            discussion, conclusion, references, appendix
 
     Returns:
-        The extracted text content from the PDF
+        The extracted text content from the PDF, or a digest for long papers
     """
     try:
-        response = requests.get(url)
-        pdf_file = io.BytesIO(response.content)
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        num_pages = len(pdf_reader.pages)
-        text = ""
-        for i, page in enumerate(pdf_reader.pages, 1):
-            print(f"Extracting text from page {i}/{num_pages}")
-            text += page.extract_text() + "\n"
-
+        text = read_pdf_content(url, pages, sections)
         print(f"Successfully extracted {len(text)} characters of text from PDF")
-        return text.strip()
+        return text
     except Exception as e:
         print(f"Error reading PDF: {str(e)}")
         raise
+
+
+@tool
+async def read_pdfs(urls: list[str], sections: Optional[list[str]] = None) -> str:
+    """Read several PDFs at once; much faster than calling read_pdf for each one.
+
+    Args:
+        urls: The URLs of the PDF files to read (at most 10)
+        sections: Optional section names to read from every paper, e.g.
+            ["abstract", "conclusion"]; same names as read_pdf
+
+    Returns:
+        One block per URL with its text (or digest), or the error for that URL
+    """
+    if len(urls) > READ_PDFS_MAX_URLS:
+        return f"Too many URLs ({len(urls)}); read at most {READ_PDFS_MAX_URLS} per call."
+
+    results = await read_pdfs_content(urls, sections)
+    blocks = []
+    for i, (url, text, error) in enumerate(results, 1):
+        body = f"ERROR: {error}" if error is not None else text
+        blocks.append(f"=== [{i}] {url} ===\n{body}")
+    failed = sum(1 for _, _, error in results if error is not None)
+    print(f"Read {len(results) - failed}/{len(results)} PDFs in one batch")
+    return "\n\n".join(blocks)
+
+
+@tool
+def query_paper(paper_id: str, question: str, k: int = 5) -> str:
+    """Retrieve the passages of a paper already read with read_pdf that best answer a question.
+
+    Args:
+        paper_id: The paper_id from a read_pdf digest
+        question: What you are looking for, e.g. "training objective and loss"
+        k: Number of passages to return (default 5, at most 20)
+
+    Returns:
+        The top passages with their page numbers
+    """
+    index = get_paper_index()
+    if index is None:
+        return "Paper index unavailable; use read_pdf with `sections` or `pages` instead."
+    if not index.has_paper(paper_id):
+        return f"Unknown paper_id '{paper_id}'. Read the paper with read_pdf first."
+
+    passages = index.query(paper_id, question, k)
+    if not passages:
+        return f"No passages of {paper_id} match '{question}'."
+    print(f"[PAPER INDEX] {len(passages)} passages of {paper_id} for: {question}")
+    return "\n\n".join(f"[Passage {i}, page {p['page']}]\n{p['text']}" for i, p in enumerate(passages, 1))
@@ -0,0 +1,203 @@
+# resumable_upload.py - TUS resumable uploads to Supabase Storage
+import base64
+import os
+import time
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+from urllib.parse import urljoin
+
+import requests
+
+# Supabase requires every chunk except the last to be exactly 6MB
+TUS_CHUNK_SIZE = 6 * 1024 * 1024
+TUS_MAX_RETRIES = int(os.getenv("SUPABASE_UPLOAD_RETRIES", "5"))
+TUS_TIMEOUT = float(os.getenv("SUPABASE_UPLOAD_TIMEOUT", "60"))
+TUS_VERSION = "1.0.0"
+
+
+class UploadSessionExpired(Exception):
+    """The server no longer knows the upload URL; a new session is needed"""
+
+
+def _encode_metadata(metadata: dict) -> str:
+    return ",".join(
+        f"{key} {base64.b64encode(value.encode('utf-8')).decode('ascii')}" for key, value in metadata.items()
+    )
+
+
+class TusUploader:
+    """Streams a file to a TUS endpoint in fixed-size chunks.
+
+    Only one chunk is held in memory at a time. After a network error or 5xx
+    the server's offset is re-read with HEAD and the upload continues from
+    there rather than from byte zero. If the session expired, it is
+    recreated once and the upload restarts. A session URL from an earlier
+    attempt can be passed back in to continue where that attempt stopped.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        headers: dict,
+        chunk_size: int = TUS_CHUNK_SIZE,
+        max_retries: int = TUS_MAX_RETRIES,
+        timeout: float = TUS_TIMEOUT,
+        session: Optional[requests.Session] = None,
+    ):
+        self.endpoint = endpoint
+        self.headers = {**headers, "Tus-Resumable": TUS_VERSION}
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self.retries = 0
+
+    def create(self, size: int, metadata: dict, upsert: bool = True) -> str:
+        """Open an upload session and return its URL"""
+        response = self.session.post(
+            self.endpoint,
+            headers={
+                **self.headers,
+                "Upload-Length": str(size),
+                "Upload-Metadata": _encode_metadata(metadata),
+                "x-upsert": "true" if upsert else "false",
+            },
+            timeout=self.timeout,
+        )
+        if response.status_code != 201 or "Location" not in response.headers:
+            raise RuntimeError(f"Could not create upload session: {response.status_code} {response.text[:200]}")
+        return urljoin(self.endpoint, response.headers["Location"])
+
+    def offset(self, upload_url: str) -> int:
+        """How many bytes the server already has"""
+        response = self.session.head(upload_url, headers=self.headers, timeout=self.timeout)
+        if response.status_code in (404, 410):
+            raise UploadSessionExpired(upload_url)
+        response.raise_for_status()
+        return int(response.headers["Upload-Offset"])
+
+    def _patch(self, upload_url: str, offset: int, chunk: bytes) -> int:
+        response = self.session.patch(
+            upload_url,
+            data=chunk,
+            headers={
+                **self.headers,
+                "Upload-Offset": str(offset),
+                "Content-Type": "application/offset+octet-stream",
+            },
+            timeout=self.timeout,
+        )
+        if response.status_code in (404, 410):
+            raise UploadSessionExpired(upload_url)
+        if response.status_code == 409:
+            # Offset mismatch (e.g. a previous PATCH landed after all): resync
+            return self.offset(upload_url)
+        response.raise_for_status()
+        return int(response.headers["Upload-Offset"])
+
+    def upload(
+        self,
+        path: Path,
+        metadata: dict,
+        upsert: bool = True,
+        upload_url: Optional[str] = None,
+        on_session: Optional[Callable[[str], None]] = None,
+    ) -> str:
+        """Upload the file at path, resuming after transient failures.
+
+        `upload_url` continues a session opened by an earlier attempt (even in
+        another process) from the server's offset. `on_session` is called with
+        the URL of every session created, so the caller can persist it for
+        the next attempt. Returns the URL of the session that completed.
+        """
+        size = Path(path).stat().st_size
+        recreated = False
+
+        def new_session() -> str:
+            url = self.create(size, metadata, upsert)
+            if on_session is not None:
+                on_session(url)
+            return url
+
+        offset = 0
+        if upload_url:
+            try:
+                offset = self.offset(upload_url)
+                print(f"Resuming upload of {Path(path).name} at byte {offset}/{size}")
+            except UploadSessionExpired:
+                upload_url = None
+            except (requests.RequestException, ValueError, KeyError):
+                # Unknown offset: a PATCH at 0 is answered 409 and resyncs
+                offset = 0
+        if not upload_url:
+            upload_url = new_session()
+        failures = 0
+        with open(path, "rb") as f:
+            while offset < size:
+                try:
+                    try:
+                        f.seek(offset)
+                        offset = self._patch(upload_url, offset, f.read(self.chunk_size))
+                        failures = 0
+                    except (requests.RequestException, ValueError, KeyError) as e:
+                        # ValueError/KeyError: a missing or garbled Upload-Offset header
+                        status = getattr(getattr(e, "response", None), "status_code", None)
+                        if status is not None and status < 500 and status != 429:
+                            raise
+                        failures += 1
+                        self.retries += 1
+                        if failures > self.max_retries:
+                            raise
+                        time.sleep(min(30.0, 0.5 * 2 ** (failures - 1)))
+                        try:
+                            offset = self.offset(upload_url)
+                        except requests.RequestException:
+                            # Still unreachable; the next PATCH attempt will tell
+                            pass
+                        print(f"Resuming upload of {Path(path).name} at byte {offset}/{size} (retry {failures})")
+                except UploadSessionExpired:
+                    # From a PATCH, or from the HEAD re-reading the offset after a failure
+                    if recreated:
+                        raise
+                    recreated = True
+                    upload_url = new_session()
+                    offset = 0
+        return upload_url
+
+
+def upload_resumable(
+    supabase_url: str,
+    service_key: str,
+    bucket: str,
+    object_path: str,
+    pdf_path: str,
+    content_type: str = "application/pdf",
+    cache_control: str = "3600",
+    upload_url: Optional[str] = None,
+    on_session: Optional[Callable[[str], None]] = None,
+) -> Tuple[bool, Optional[str]]:
+    """Upload a file to Supabase Storage with the TUS protocol.
+
+    `upload_url` and `on_session` resume and record sessions across
+    attempts (see TusUploader.upload).
+
+    Returns:
+        Tuple of (success, error_message)
+    """
+    # One session per upload, closed afterwards so its pooled connections are not leaked
+    with requests.Session() as session:
+        uploader = TusUploader(
+            f"{supabase_url.rstrip('/')}/storage/v1/upload/resumable",
+            headers={"Authorization": f"Bearer {service_key}", "apikey": service_key},
+            session=session,
+        )
+        try:
+            uploader.upload(
+                Path(pdf_path),
+                {"bucketName": bucket, "objectName": object_path, "contentType": content_type, "cacheControl": cache_control},
+                upload_url=upload_url,
+                on_session=on_session,
+            )
+        except Exception as e:
+            return False, f"Resumable upload failed: {e}"
+    return True, None
@@ -0,0 +1,317 @@
+# supabase_async.py - asyncio-native Supabase Storage client with connection pooling
+import asyncio
+import os
+import weakref
+from pathlib import Path
+from typing import AsyncIterator, Callable, Optional, Tuple
+from urllib.parse import quote
+
+import httpx
+from dotenv import load_dotenv
+
+from resumable_upload import upload_resumable
+from supabase_storage import BUCKET_NAME, LIST_PAGE_SIZE, RESUMABLE_MIN_BYTES, batched, list_options, new_pdf_entries
+
+load_dotenv()
+
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "60"))
+
+
+class AsyncSupabaseStorage:
+    """Async counterpart of SupabaseStorage, talking to the Storage REST API.
+
+    Every request goes through one keep-alive `httpx.AsyncClient`, so the
+    event loop is never blocked and connections are reused across calls.
+    Bucket existence is checked once and remembered until an operation on
+    the bucket fails. Large uploads use the TUS uploader in a worker thread.
+
+    This is the client the app uploads, downloads and deletes with: the
+    upload outbox runs it on its worker thread's event loop, and
+    render_latex_pdf falls back to it when the outbox is unavailable.
+    SupabaseStorage remains for synchronous callers outside the server.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        service_key: str,
+        bucket_name: str = BUCKET_NAME,
+        timeout: float = SUPABASE_TIMEOUT,
+        max_connections: int = 20,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.url = url.rstrip("/")
+        self.bucket_name = bucket_name
+        self._service_key = service_key
+        self._http = httpx.AsyncClient(
+            base_url=f"{self.url}/storage/v1",
+            headers=self.auth_headers(),
+            timeout=httpx.Timeout(timeout, connect=10.0),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport,
+        )
+        # Set once the bucket is known to exist; cleared when an operation on it fails
+        self._bucket_ready = False
+        self._bucket_lock = asyncio.Lock()
+
+    def auth_headers(self) -> dict:
+        return {"Authorization": f"Bearer {self._service_key}", "apikey": self._service_key}
+
+    def _object_path(self, user_id: str, filename: str) -> str:
+        return f"/object/{self.bucket_name}/{quote(user_id)}/{quote(filename)}"
+
+    async def ensure_bucket_exists(self) -> bool:
+        """Create bucket if it doesn't exist (checked once, not on every upload)"""
+        if self._bucket_ready:
+            return True
+        async with self._bucket_lock:
+            if self._bucket_ready:
+                return True
+            try:
+                response = await self._http.get(f"/bucket/{self.bucket_name}")
+                if response.status_code != 200:
+                    response = await self._http.post("/bucket", json={
+                        "id": self.bucket_name,
+                        "name": self.bucket_name,
+                        "public": False,  # Private bucket for security
+                        "allowed_mime_types": ["application/pdf"],
+                        "file_size_limit": 52428800,  # 50MB limit
+                    })
+                    # 409: created concurrently by another process
+                    if response.status_code not in (200, 409):
+                        response.raise_for_status()
+                    print(f"Created bucket '{self.bucket_name}'")
+            except httpx.HTTPError as e:
+                print(f"Error ensuring bucket exists: {e}")
+                return False
+            self._bucket_ready = True
+            return True
+
+    async def upload_pdf(
+        self,
+        pdf_path: str,
+        user_id: str,
+        filename: str,
+        upload_url: Optional[str] = None,
+        on_session: Optional[Callable[[str], None]] = None,
+    ) -> Tuple[bool, Optional[str]]:
+        """Upload PDF to Supabase Storage; returns (success, error_message).
+
+        `upload_url` and `on_session` resume and record resumable sessions of
+        large files across attempts (see TusUploader.upload).
+        """
+        path = Path(pdf_path)
+        if not path.exists():
+            return False, f"PDF file not found: {pdf_path}"
+        file_path = f"{user_id}/{filename}"
+
+        if path.stat().st_size >= RESUMABLE_MIN_BYTES:
+            success, error = await asyncio.to_thread(
+                upload_resumable, self.url, self._service_key, self.bucket_name, file_path, str(path),
+                upload_url=upload_url, on_session=on_session,
+            )
+            if success:
+                await self._forget_cached(user_id, [filename])
+            else:
+                self._bucket_ready = False
+                print(error)
+            return success, error
+
+        try:
+            content = await asyncio.to_thread(path.read_bytes)
+            response = await self._http.post(
+                self._object_path(user_id, filename),
+                content=content,
+                headers={"Content-Type": "application/pdf", "Cache-Control": "max-age=3600", "x-upsert": "true"},
+            )
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            # The bucket may have been removed; re-check before the next upload
+            self._bucket_ready = False
+            error_msg = f"Error uploading PDF: {e}"
+            print(error_msg)
+            return False, error_msg
+        await self._forget_cached(user_id, [filename])
+        print(f"Successfully uploaded PDF to: {file_path}")
+        return True, None
+
+    async def open_pdf_stream(
+        self, user_id: str, filename: str, if_none_match: Optional[str] = None
+    ) -> Optional[httpx.Response]:
+        """Start streaming a PDF; the caller reads and closes a 200 response.
+
+        With `if_none_match`, an unchanged object answers 304. Any status
+        other than 200 comes back already closed; None means storage could
+        not be reached.
+        """
+        headers = {"If-None-Match": if_none_match} if if_none_match else None
+        try:
+            response = await self._http.send(
+                self._http.build_request("GET", self._object_path(user_id, filename), headers=headers), stream=True
+            )
+        except httpx.HTTPError as e:
+            print(f"Error downloading PDF: {e}")
+            return None
+        if response.status_code != 200:
+            await response.aclose()
+            if response.status_code != 304:
+                print(f"[DOWNLOAD] Storage answered {response.status_code} for {user_id}/{filename}")
+        return response
+
+    async def download_pdf(self, user_id: str, filename: str) -> Tuple[bool, Optional[bytes], Optional[str]]:
+        """Download a whole PDF into memory; prefer open_pdf_stream for serving"""
+        try:
+            response = await self._http.get(self._object_path(user_id, filename))
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            error_msg = f"Error downloading PDF: {e}"
+            print(error_msg)
+            return False, None, error_msg
+        if not response.content:
+            return False, None, "Download failed - empty response"
+        return True, response.content, None
+
+    async def iter_user_pdfs(
+        self,
+        user_id: str,
+        page_size: int = LIST_PAGE_SIZE,
+        sort_by: str = "name",
+        order: str = "asc",
+        search: Optional[str] = None,
+    ) -> AsyncIterator[dict]:
+        """Yield every PDF in a user's folder, one page at a time (see SupabaseStorage.iter_user_pdfs)"""
+        seen = set()
+        offset = 0
+        while True:
+            response = await self._http.post(
+                f"/object/list/{self.bucket_name}",
+                json={"prefix": f"{user_id}/", **list_options(page_size, offset, sort_by, order, search)},
+            )
+            response.raise_for_status()
+            page = response.json()
+            for entry in new_pdf_entries(page, seen):
+                yield entry
+            # A short page is the last one
+            if len(page) < page_size:
+                break
+            offset += len(page)
+
+    async def list_user_pdfs(
+        self, user_id: str, sort_by: str = "name", order: str = "asc", search: Optional[str] = None
+    ) -> list:
+        """List all PDFs for a specific user (every page, not just the first)"""
+        try:
+            return [entry async for entry in self.iter_user_pdfs(user_id, sort_by=sort_by, order=order, search=search)]
+        except httpx.HTTPError as e:
+            print(f"Error listing user PDFs: {e}")
+            return []
+
+    async def delete_pdf(self, user_id: str, filename: str) -> Tuple[bool, Optional[str]]:
+        """Delete PDF from Supabase Storage"""
+        deleted, error = await self.delete_pdfs(user_id, [filename])
+        if error:
+            return False, error
+        if not deleted:
+            return False, "Delete failed"
+        return True, None
+
+    async def delete_pdfs(self, user_id: str, filenames: list[str]) -> Tuple[list[str], Optional[str]]:
+        """Delete many PDFs, BULK_BATCH_SIZE paths per request; returns (deleted filenames, last error)"""
+        deleted, error_msg = [], None
+        for batch in batched(filenames):
+            try:
+                response = await self._http.request(
+                    "DELETE",
+                    f"/object/{self.bucket_name}",
+                    json={"prefixes": [f"{user_id}/{filename}" for filename in batch]},
+                )
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                error_msg = f"Error deleting PDFs: {e}"
+                print(error_msg)
+                continue
+            # Only objects that existed are reported back
+            deleted += [entry["name"].rsplit("/", 1)[-1] for entry in response.json()]
+        await self._forget_cached(user_id, deleted)
+        print(f"Deleted {len(deleted)}/{len(filenames)} PDFs for {user_id}")
+        return deleted, error_msg
+
+    async def get_signed_url(
+        self, user_id: str, filename: str, expires_in: int = 3600, download: Optional[str] = None
+    ) -> Optional[str]:
+        """Signed download URL, or None if failed; `download` serves it as an attachment with that name"""
+        try:
+            response = await self._http.post(
+                f"/object/sign/{self.bucket_name}/{quote(user_id)}/{quote(filename)}",
+                json={"expiresIn": expires_in},
+            )
+            response.raise_for_status()
+            signed = response.json()["signedURL"]
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            print(f"Error creating signed URL: {e}")
+            return None
+        url = f"{self.url}/storage/v1{signed}"
+        if download:
+            url += f"&download={quote(download)}"
+        return url
+
+    async def get_signed_urls(
+        self, user_id: str, filenames: list[str], expires_in: int = 3600, download: bool = False
+    ) -> dict:
+        """Signed download URLs for many PDFs, BULK_BATCH_SIZE paths per request.
+
+        Returns filename -> URL; files that could not be signed are left out.
+        """
+        urls = {}
+        for batch in batched(filenames):
+            try:
+                response = await self._http.post(
+                    f"/object/sign/{self.bucket_name}",
+                    json={"expiresIn": expires_in, "paths": [f"{user_id}/{filename}" for filename in batch]},
+                )
+                response.raise_for_status()
+                entries = response.json()
+            except (httpx.HTTPError, ValueError) as e:
+                print(f"Error creating signed URLs: {e}")
+                continue
+            for entry in entries:
+                if entry.get("signedURL") and not entry.get("error"):
+                    url = f"{self.url}/storage/v1{entry['signedURL']}"
+                    urls[entry["path"].rsplit("/", 1)[-1]] = url + "&download=" if download else url
+        return urls
+
+    @staticmethod
+    async def _forget_cached(user_id: str, filenames: list[str]) -> None:
+        """Drop download caches of objects that were overwritten or deleted"""
+        # Imported here: paper_download itself imports this module
+        from paper_download import forget_pdfs
+        await asyncio.to_thread(forget_pdfs, user_id, filenames)
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+
+# One client per event loop - httpx connection pools cannot be shared across loops
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncSupabaseStorage]" = weakref.WeakKeyDictionary()
+
+
+def get_async_storage() -> Optional[AsyncSupabaseStorage]:
+    """Get or create the async storage client for the running event loop (None if not configured)"""
+    loop = asyncio.get_running_loop()
+    storage = _clients.get(loop)
+    if storage is None:
+        url = os.getenv("SUPABASE_URL")
+        service_key = os.getenv("SUPABASE_SERVICE_KEY")
+        if not url or not service_key:
+            print("ERROR get_async_storage: SUPABASE_URL and SUPABASE_SERVICE_KEY must be set in environment")
+            return None
+        storage = AsyncSupabaseStorage(url, service_key)
+        _clients[loop] = storage
+    return storage
+
+
+async def close_async_storage() -> None:
+    """Close the client bound to the running event loop, if any"""
+    storage = _clients.pop(asyncio.get_running_loop(), None)
+    if storage is not None:
+        await storage.aclose()
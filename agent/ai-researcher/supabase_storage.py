@@ -1,12 +1,62 @@
 # supabase_storage.py - Supabase Storage operations for PDF files
 import os
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Callable, Iterator, Optional, Tuple
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
+from resumable_upload import upload_resumable
+
 load_dotenv()
 
+# Files at least this large are uploaded in resumable 6MB chunks instead of one request
+RESUMABLE_MIN_BYTES = int(os.getenv("SUPABASE_RESUMABLE_MIN_BYTES", str(6 * 1024 * 1024)))
+BUCKET_NAME = "researchy"
+# Objects per list request (the API's default page is 100 and the hard cap 1000)
+LIST_PAGE_SIZE = int(os.getenv("SUPABASE_LIST_PAGE_SIZE", "100"))
+# Paths per bulk delete / bulk sign request
+BULK_BATCH_SIZE = int(os.getenv("SUPABASE_BULK_BATCH_SIZE", "100"))
+LIST_SORT_COLUMNS = ("name", "created_at", "updated_at", "last_accessed_at")
+
+
+def list_options(page_size: int, offset: int, sort_by: str, order: str, search: Optional[str]) -> dict:
+    """Body options of one storage list request, validated"""
+    if sort_by not in LIST_SORT_COLUMNS:
+        raise ValueError(f"sort_by must be one of {', '.join(LIST_SORT_COLUMNS)}")
+    if order not in ("asc", "desc"):
+        raise ValueError("order must be 'asc' or 'desc'")
+    options = {"limit": page_size, "offset": offset, "sortBy": {"column": sort_by, "order": order}}
+    if search:
+        options["search"] = search
+    return options
+
+
+def batched(items: list, size: int = BULK_BATCH_SIZE) -> Iterator[list]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def is_pdf_entry(entry: dict) -> bool:
+    """A PDF object (folders have no id)"""
+    return entry.get("id") is not None and entry.get("name", "").lower().endswith(".pdf")
+
+
+def new_pdf_entries(page: list, seen: set) -> list[dict]:
+    """PDF entries of a list page not seen on an earlier one; an object created between requests shifts it into two pages"""
+    entries = []
+    for entry in page:
+        if is_pdf_entry(entry) and entry["id"] not in seen:
+            seen.add(entry["id"])
+            entries.append(entry)
+    return entries
+
+
+def _forget_cached(user_id: str, filenames: list[str]) -> None:
+    """Drop download caches of objects that were overwritten or deleted"""
+    # Imported here: paper_download depends on the async client, which imports this module
+    from paper_download import forget_pdfs
+    forget_pdfs(user_id, filenames)
+
 class SupabaseStorage:
     def __init__(self):
         """Initialize Supabase client"""
@@ -23,10 +73,16 @@ class SupabaseStorage:
         
         # Use service key for server-side operations (bypasses RLS)
         self.supabase: Client = create_client(url, service_key)
-        self.bucket_name = "researchy"
+        self.url = url
+        self._service_key = service_key
+        self.bucket_name = BUCKET_NAME
+        # Set once the bucket is known to exist; cleared when an upload fails
+        self._bucket_ready = False
     
     def ensure_bucket_exists(self) -> bool:
-        """Create bucket if it doesn't exist"""
+        """Create bucket if it doesn't exist (checked once, not on every upload)"""
+        if self._bucket_ready:
+            return True
         try:
             # Check if bucket exists
             buckets = self.supabase.storage.list_buckets()
@@ -45,13 +101,21 @@ class SupabaseStorage:
                 )
                 print(f"Created bucket '{self.bucket_name}': {result}")
             
+            self._bucket_ready = True
             return True
             
         except Exception as e:
             print(f"Error ensuring bucket exists: {e}")
             return False
     
-    def upload_pdf(self, pdf_path: str, user_id: str, filename: str) -> Tuple[bool, Optional[str]]:
+    def upload_pdf(
+        self,
+        pdf_path: str,
+        user_id: str,
+        filename: str,
+        upload_url: Optional[str] = None,
+        on_session: Optional[Callable[[str], None]] = None,
+    ) -> Tuple[bool, Optional[str]]:
         """
         Upload PDF to Supabase Storage
         
@@ -59,6 +123,8 @@ class SupabaseStorage:
             pdf_path: Local path to PDF file
             user_id: User ID for folder organization
             filename: Name of the file
+            upload_url: Resumable session of an earlier attempt to continue (large files)
+            on_session: Called with each new resumable session URL, to persist it
             
         Returns:
             Tuple of (success, error_message)
@@ -69,6 +135,20 @@ class SupabaseStorage:
             
             # Create user-specific file path
             file_path = f"{user_id}/{filename}"
+
+            # Large files: stream from disk in chunks, resuming after network errors
+            if Path(pdf_path).stat().st_size >= RESUMABLE_MIN_BYTES:
+                success, error = upload_resumable(
+                    self.url, self._service_key, self.bucket_name, file_path, pdf_path,
+                    upload_url=upload_url, on_session=on_session,
+                )
+                if success:
+                    _forget_cached(user_id, [filename])
+                    print(f"Successfully uploaded PDF (resumable) to: {file_path}")
+                else:
+                    self._bucket_ready = False
+                    print(error)
+                return success, error
             
             # Read file content
             with open(pdf_path, 'rb') as file:
@@ -90,16 +170,20 @@ class SupabaseStorage:
 
             # Check for errors in response
             if hasattr(response, 'error') and response.error:
+                self._bucket_ready = False
                 return False, f"Upload error: {response.error}"
 
             # Success - response should be a string path or have data
             if response:
+                _forget_cached(user_id, [filename])
                 print(f"Successfully uploaded PDF to: {file_path}")
                 return True, None
             else:
                 return False, "Upload failed - empty response"
                 
         except Exception as e:
+            # The bucket may have been removed; re-check before the next upload
+            self._bucket_ready = False
             error_msg = f"Error uploading PDF: {str(e)}"
             print(error_msg)
             return False, error_msg
@@ -136,20 +220,47 @@ class SupabaseStorage:
             print(error_msg)
             return False, None, error_msg
     
-    def list_user_pdfs(self, user_id: str) -> list:
-        """List all PDFs for a specific user"""
+    def iter_user_pdfs(
+        self,
+        user_id: str,
+        page_size: int = LIST_PAGE_SIZE,
+        sort_by: str = "name",
+        order: str = "asc",
+        search: Optional[str] = None,
+    ) -> Iterator[dict]:
+        """
+        Yield every PDF in a user's folder, fetched one page request at a time
+
+        Each page is yielded before the next one is requested, so only one
+        page is held in memory. Pagination is by offset: collect the names
+        before deleting anything, since deleting while later pages are still
+        to be requested shifts objects past the next offset and skips them.
+
+        Args:
+            user_id: User ID for folder organization
+            page_size: Objects fetched per request
+            sort_by: name, created_at, updated_at or last_accessed_at (sorted server-side)
+            order: asc or desc
+            search: Only names containing this string (filtered server-side)
+
+        Raises:
+            ValueError for bad sort options; storage errors propagate
+        """
+        bucket = self.supabase.storage.from_(self.bucket_name)
+        seen = set()
+        offset = 0
+        while True:
+            page = bucket.list(f"{user_id}/", list_options(page_size, offset, sort_by, order, search))
+            yield from new_pdf_entries(page, seen)
+            # A short page is the last one
+            if len(page) < page_size:
+                break
+            offset += len(page)
+
+    def list_user_pdfs(self, user_id: str, sort_by: str = "name", order: str = "asc", search: Optional[str] = None) -> list:
+        """List all PDFs for a specific user (every page, not just the first)"""
         try:
-            # List files in user's folder
-            result = self.supabase.storage.from_(self.bucket_name).list(f"{user_id}/")
-            
-            # Filter for PDF files
-            pdf_files = [
-                file for file in result 
-                if file.get('name', '').lower().endswith('.pdf')
-            ]
-            
-            return pdf_files
-            
+            return list(self.iter_user_pdfs(user_id, sort_by=sort_by, order=order, search=search))
         except Exception as e:
             print(f"Error listing user PDFs: {e}")
             return []
@@ -162,6 +273,7 @@ class SupabaseStorage:
             result = self.supabase.storage.from_(self.bucket_name).remove([file_path])
 
             if result:
+                _forget_cached(user_id, [filename])
                 print(f"Successfully deleted PDF: {file_path}")
                 return True, None
             else:
@@ -172,7 +284,31 @@ class SupabaseStorage:
             print(error_msg)
             return False, error_msg
 
-    def get_signed_url(self, user_id: str, filename: str, expires_in: int = 3600) -> Optional[str]:
+    def delete_pdfs(self, user_id: str, filenames: list[str]) -> Tuple[list[str], Optional[str]]:
+        """
+        Delete many PDFs, BULK_BATCH_SIZE paths per request
+
+        Returns:
+            Tuple of (deleted filenames, error_message of the last failed batch)
+        """
+        bucket = self.supabase.storage.from_(self.bucket_name)
+        deleted, error_msg = [], None
+        for batch in batched(filenames):
+            try:
+                result = bucket.remove([f"{user_id}/{filename}" for filename in batch])
+            except Exception as e:
+                error_msg = f"Error deleting PDFs: {str(e)}"
+                print(error_msg)
+                continue
+            # Only objects that existed are reported back
+            deleted += [entry["name"].rsplit("/", 1)[-1] for entry in result or []]
+        _forget_cached(user_id, deleted)
+        print(f"Deleted {len(deleted)}/{len(filenames)} PDFs for {user_id}")
+        return deleted, error_msg
+
+    def get_signed_url(
+        self, user_id: str, filename: str, expires_in: int = 3600, download: Optional[str] = None
+    ) -> Optional[str]:
         """
         Get a signed URL for downloading a PDF
 
@@ -180,6 +316,7 @@ class SupabaseStorage:
             user_id: User ID for folder organization
             filename: Name of the file
             expires_in: URL expiration time in seconds (default 1 hour)
+            download: If set, the URL serves the file as an attachment with this name
 
         Returns:
             Signed URL string or None if failed
@@ -189,7 +326,8 @@ class SupabaseStorage:
 
             response = self.supabase.storage.from_(self.bucket_name).create_signed_url(
                 file_path,
-                expires_in
+                expires_in,
+                options={"download": download} if download else None
             )
 
             if response and 'signedURL' in response:
@@ -203,6 +341,32 @@ class SupabaseStorage:
             print(f"Error creating signed URL: {e}")
             return None
 
+    def get_signed_urls(
+        self, user_id: str, filenames: list[str], expires_in: int = 3600, download: bool = False
+    ) -> dict:
+        """
+        Signed download URLs for many PDFs, BULK_BATCH_SIZE paths per request
+
+        Returns:
+            Dict of filename -> signed URL; files that could not be signed are left out
+        """
+        bucket = self.supabase.storage.from_(self.bucket_name)
+        urls = {}
+        for batch in batched(filenames):
+            try:
+                result = bucket.create_signed_urls(
+                    [f"{user_id}/{filename}" for filename in batch],
+                    expires_in,
+                    options={"download": True} if download else None
+                )
+            except Exception as e:
+                print(f"Error creating signed URLs: {e}")
+                continue
+            for entry in result:
+                if entry.get("signedURL") and not entry.get("error"):
+                    urls[entry["path"].rsplit("/", 1)[-1]] = entry["signedURL"]
+        return urls
+
 # Global instance - lazy initialization
 storage = None
 
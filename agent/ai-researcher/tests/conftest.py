@@ -0,0 +1,5 @@
+# conftest.py - Make the agent modules importable from the tests directory
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
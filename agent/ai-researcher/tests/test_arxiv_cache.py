@@ -0,0 +1,68 @@
+# test_arxiv_cache.py - Behaviour shared by the arXiv cache backends
+import time
+
+import pytest
+
+from arxiv_cache import ArxivCacheBackend, MemoryCacheBackend, SQLiteCacheBackend
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    def make(**kwargs):
+        if request.param == "memory":
+            return MemoryCacheBackend(**kwargs)
+        return SQLiteCacheBackend(path=tmp_path / "cache.sqlite3", **kwargs)
+    return make
+
+
+def test_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        ArxivCacheBackend()
+
+
+def test_round_trip_and_counters(make_cache):
+    cache = make_cache()
+    assert cache.get("k") is None
+    cache.set("k", {"entries": [1, 2]})
+    assert cache.get("k") == {"entries": [1, 2]}
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_expired_entry_is_served_as_stale(make_cache):
+    cache = make_cache(ttl=0.05, stale_ttl=60)
+    cache.set("k", {"v": 1})
+    time.sleep(0.1)
+    assert cache.get("k") is None
+    assert cache.get_with_staleness("k") == ({"v": 1}, True)
+
+
+def test_entry_past_stale_window_is_dropped(make_cache):
+    cache = make_cache(ttl=0.01, stale_ttl=0.01)
+    cache.set("k", {"v": 1})
+    time.sleep(0.05)
+    assert cache.get_with_staleness("k") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_evicts_least_recently_used_by_count(make_cache):
+    cache = make_cache(max_entries=2)
+    cache.set("a", {"v": "a"})
+    time.sleep(0.01)
+    cache.set("b", {"v": "b"})
+    time.sleep(0.01)
+    cache.get("a")  # a is now more recent than b
+    time.sleep(0.01)
+    cache.set("c", {"v": "c"})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"v": "a"}
+    assert cache.stats()["evictions"] == 1
+
+
+def test_evicts_by_bytes(make_cache):
+    cache = make_cache(max_bytes=100)
+    cache.set("a", {"v": "x" * 60})
+    time.sleep(0.01)
+    cache.set("b", {"v": "y" * 60})
+    assert cache.get("a") is None
+    assert cache.get("b") is not None
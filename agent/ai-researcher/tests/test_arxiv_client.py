@@ -0,0 +1,81 @@
+# test_arxiv_client.py - Single-flight searches against a stub arXiv Atom server
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+import arxiv_client
+import arxiv_index
+from arxiv_cache import MemoryCacheBackend, set_cache
+from arxiv_client import AsyncArxivClient
+from arxiv_index import ArxivIndex
+from circuit_breaker import CircuitBreaker
+
+FEED = """<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+  <entry>
+    <id>http://arxiv.org/abs/2401.00001v1</id>
+    <title>Graph neural networks</title>
+    <summary>Message passing.</summary>
+    <author><name>Ada Lovelace</name></author>
+  </entry>
+</feed>
+"""
+
+
+class RecordingCache(MemoryCacheBackend):
+    """Memory cache that remembers which threads touched it"""
+
+    def __init__(self):
+        super().__init__()
+        self.threads = set()
+
+    def get_with_staleness(self, key):
+        self.threads.add(threading.get_ident())
+        return super().get_with_staleness(key)
+
+    def set(self, key, data):
+        self.threads.add(threading.get_ident())
+        super().set(key, data)
+
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    cache = RecordingCache()
+    set_cache(cache)
+    monkeypatch.setattr(arxiv_index, "_index", ArxivIndex(tmp_path / "index.sqlite3"))
+    monkeypatch.setattr(arxiv_client, "arxiv_breaker", CircuitBreaker("test"))
+    yield cache
+    set_cache(None)
+
+
+def test_concurrent_identical_searches_share_one_request(isolated):
+    callers = 5
+
+    async def run():
+        client = None
+
+        async def atom_server(request: httpx.Request) -> httpx.Response:
+            # Hold the response until every other caller has joined this request
+            for _ in range(500):
+                if client.coalesced_requests == callers - 1:
+                    break
+                await asyncio.sleep(0.01)
+            return httpx.Response(200, text=FEED)
+
+        client = AsyncArxivClient(transport=httpx.MockTransport(atom_server))
+        try:
+            results = await asyncio.gather(*(client.search("graph networks", 3, mode="upstream") for _ in range(callers)))
+            again = await client.search("graph networks", 3, mode="upstream")
+        finally:
+            await client.aclose()
+        return client, results, again
+
+    client, results, again = asyncio.run(run())
+    assert client.upstream_requests == 1
+    assert client.coalesced_requests == callers - 1
+    assert all(result["entries"][0]["id"] == "2401.00001v1" for result in results)
+    # The follow-up search is a cache hit, and the cache was only used off the loop thread
+    assert again == results[0]
+    assert threading.get_ident() not in isolated.threads
@@ -0,0 +1,85 @@
+# test_arxiv_harvest.py - Paging, short-page stop and shared request spacing of bulk harvests
+import asyncio
+import importlib
+from urllib.parse import parse_qs
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import arxiv_harvest
+import arxiv_index
+from arxiv_client import AsyncArxivClient
+from arxiv_harvest import PoliteScheduler, harvest_arxiv
+from arxiv_index import ArxivIndex
+
+TOTAL = 7  # results the stub server has for any query
+
+
+def feed(start: int, count: int) -> str:
+    entries = "".join(
+        f"<entry><id>http://arxiv.org/abs/2401.{n:05d}v1</id><title>Paper {n}</title><summary>s</summary></entry>"
+        for n in range(start, min(start + count, TOTAL))
+    )
+    return f'<?xml version="1.0"?><feed xmlns="http://www.w3.org/2005/Atom">{entries}</feed>'
+
+
+@pytest.fixture
+def pages(tmp_path, monkeypatch):
+    """Run harvests against a stub arXiv server; returns the (start, max_results) of each request"""
+    requested = []
+
+    def atom_server(request: httpx.Request) -> httpx.Response:
+        params = parse_qs(request.url.query.decode())
+        start, count = int(params["start"][0]), int(params["max_results"][0])
+        requested.append((start, count))
+        return httpx.Response(200, text=feed(start, count))
+
+    client = AsyncArxivClient(transport=httpx.MockTransport(atom_server))
+    monkeypatch.setattr(arxiv_harvest, "get_arxiv_client", lambda: client)
+    monkeypatch.setattr(arxiv_harvest, "get_scheduler", lambda: PoliteScheduler(delay=0))
+    monkeypatch.setattr(arxiv_index, "_index", ArxivIndex(tmp_path / "index.sqlite3"))
+    return requested
+
+
+def harvest(**kwargs) -> list[str]:
+    async def run():
+        return [entry["id"] async for entry in harvest_arxiv("papers", **kwargs)]
+
+    return asyncio.run(run())
+
+
+def test_pages_until_max_results(pages):
+    ids = harvest(max_results=5, page_size=2, start=1)
+    assert ids == [f"2401.{n:05d}v1" for n in range(1, 6)]
+    # The last page only asks for what is still needed
+    assert pages == [(1, 2), (3, 2), (5, 1)]
+
+
+def test_short_page_ends_the_harvest(pages):
+    ids = harvest(max_results=100, page_size=3)
+    assert len(ids) == TOTAL
+    assert pages == [(0, 3), (3, 3), (6, 3)]
+    assert arxiv_index._index.search("paper", 10)
+
+
+def test_negative_start_is_rejected(pages):
+    with pytest.raises(ValueError):
+        harvest(start=-1)
+    assert pages == []
+
+
+def test_workers_sharing_a_schedule_take_turns(tmp_path):
+    # Two schedulers on one file stand in for two uvicorn workers
+    first = PoliteScheduler(delay=10, path=tmp_path / "schedule.sqlite3")
+    second = PoliteScheduler(delay=10, path=tmp_path / "schedule.sqlite3")
+    assert first._reserve() == 0
+    assert 9 < second._reserve() <= 10
+    assert 19 < first._reserve() <= 20
+
+
+def test_endpoint_rejects_negative_start(monkeypatch):
+    monkeypatch.setenv("GOOGLE_API_KEY", "test")
+    main = importlib.import_module("main")
+    response = TestClient(main.app).get("/api/arxiv/harvest", params={"topic": "papers", "start": -5})
+    assert response.status_code == 400
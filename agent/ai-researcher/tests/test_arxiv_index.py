@@ -0,0 +1,52 @@
+# test_arxiv_index.py - Local BM25 index and when local_first may skip the arXiv API
+import pytest
+
+import arxiv_tool
+from arxiv_index import ArxivIndex, key_terms
+
+
+def entry(n: int, title: str, summary: str = "") -> dict:
+    return {"id": f"2401.{n:05d}v1", "title": title, "summary": summary, "authors": ["A. Author"], "categories": ["cs.LG"]}
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = ArxivIndex(tmp_path / "index.sqlite3")
+    entries = [entry(i, f"Filler paper {i} on the theory of learning", "A study of the methods for learning.") for i in range(40)]
+    entries += [entry(100 + i, f"Protein folding with diffusion models {i}", "Diffusion for protein structure.") for i in range(3)]
+    index.add_entries(entries)
+    return index
+
+
+def test_key_terms_drop_stopwords_and_duplicates():
+    assert key_terms("A survey of the diffusion+models for diffusion") == ["diffusion", "models"]
+    # A query made only of stopwords still searches for something
+    assert key_terms("the of") == ["the", "of"]
+
+
+def test_search_ranks_relevant_entries_first(index):
+    results = index.search("protein diffusion", 5)
+    assert len(results) == 3
+    assert all(r["title"].startswith("Protein") for r in results)
+
+
+def test_require_all_needs_every_key_term(index):
+    assert index.search("protein quantum", 5, require_all=True) == []
+    assert len(index.search("protein quantum", 5)) == 3
+
+
+def test_common_words_score_below_the_floor(index):
+    scored = index.search_scored("learning", 5)
+    assert scored and all(score < 1.0 for _, score in scored)
+    assert index.search("learning", 5, min_score=1.0) == []
+
+
+def test_local_first_needs_confident_hits(index, monkeypatch):
+    monkeypatch.setattr(arxiv_tool, "get_index", lambda: index)
+    # Stopwords and a ubiquitous term must not be enough to skip the live API
+    assert arxiv_tool._local_answer("the+theory+of+learning", 5, "local_first") is None
+    assert arxiv_tool._local_answer("protein+folding", 5, "local_first") is None  # only 3 hits
+    answer = arxiv_tool._local_answer("protein+folding", 3, "local_first")
+    assert answer["source"] == "local" and len(answer["entries"]) == 3
+    # local_only answers with whatever it has
+    assert arxiv_tool._local_answer("the+theory+of+learning", 5, "local_only")["entries"]
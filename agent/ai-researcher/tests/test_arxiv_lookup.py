@@ -0,0 +1,95 @@
+# test_arxiv_lookup.py - Batched arXiv ID lookups and ID normalisation
+import asyncio
+import re
+from urllib.parse import parse_qs
+
+import httpx
+import pytest
+
+import arxiv_client
+import arxiv_index
+import arxiv_tool
+from arxiv_cache import MemoryCacheBackend, set_cache
+from arxiv_client import AsyncArxivClient
+from arxiv_index import ArxivIndex
+from arxiv_tool import _normalize_arxiv_id, lookup_arxiv_ids
+from circuit_breaker import CircuitBreaker
+
+
+def feed(ids: list[str]) -> str:
+    # The API answers with versioned IDs, the latest version when none was asked for
+    versioned = [arxiv_id if re.search(r"v\d+$", arxiv_id) else f"{arxiv_id}v3" for arxiv_id in ids]
+    entries = "".join(
+        f"<entry><id>http://arxiv.org/abs/{arxiv_id}</id><title>Paper {arxiv_id}</title><summary>s</summary></entry>"
+        for arxiv_id in versioned
+    )
+    return f'<?xml version="1.0"?><feed xmlns="http://www.w3.org/2005/Atom">{entries}</feed>'
+
+
+def requested_ids(url: str) -> list[str]:
+    return parse_qs(url.split("?", 1)[1])["id_list"][0].split(",")
+
+
+@pytest.fixture(autouse=True)
+def upstream(tmp_path, monkeypatch):
+    """Serve id_list queries from a stub; returns the ID batches that were requested"""
+    batches = []
+
+    def upstream_get(url: str) -> str:
+        batches.append(requested_ids(url))
+        return feed(batches[-1])
+
+    set_cache(MemoryCacheBackend())
+    monkeypatch.setattr(arxiv_index, "_index", ArxivIndex(tmp_path / "index.sqlite3"))
+    monkeypatch.setattr(arxiv_tool, "_upstream_get", upstream_get)
+    monkeypatch.setattr(arxiv_tool, "MAX_ID_LIST", 2)
+    monkeypatch.setattr(arxiv_client, "MAX_ID_LIST", 2)
+    monkeypatch.setattr(arxiv_client, "arxiv_breaker", CircuitBreaker("test"))
+    yield batches
+    set_cache(None)
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("arXiv:2401.00001", "2401.00001"),
+    ("  2401.00001v2 ", "2401.00001v2"),
+    ("https://arxiv.org/abs/2401.00001v2", "2401.00001v2"),
+    ("http://export.arxiv.org/pdf/2401.00001.pdf", "2401.00001"),
+    ("arxiv.org/abs/hep-th/9901001", "hep-th/9901001"),
+])
+def test_normalize_arxiv_id(raw, expected):
+    assert _normalize_arxiv_id(raw) == expected
+
+
+def test_lookup_batches_dedupes_and_reports_invalid_ids(upstream):
+    ids = ["arXiv:2401.00001", "https://arxiv.org/abs/2401.00001", "2401.00002v1", "hep-th/9901001", "not an id", "2401.00003", ""]
+    result = lookup_arxiv_ids(ids)
+    assert upstream == [["2401.00001", "2401.00002v1"], ["hep-th/9901001", "2401.00003"]]
+    # Unversioned requests are matched to the versioned entries the API returns
+    assert [entry["id"] for entry in result["entries"]] == ["2401.00001v3", "2401.00002v1", "hep-th/9901001v3", "2401.00003v3"]
+    assert result["missing"] == ["not an id"]
+
+
+def test_cached_ids_are_not_requested_again(upstream):
+    lookup_arxiv_ids(["2401.00001", "2401.00002"])
+    result = lookup_arxiv_ids(["2401.00002", "2401.00003", "2401.00001"])
+    assert upstream == [["2401.00001", "2401.00002"], ["2401.00003"]]
+    assert [entry["id"] for entry in result["entries"]] == ["2401.00002v3", "2401.00003v3", "2401.00001v3"]
+
+
+def test_async_lookup_uses_the_same_batches():
+    batches = []
+
+    def atom_server(request: httpx.Request) -> httpx.Response:
+        batches.append(requested_ids(str(request.url)))
+        return httpx.Response(200, text=feed(batches[-1]))
+
+    async def run():
+        client = AsyncArxivClient(transport=httpx.MockTransport(atom_server))
+        try:
+            return await client.lookup_ids(["arXiv:2401.00001", "2401.00002", "2401.00003", "2401.00001"])
+        finally:
+            await client.aclose()
+
+    result = asyncio.run(run())
+    assert sorted(batches) == [["2401.00001", "2401.00002"], ["2401.00003"]]
+    assert len(result["entries"]) == 3 and result["missing"] == []
@@ -0,0 +1,58 @@
+# test_arxiv_parser.py - Streaming Atom parsing of arXiv API responses
+import pytest
+
+from arxiv_tool import LXML_AVAILABLE, iter_arxiv_entries, parse_arxiv_xml
+
+FEED = """<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom" xmlns:arxiv="http://arxiv.org/schemas/atom">
+  <title>ArXiv Query</title>
+  <entry>
+    <id>http://arxiv.org/abs/2401.00001v2</id>
+    <title>Attention Is
+      Still All You Need</title>
+    <summary>
+      A summary with &amp; entities.
+    </summary>
+    <author><name>Ada Lovelace</name></author>
+    <author><name>Alan Turing</name></author>
+    <category term="cs.LG" scheme="http://arxiv.org/schemas/atom"/>
+    <category term="stat.ML" scheme="http://arxiv.org/schemas/atom"/>
+    <link href="http://arxiv.org/abs/2401.00001v2" rel="alternate" type="text/html"/>
+    <link title="pdf" href="http://arxiv.org/pdf/2401.00001v2" rel="related" type="application/pdf"/>
+    <link title="pdf" href="http://arxiv.org/pdf/other" rel="related" type="application/pdf"/>
+  </entry>
+  <entry>
+    <id>http://arxiv.org/abs/2401.00002v1</id>
+    <title>No links</title>
+    <summary></summary>
+  </entry>
+</feed>
+"""
+
+PARSERS = [False] + ([True] if LXML_AVAILABLE else [])
+
+
+@pytest.mark.parametrize("use_lxml", PARSERS)
+def test_entry_fields(use_lxml):
+    first, second = iter_arxiv_entries(FEED, use_lxml=use_lxml)
+    assert first == {
+        "id": "2401.00001v2",
+        "title": "Attention Is\n      Still All You Need",
+        "summary": "A summary with & entities.",
+        "authors": ["Ada Lovelace", "Alan Turing"],
+        "categories": ["cs.LG", "stat.ML"],
+        "pdf": "http://arxiv.org/pdf/2401.00001v2",
+    }
+    assert second["id"] == "2401.00002v1"
+    assert (second["summary"], second["authors"], second["pdf"]) == ("", [], None)
+
+
+@pytest.mark.parametrize("use_lxml", PARSERS)
+def test_bytes_input_and_empty_feed(use_lxml):
+    assert len(list(iter_arxiv_entries(FEED.encode("utf-8"), use_lxml=use_lxml))) == 2
+    empty = '<feed xmlns="http://www.w3.org/2005/Atom"><title>none</title></feed>'
+    assert list(iter_arxiv_entries(empty, use_lxml=use_lxml)) == []
+
+
+def test_parse_arxiv_xml_wraps_entries():
+    assert [e["id"] for e in parse_arxiv_xml(FEED)["entries"]] == ["2401.00001v2", "2401.00002v1"]
@@ -0,0 +1,84 @@
+# test_arxiv_refresh.py - Stale-while-revalidate: stale answers now, one background refresh per key
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+
+import arxiv_client
+import arxiv_index
+import arxiv_tool
+from arxiv_cache import MemoryCacheBackend, set_cache
+from arxiv_client import AsyncArxivClient
+from arxiv_index import ArxivIndex
+from arxiv_tool import _normalize_query, _search_cache_key, search_arxiv_papers
+from circuit_breaker import CircuitBreaker
+
+TOPIC = "graph networks"
+STALE = {"entries": [{"id": "old"}]}
+FEED = """<?xml version="1.0"?><feed xmlns="http://www.w3.org/2005/Atom">
+<entry><id>http://arxiv.org/abs/2401.00001v1</id><title>New</title><summary>s</summary></entry></feed>"""
+
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path, monkeypatch):
+    # ttl=0: every entry is expired but still servable as stale
+    cache = MemoryCacheBackend(ttl=0)
+    cache.set(_search_cache_key(_normalize_query(TOPIC), 3), STALE)
+    set_cache(cache)
+    monkeypatch.setattr(arxiv_index, "_index", ArxivIndex(tmp_path / "index.sqlite3"))
+    monkeypatch.setattr(arxiv_client, "arxiv_breaker", CircuitBreaker("test"))
+    yield cache
+    set_cache(None)
+
+
+def cached_entries(cache) -> list:
+    return cache.get_with_staleness(_search_cache_key(_normalize_query(TOPIC), 3))[0]["entries"]
+
+
+def test_sync_search_refreshes_each_key_once(cache, monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def upstream_get(url: str) -> str:
+        calls.append(url)
+        release.wait(5)
+        return FEED
+
+    monkeypatch.setattr(arxiv_tool, "_upstream_get", upstream_get)
+    results = [search_arxiv_papers(TOPIC, 3, mode="upstream") for _ in range(3)]
+    assert results == [STALE] * 3
+    release.set()
+    for _ in range(500):
+        if not arxiv_tool._refreshing:
+            break
+        time.sleep(0.01)
+    assert len(calls) == 1
+    assert cached_entries(cache)[0]["id"] == "2401.00001v1"
+
+
+def test_async_search_refreshes_each_key_once(cache):
+    async def run():
+        client = None
+
+        async def atom_server(request: httpx.Request) -> httpx.Response:
+            # Keep the refresh in flight until the other callers have spawned theirs
+            for _ in range(500):
+                if client.coalesced_requests == 2:
+                    break
+                await asyncio.sleep(0.01)
+            return httpx.Response(200, text=FEED)
+
+        client = AsyncArxivClient(transport=httpx.MockTransport(atom_server))
+        try:
+            results = await asyncio.gather(*(client.search(TOPIC, 3, mode="upstream") for _ in range(3)))
+            await asyncio.gather(*client._background)
+        finally:
+            await client.aclose()
+        return client, results
+
+    client, results = asyncio.run(run())
+    assert results == [STALE] * 3
+    assert client.upstream_requests == 1 and client.coalesced_requests == 2
+    assert cached_entries(cache)[0]["id"] == "2401.00001v1"
@@ -0,0 +1,95 @@
+# test_circuit_breaker.py - State transitions of CircuitBreaker and probe release in the arXiv client
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import arxiv_client
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+def open_breaker(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.failure_threshold):
+        breaker.check()
+        breaker.record_failure()
+
+
+def test_opens_after_threshold_and_rejects():
+    breaker = CircuitBreaker("t", failure_threshold=3, reset_timeout=60)
+    open_breaker(breaker)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    assert breaker.stats()["rejected_calls"] == 1
+
+
+def test_success_resets_failure_count():
+    breaker = CircuitBreaker("t", failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_half_open_allows_a_single_probe():
+    breaker = CircuitBreaker("t", failure_threshold=1, reset_timeout=0.01)
+    open_breaker(breaker)
+    time.sleep(0.02)
+    assert breaker.check() is True
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+
+def test_probe_success_closes_and_failure_reopens():
+    breaker = CircuitBreaker("t", failure_threshold=1, reset_timeout=0.01)
+    open_breaker(breaker)
+    time.sleep(0.02)
+    breaker.check()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    time.sleep(0.02)
+    breaker.check()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.check() is False
+
+
+def test_released_probe_lets_the_next_call_probe():
+    breaker = CircuitBreaker("t", failure_threshold=1, reset_timeout=0.01)
+    open_breaker(breaker)
+    time.sleep(0.02)
+    assert breaker.check() is True
+    breaker.release_probe()
+    assert breaker.state == "half_open"
+    assert breaker.check() is True
+
+
+def test_cancelled_probe_does_not_wedge_the_client(monkeypatch):
+    breaker = CircuitBreaker("arxiv", failure_threshold=1, reset_timeout=0.01)
+    monkeypatch.setattr(arxiv_client, "arxiv_breaker", breaker)
+    open_breaker(breaker)
+    time.sleep(0.02)
+
+    async def hang(request):
+        await asyncio.sleep(10)
+
+    async def ok(request):
+        return httpx.Response(200, text="<feed/>")
+
+    async def run():
+        client = arxiv_client.AsyncArxivClient(transport=httpx.MockTransport(hang))
+        task = asyncio.ensure_future(client.fetch_text("http://arxiv.test/api"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await client.aclose()
+
+        client = arxiv_client.AsyncArxivClient(transport=httpx.MockTransport(ok))
+        assert await client.fetch_text("http://arxiv.test/api") == "<feed/>"
+        await client.aclose()
+
+    asyncio.run(run())
+    assert breaker.state == "closed"
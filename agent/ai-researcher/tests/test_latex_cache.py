@@ -0,0 +1,52 @@
+# test_latex_cache.py - Content-hash cache of compiled PDFs
+import os
+from pathlib import Path
+
+from latex_cache import CompileCache
+
+
+def test_key_depends_on_source_and_engine():
+    assert CompileCache.key("doc", "tectonic 0.15") != CompileCache.key("doc", "tectonic 0.16")
+    assert CompileCache.key("doc", "v") == CompileCache.key("doc", "v")
+
+
+def test_restore_hit_and_miss(tmp_path):
+    cache = CompileCache(tmp_path / "cache")
+    built = tmp_path / "built.pdf"
+    built.write_bytes(b"%PDF-1.5 built")
+    key = CompileCache.key("doc", "v")
+    dest = tmp_path / "copy.pdf"
+    assert cache.restore(key, dest) is False
+    cache.put(key, built)
+    assert cache.restore(key, dest) is True
+    assert dest.read_bytes() == b"%PDF-1.5 built"
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_restore_after_concurrent_eviction_is_a_miss(tmp_path):
+    cache = CompileCache(tmp_path / "cache")
+    built = tmp_path / "built.pdf"
+    built.write_bytes(b"%PDF")
+    key = CompileCache.key("doc", "v")
+    cache.put(key, built).unlink()
+    assert cache.restore(key, tmp_path / "copy.pdf") is False
+
+
+def test_eviction_is_lru_and_tolerates_vanished_files(tmp_path, monkeypatch):
+    cache = CompileCache(tmp_path / "cache", max_bytes=1500)
+    built = tmp_path / "built.pdf"
+    built.write_bytes(b"x" * 1000)
+    first = cache.put(CompileCache.key("a", "v"), built)
+    os.utime(first, (1, 1))
+    real_stat = Path.stat
+
+    def racing_stat(self, *args, **kwargs):
+        if self.name.startswith("gone"):
+            raise FileNotFoundError(self)
+        return real_stat(self, *args, **kwargs)
+
+    (first.parent / "gone.pdf").write_bytes(b"")
+    monkeypatch.setattr(Path, "stat", racing_stat)
+    cache.put(CompileCache.key("b", "v"), built)
+    assert not first.exists()
+    assert cache.restore(CompileCache.key("b", "v"), tmp_path / "copy.pdf")
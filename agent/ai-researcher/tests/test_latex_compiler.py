@@ -0,0 +1,98 @@
+# test_latex_compiler.py - Cross-worker tectonic warm-up and compile cancellation
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+import latex_compiler
+from latex_compiler import CompileResult, CompileScheduler, _Job, _claim_warm_up
+
+
+class FakeScheduler:
+    def __init__(self, returncode: int = 0):
+        self.returncode = returncode
+        self.calls = []
+
+    async def compile(self, tex_filename, output_dir, timeout=None):
+        self.calls.append(output_dir)
+        assert (output_dir / tex_filename).exists()
+        return CompileResult(self.returncode, "", "boom" if self.returncode else "", 0.1, 0.0)
+
+
+def setup_warm_up(monkeypatch, tmp_path, scheduler):
+    async def version():
+        return "tectonic 0.15 bundle=default"
+
+    monkeypatch.setattr(latex_compiler, "TECTONIC_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(latex_compiler.shutil, "which", lambda name: "/usr/bin/tectonic")
+    monkeypatch.setattr(latex_compiler, "tectonic_version", version)
+    monkeypatch.setattr(latex_compiler, "get_compile_scheduler", lambda: scheduler)
+    monkeypatch.setattr(latex_compiler, "warmup_status", {"state": "pending", "seconds": None, "error": None})
+
+
+def test_claim_is_exclusive_and_stale_locks_are_taken_over(tmp_path):
+    lock = tmp_path / "warmup.lock"
+    assert _claim_warm_up(lock) is True
+    assert _claim_warm_up(lock) is False
+    stale = time.time() - latex_compiler.LATEX_WARMUP_TIMEOUT - 120
+    os.utime(lock, (stale, stale))
+    assert _claim_warm_up(lock) is True
+
+
+def test_warm_up_runs_once_in_a_private_directory(monkeypatch, tmp_path):
+    scheduler = FakeScheduler()
+    setup_warm_up(monkeypatch, tmp_path, scheduler)
+    asyncio.run(latex_compiler.warm_up_tectonic())
+    asyncio.run(latex_compiler.warm_up_tectonic())
+    assert len(scheduler.calls) == 1
+    assert scheduler.calls[0].parent == tmp_path / "warmup"
+    assert not scheduler.calls[0].exists()  # temporary directory removed
+    assert not (tmp_path / "warmup" / "warmup.lock").exists()
+    assert latex_compiler.warmup_status["state"] == "done"
+
+
+def test_warm_up_skips_while_another_worker_holds_the_lock(monkeypatch, tmp_path):
+    scheduler = FakeScheduler()
+    setup_warm_up(monkeypatch, tmp_path, scheduler)
+    (tmp_path / "warmup").mkdir()
+    assert _claim_warm_up(tmp_path / "warmup" / "warmup.lock")
+    asyncio.run(latex_compiler.warm_up_tectonic())
+    assert scheduler.calls == []
+    assert latex_compiler.warmup_status["state"] == "skipped"
+
+
+def test_failed_warm_up_is_retried_next_start(monkeypatch, tmp_path):
+    scheduler = FakeScheduler(returncode=1)
+    setup_warm_up(monkeypatch, tmp_path, scheduler)
+    asyncio.run(latex_compiler.warm_up_tectonic())
+    assert latex_compiler.warmup_status["state"] == "failed"
+    asyncio.run(latex_compiler.warm_up_tectonic())
+    assert len(scheduler.calls) == 2
+
+
+def test_cancelled_compile_reaps_the_killed_process(monkeypatch, tmp_path):
+    processes = []
+    real_exec = asyncio.create_subprocess_exec
+
+    async def record_exec(*args, **kwargs):
+        processes.append(await real_exec(*args, **kwargs))
+        return processes[-1]
+
+    # A compile that never finishes on its own
+    monkeypatch.setattr(latex_compiler, "tectonic_command", lambda tex, out: [sys.executable, "-c", "import time; time.sleep(60)"])
+    monkeypatch.setattr(latex_compiler.asyncio, "create_subprocess_exec", record_exec)
+
+    async def run():
+        scheduler = CompileScheduler(workers=1)
+        job = _Job("paper.tex", tmp_path, 60, asyncio.get_running_loop().create_future(), time.monotonic())
+        task = asyncio.ensure_future(scheduler._run(job))
+        while not processes:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert processes[0].returncode is not None
@@ -0,0 +1,87 @@
+# test_latex_preflight.py - Structural LaTeX checks and tectonic log parsing
+from latex_preflight import parse_tectonic_log, preflight_latex
+
+
+def document(body: str, preamble: str = "") -> str:
+    return "\\documentclass{article}\n" + preamble + "\\begin{document}\n" + body + "\n\\end{document}\n"
+
+
+def errors(source: str) -> list:
+    return [d for d in preflight_latex(source) if d.severity == "error"]
+
+
+def test_well_formed_document_is_clean():
+    source = document("\\section{Intro}\nText with \\{ literal braces \\}.\n", "\\title{T}\n\\author{A}\n")
+    assert preflight_latex(source) == []
+
+
+def test_missing_skeleton():
+    messages = [d.message for d in preflight_latex("\\section{Intro}\n")]
+    assert "missing \\documentclass" in messages
+    assert "missing \\begin{document}" in messages
+    assert any(m.startswith("missing \\end{document}") for m in messages)
+
+
+def test_unbalanced_braces_report_their_line():
+    diagnostics = errors(document("ok\n\\textbf{bold\n"))
+    assert [(d.line, d.message) for d in diagnostics] == [(4, "unclosed brace '{'")]
+    diagnostics = errors(document("stray}\n"))
+    assert [(d.line, d.message) for d in diagnostics] == [(3, "unmatched closing brace '}'")]
+
+
+def test_misnested_environments():
+    source = document("\\begin{itemize}\n\\begin{enumerate}\n\\end{itemize}\n\\end{center}")
+    messages = [d.message for d in errors(source)]
+    assert any("\\begin{enumerate}" in m and "still open" in m for m in messages)
+    assert "\\end{center} without matching \\begin{center}" in messages
+
+
+def test_comments_and_verbatim_are_ignored():
+    source = document(
+        "% a comment with { and \\begin{itemize}\n"
+        "\\begin{verbatim}\n{ % \\end{itemize}\n\\end{verbatim}\n"
+        "50\\% done\n"
+    )
+    assert errors(source) == []
+
+
+def test_percent_in_url_and_href_is_not_a_comment():
+    source = document(
+        "See \\url{https://example.com/a%20b} and \\href{https://example.com/?q=a%2Cb}{the docs}.\n"
+    )
+    assert errors(source) == []
+    # The link text of \href is still checked
+    assert [d.message for d in errors(document("\\href{https://example.com/%20}{unclosed\n"))] == ["unclosed brace '{'"]
+
+
+def test_verb_contents_are_ignored():
+    source = document("Use \\verb|{%| or \\verb+}+ or \\verb*!%{! inline.\n")
+    assert errors(source) == []
+
+
+def test_preamble_only_command_in_body_is_an_error():
+    diagnostics = errors(document("\\usepackage{amsmath}\n"))
+    assert len(diagnostics) == 1 and "preamble" in diagnostics[0].message
+
+
+def test_title_macros_in_body_are_warnings():
+    diagnostics = preflight_latex(document("\\title{Early}\n\\maketitle\n\\author{Late}\n"))
+    assert [(d.line, d.severity) for d in diagnostics] == [(3, "warning"), (5, "warning")]
+    assert "after \\maketitle" in diagnostics[1].message
+
+
+def test_parse_tectonic_log():
+    log = (
+        "note: Running TeX ...\n"
+        "warning: paper.tex:3: Overfull \\hbox\n"
+        "error: paper.tex:12: Undefined control sequence\n"
+        "! Missing $ inserted.\n"
+        "l.20 x^2\n"
+        "error: halted on potentially-recoverable error as specified\n"
+        "error: paper.tex:12: Undefined control sequence\n"
+    )
+    assert [(d.severity, d.line, d.message) for d in parse_tectonic_log(log)] == [
+        ("error", 12, "Undefined control sequence"),
+        ("error", 20, "Missing $ inserted."),
+        ("warning", 3, "Overfull \\hbox"),
+    ]
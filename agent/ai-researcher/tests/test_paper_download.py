@@ -0,0 +1,250 @@
+# test_paper_download.py - Range, ETag/304, cache freshness and signed URLs of paper downloads
+import asyncio
+import importlib
+import json
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import paper_download
+import supabase_async
+from paper_download import ServedPdfCache, SignedUrlCache, etag_matches, forget_pdfs, tee_to_cache
+from supabase_async import AsyncSupabaseStorage
+
+USER = "user-1"
+FILENAME = "test_paper_download_fixture.pdf"
+BODY = bytes(range(256)) * 3000  # several download chunks
+
+
+class FakeStorageApi:
+    """Objects in memory behind the Storage REST routes the client uses"""
+
+    def __init__(self):
+        self.objects = {f"{USER}/{FILENAME}": (BODY, '"v1"')}
+        self.requests: list[httpx.Request] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        prefix = f"/storage/v1/object/{supabase_async.BUCKET_NAME}"
+        if request.method == "DELETE" and request.url.path == prefix:
+            removed = [path for path in json.loads(request.content)["prefixes"] if self.objects.pop(path, None)]
+            return httpx.Response(200, json=[{"name": path} for path in removed])
+        if request.method == "GET" and request.url.path.startswith(prefix + "/"):
+            entry = self.objects.get(request.url.path[len(prefix) + 1:])
+            if entry is None:
+                # What Supabase answers for a missing object
+                return httpx.Response(400, json={"statusCode": "404", "error": "not_found"})
+            body, etag = entry
+            if request.headers.get("if-none-match") == etag:
+                return httpx.Response(304, headers={"ETag": etag})
+            return httpx.Response(200, content=body, headers={"ETag": etag, "Content-Length": str(len(body))})
+        return httpx.Response(404)
+
+    def downloads(self) -> list[httpx.Request]:
+        return [r for r in self.requests if r.method == "GET"]
+
+
+@pytest.fixture
+def api():
+    return FakeStorageApi()
+
+
+@pytest.fixture
+def storage(api):
+    return AsyncSupabaseStorage("https://example.supabase.co", "service-key", transport=httpx.MockTransport(api))
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    served = ServedPdfCache(tmp_path / "served")
+    monkeypatch.setattr(paper_download, "_served_cache", served)
+    monkeypatch.setattr(paper_download, "signed_url_cache", SignedUrlCache())
+    return served
+
+
+@pytest.fixture
+def client(monkeypatch, storage, cache):
+    monkeypatch.setenv("GOOGLE_API_KEY", "test")
+    main = importlib.import_module("main")
+    monkeypatch.setattr(supabase_async, "get_async_storage", lambda: storage)
+    return TestClient(main.app)
+
+
+def download(client, **headers) -> httpx.Response:
+    return client.get(f"/api/papers/download/{FILENAME}", params={"user_id": USER, "mode": "proxy"}, headers=headers)
+
+
+def test_etag_matches():
+    assert etag_matches('"a", W/"b"', '"b"')
+    assert etag_matches("*", '"x"')
+    assert not etag_matches('"a"', '"b"')
+    assert not etag_matches(None, '"b"')
+
+
+def test_proxy_fills_cache_then_serves_ranges_and_304(client, api, cache):
+    response = download(client)
+    assert response.status_code == 200 and response.content == BODY
+    assert response.headers["etag"] == '"v1"'
+    assert cache.get(USER, FILENAME)[1] == '"v1"'
+
+    response = download(client, Range="bytes=10-19")
+    assert response.status_code == 206 and response.content == BODY[10:20]
+    assert response.headers["content-range"] == f"bytes 10-19/{len(BODY)}"
+
+    response = download(client, **{"If-None-Match": '"v1"'})
+    assert response.status_code == 304
+    # Both repeats came from disk
+    assert len(api.downloads()) == 1
+
+
+def test_range_on_a_miss_fetches_the_file_once(client, api):
+    response = download(client, Range="bytes=-5")
+    assert response.status_code == 206 and response.content == BODY[-5:]
+    assert len(api.downloads()) == 1
+
+
+def test_stale_copy_is_revalidated_by_etag(client, api, cache):
+    cache.revalidate_after = 0
+    assert download(client).status_code == 200
+    response = download(client)
+    assert response.status_code == 200 and response.content == BODY
+    revalidation = api.downloads()[-1]
+    assert revalidation.headers["if-none-match"] == '"v1"'
+
+
+def test_replaced_object_refreshes_the_cache(client, api, cache):
+    cache.revalidate_after = 0
+    download(client)
+    api.objects[f"{USER}/{FILENAME}"] = (b"%PDF new", '"v2"')
+    assert download(client).content == b"%PDF new"
+    assert cache.get(USER, FILENAME)[1] == '"v2"'
+
+
+def test_object_deleted_elsewhere_is_not_served(client, api, cache):
+    cache.revalidate_after = 0
+    download(client)
+    del api.objects[f"{USER}/{FILENAME}"]
+    assert download(client).status_code == 404
+    assert cache.get(USER, FILENAME) is None
+
+
+def test_delete_through_the_client_invalidates_caches(client, storage, cache):
+    download(client)
+    paper_download.signed_url_cache.put(USER, FILENAME, "https://signed", 3600, 0)
+    deleted, error = asyncio.run(storage.delete_pdfs(USER, [FILENAME]))
+    assert deleted == [FILENAME] and error is None
+    assert cache.get(USER, FILENAME) is None
+    assert paper_download.signed_url_cache.get(USER, FILENAME) is None
+    assert download(client).status_code == 404
+
+
+def test_interrupted_download_leaves_nothing_cached(cache):
+    async def read_one_chunk():
+        upstream = httpx.Response(200, content=BODY, headers={"ETag": '"v1"'})
+        stream = tee_to_cache(upstream, cache, USER, FILENAME)
+        await stream.__anext__()
+        await stream.aclose()
+
+    asyncio.run(read_one_chunk())
+    assert cache.get(USER, FILENAME) is None
+    assert list(cache.root.rglob("*.tmp")) == []
+
+
+def test_evict_skips_files_removed_by_another_worker(cache, monkeypatch):
+    cache.max_bytes = 0
+    path = cache.path_for(USER, FILENAME)
+    path.parent.mkdir(parents=True)
+    path.write_bytes(BODY)
+    vanished = cache.root / "ab" / "gone.pdf"
+    real_glob = Path.glob
+    monkeypatch.setattr(Path, "glob", lambda self, pattern: [*real_glob(self, pattern), vanished])
+    cache._evict()
+    assert not path.exists()
+
+
+def test_forget_pdfs_drops_signed_urls(cache):
+    paper_download.signed_url_cache.put(USER, FILENAME, "https://signed", 3600, 0)
+    forget_pdfs(USER, [FILENAME])
+    assert paper_download.signed_url_cache.stats()["entries"] == 0
+
+
+def test_commit_replaces_the_pdf_before_its_etag(cache, monkeypatch):
+    tmp = cache.temp_path(USER, FILENAME)
+    tmp.write_bytes(BODY)
+    cache.commit(USER, FILENAME, tmp, '"v1"')
+
+    seen = []
+    real_replace = paper_download.os.replace
+
+    def replace(src, dst):
+        # What a concurrent reader would find just before each move
+        seen.append((Path(dst).suffix, cache.get(USER, FILENAME)))
+        real_replace(src, dst)
+
+    monkeypatch.setattr(paper_download.os, "replace", replace)
+    tmp = cache.temp_path(USER, FILENAME)
+    tmp.write_bytes(b"%PDF new")
+    path = cache.commit(USER, FILENAME, tmp, '"v2"')
+    # The old ETag is gone before the new bytes land, and the new one only follows them
+    assert seen == [(".pdf", None), (".etag", None)]
+    assert cache.get(USER, FILENAME) == (path, '"v2"', True)
+    assert path.read_bytes() == b"%PDF new"
+    assert list(cache.root.rglob("*.tmp")) == []
+
+
+class Clock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_signed_url_is_dropped_within_the_expiry_margin(monkeypatch):
+    clock = Clock(1000.0)
+    monkeypatch.setattr(paper_download.time, "time", clock)
+    urls = SignedUrlCache(margin=300)
+    urls.put(USER, FILENAME, "https://signed", 3600, signed_at=1000.0)
+    assert urls.get(USER, FILENAME) == ("https://signed", 3300.0)
+    clock.now = 4299.0
+    assert urls.get(USER, FILENAME) == ("https://signed", 1.0)
+    # 300s before the real expiry the URL is no longer handed out, and the entry is gone
+    clock.now = 4300.0
+    assert urls.get(USER, FILENAME) is None
+    assert urls.stats() == {"entries": 0, "hits": 2, "misses": 1}
+
+
+def test_signed_url_cache_is_bounded_lru():
+    urls = SignedUrlCache(max_entries=2)
+    for name in ("a.pdf", "b.pdf"):
+        urls.put(USER, name, f"https://{name}", 3600, time.time())
+    urls.get(USER, "a.pdf")
+    urls.put(USER, "c.pdf", "https://c.pdf", 3600, time.time())
+    assert urls.get(USER, "b.pdf") is None
+    assert urls.get(USER, "a.pdf") is not None and urls.get(USER, "c.pdf") is not None
+
+
+def test_signed_download_url_reuses_until_the_margin(cache, monkeypatch):
+    class FakeSigner:
+        calls = 0
+
+        async def get_signed_url(self, user_id, filename, expires_in, download=None):
+            self.calls += 1
+            return f"https://signed/{self.calls}"
+
+    clock = Clock(1000.0)
+    monkeypatch.setattr(paper_download.time, "time", clock)
+    monkeypatch.setattr(paper_download, "SIGNED_URL_TTL", 3600)
+    signer = FakeSigner()
+    sign = lambda: asyncio.run(paper_download.signed_download_url(signer, USER, FILENAME))
+
+    margin = paper_download.signed_url_cache.margin
+    assert sign() == ("https://signed/1", 3600 - margin)
+    clock.now += 3600 - margin - 1
+    assert sign() == ("https://signed/1", 1.0)
+    clock.now += 1
+    assert sign() == ("https://signed/2", 3600 - margin)
+    assert signer.calls == 2
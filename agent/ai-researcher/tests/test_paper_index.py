@@ -0,0 +1,85 @@
+# test_paper_index.py - Passage chunking, BM25 retrieval and the long-paper digest
+import pytest
+
+import read_pdf
+from paper_index import PaperIndex, chunk_pages, paper_id_for
+from read_pdf import query_paper, read_full_paper
+
+URL = "https://arxiv.org/pdf/2401.00001v1"
+FILLER = "the model is trained on data and evaluated on benchmarks " * 30
+PAGES = [
+    "Abstract\nWe study sparse attention for long documents.\n1 Introduction\n" + FILLER,
+    "2 Method\nOur loss combines a contrastive objective with label smoothing. " + FILLER,
+    "3 Results\nThroughput improves fourfold on the benchmark. " + FILLER,
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    return PaperIndex(tmp_path / "papers.sqlite3")
+
+
+def test_chunks_overlap_and_keep_their_start_page():
+    pages = ["w0 w1 w2 w3 w4", "w5 w6 w7 w8 w9"]
+    assert chunk_pages(pages, words=4, overlap=1) == [
+        (0, "w0 w1 w2 w3"),
+        (0, "w3 w4 w5 w6"),
+        (1, "w6 w7 w8 w9"),
+    ]
+    # Overlap as large as the window still advances
+    assert len(chunk_pages(pages, words=2, overlap=2)) == 9
+    assert chunk_pages([""], words=4, overlap=1) == []
+
+
+def test_paper_id_is_the_arxiv_id_or_a_hash_prefix():
+    assert paper_id_for(URL, "f" * 64) == "2401.00001v1"
+    assert paper_id_for("https://example.org/x.pdf", "0123456789abcdef") == "0123456789ab"
+
+
+def test_query_ranks_the_matching_passage_first(index):
+    index.add_paper("p1", URL, "sha-1", PAGES)
+    index.add_paper("p2", "https://other", "sha-2", ["contrastive objective everywhere " * 20])
+    best = index.query("p1", "contrastive loss objective", k=3)
+    # Passages are labelled with the page they start on
+    assert best[0]["page"] in (1, 2) and "contrastive objective" in best[0]["text"]
+    assert all(later["score"] <= best[0]["score"] for later in best[1:])
+    # Operators in the question are taken literally, and passages never leak across papers
+    assert index.query("p1", 'loss" OR NEAR(', k=20)
+    assert index.query("p1", "???") == []
+    assert index.query("p3", "contrastive") == []
+
+
+def test_reindexing_is_keyed_by_content_hash(index):
+    added = index.add_paper("p1", URL, "sha-1", PAGES)
+    assert added > 0
+    assert index.add_paper("p1", URL, "sha-1", PAGES) == 0
+    assert index.stats() == {"papers": 1, "passages": added}
+    # New content under the same ID replaces the old passages
+    assert index.add_paper("p1", URL, "sha-2", ["a revised paper about graphs"]) == 1
+    assert index.stats() == {"papers": 1, "passages": 1}
+    assert index.query("p1", "contrastive") == []
+
+
+@pytest.fixture
+def reader(index, monkeypatch):
+    monkeypatch.setattr(read_pdf, "get_paper_index", lambda: index)
+    monkeypatch.setattr(read_pdf, "read_pdf_document", lambda url, parallel=None: ("ab" * 32, PAGES))
+
+
+def test_short_paper_is_returned_in_full(reader, index, monkeypatch):
+    monkeypatch.setattr(read_pdf, "READ_PDF_MAX_CHARS", 100_000)
+    assert read_full_paper(URL) == "\n".join(PAGES).strip()
+    assert index.stats()["papers"] == 0
+
+
+def test_long_paper_is_indexed_and_digested(reader, index, monkeypatch):
+    monkeypatch.setattr(read_pdf, "READ_PDF_MAX_CHARS", 1000)
+    digest = read_full_paper(URL)
+    assert digest.startswith("paper_id: 2401.00001v1\nLength: 3 pages")
+    assert "Abstract: We study sparse attention for long documents." in digest
+    assert "Sections: Abstract; 1 Introduction; 2 Method; 3 Results" in digest
+    assert index.has_paper("2401.00001v1")
+
+    answer = query_paper.invoke({"paper_id": "2401.00001v1", "question": "throughput", "k": 1})
+    assert answer.startswith("[Passage 1, page ") and "fourfold" in answer
+    assert "Read the paper with read_pdf first" in query_paper.invoke({"paper_id": "nope", "question": "x"})
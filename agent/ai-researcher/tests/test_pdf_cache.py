@@ -0,0 +1,110 @@
+# test_pdf_cache.py - URL normalisation, blob sharing, eviction and pinned reads of cached PDFs
+import hashlib
+from pathlib import Path
+
+import pytest
+
+import read_pdf
+from pdf_cache import PdfCache, normalize_pdf_url
+
+BODY = b"%PDF-1.4 first document"
+OTHER = b"%PDF-1.4 second document"
+
+
+@pytest.mark.parametrize("url, key", [
+    ("https://arxiv.org/pdf/2401.00001v2", "arxiv:2401.00001v2"),
+    ("http://export.arxiv.org/abs/2401.00001v2.pdf", "arxiv:2401.00001v2"),
+    ("https://www.arxiv.org/pdf/2401.00001v2/#page=3", "arxiv:2401.00001v2"),
+    ("HTTPS://Example.ORG/Paper.pdf?x=1#top", "https://example.org/Paper.pdf?x=1"),
+])
+def test_normalize_pdf_url(url, key):
+    assert normalize_pdf_url(url) == key
+
+
+def store(cache: PdfCache, url: str, body: bytes):
+    tmp = cache.temp_path()
+    tmp.write_bytes(body)
+    return cache.store_file(url, tmp, hashlib.sha256(body).hexdigest(), len(body))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return PdfCache(tmp_path / "pdfs")
+
+
+def test_equivalent_urls_share_one_blob(cache):
+    stored = store(cache, "https://arxiv.org/pdf/2401.00001v1", BODY)
+    entry = cache.lookup("http://arxiv.org/abs/2401.00001v1")
+    assert entry.sha256 == stored.sha256 and entry.path.read_bytes() == BODY
+    # Versioned arXiv PDFs never need revalidation
+    cache.revalidate_after = 0
+    assert cache.is_fresh(entry)
+    store(cache, "https://mirror.example/paper.pdf", BODY)
+    assert cache.stats()["blobs"] == 1
+
+
+def test_least_recently_used_blob_is_evicted(cache):
+    cache.max_bytes = len(BODY) + len(OTHER) - 1
+    store(cache, "https://a.example/1.pdf", BODY)
+    store(cache, "https://a.example/2.pdf", OTHER)
+    assert cache.lookup("https://a.example/1.pdf") is None
+    assert cache.lookup("https://a.example/2.pdf").path.read_bytes() == OTHER
+
+
+def test_pinned_blob_stays_readable_after_eviction(cache):
+    store(cache, "https://a.example/1.pdf", BODY)
+    entry = cache.lookup("https://a.example/1.pdf")
+    with cache.pinned(entry) as path:
+        # Another worker evicts the blob between our lookup and our read
+        cache.max_bytes = 0
+        store(cache, "https://a.example/2.pdf", OTHER)
+        assert not entry.path.exists()
+        assert path.read_bytes() == BODY
+    assert not path.exists()
+
+
+def test_blob_evicted_before_pinning_is_a_miss(cache):
+    store(cache, "https://a.example/1.pdf", BODY)
+    entry = cache.lookup("https://a.example/1.pdf")
+    entry.path.unlink()
+    with cache.pinned(entry) as path:
+        assert path is None
+    assert cache.lookup("https://a.example/1.pdf") is None
+
+
+class FakeResponse:
+    status_code = 200
+    ok = True
+    headers = {}
+
+    def __init__(self, body: bytes):
+        self.body = body
+
+    def iter_content(self, chunk_size):
+        yield self.body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def test_download_refetches_a_blob_lost_after_lookup(cache, monkeypatch):
+    store(cache, "https://a.example/1.pdf", BODY)
+    requested = []
+    real_lookup = cache.lookup
+
+    def lookup_then_evict(url):
+        entry = real_lookup(url)
+        entry.path.unlink()
+        return entry
+
+    monkeypatch.setattr(cache, "lookup", lookup_then_evict)
+    monkeypatch.setattr(read_pdf, "get_pdf_cache", lambda: cache)
+    monkeypatch.setattr(read_pdf._session, "get", lambda url, **kwargs: requested.append(kwargs["headers"]) or FakeResponse(BODY))
+    with read_pdf.download_pdf("https://a.example/1.pdf") as (sha256, source):
+        assert Path(source).read_bytes() == BODY
+    # Downloaded afresh, without revalidation headers for the lost copy
+    assert requested == [{}]
+    assert cache.stats()["misses"] == 1
@@ -0,0 +1,77 @@
+# test_pdf_extract.py - When page extraction uses the process pool, and page specs
+import io
+
+import PyPDF2
+import pytest
+
+import pdf_extract
+from pdf_extract import extract_pdf_pages, iter_pdf_pages, parse_page_spec
+
+
+def blank_pdf(pages: int) -> bytes:
+    writer = PyPDF2.PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=200, height=200)
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+@pytest.fixture
+def no_pool(monkeypatch):
+    def fail():
+        raise AssertionError("process pool must not be used")
+    monkeypatch.setattr(pdf_extract, "get_extract_pool", fail)
+    monkeypatch.setattr(pdf_extract, "PDF_EXTRACT_WORKERS", 4)
+    monkeypatch.setattr(pdf_extract, "PDF_PARALLEL_MIN_PAGES", 24)
+
+
+@pytest.mark.parametrize("parallel", [None, True, False])
+def test_small_documents_stay_in_process(no_pool, tmp_path, parallel):
+    path = tmp_path / "small.pdf"
+    path.write_bytes(blank_pdf(2))
+    assert len(extract_pdf_pages(str(path), parallel=parallel)) == 2
+
+
+def test_single_worker_never_uses_the_pool(no_pool, tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_extract, "PDF_EXTRACT_WORKERS", 1)
+    path = tmp_path / "big.pdf"
+    path.write_bytes(blank_pdf(30))
+    assert len(extract_pdf_pages(str(path), parallel=True)) == 30
+
+
+def test_large_documents_use_the_pool_in_page_order(tmp_path, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    monkeypatch.setattr(pdf_extract, "PDF_EXTRACT_WORKERS", 3)
+    monkeypatch.setattr(pdf_extract, "PDF_PARALLEL_MIN_PAGES", 4)
+    submitted = []
+
+    class RecordingPool(ThreadPoolExecutor):
+        def submit(self, fn, *args):
+            submitted.append(args[1:])
+            return super().submit(fn, *args)
+
+    pool = RecordingPool(3)
+    monkeypatch.setattr(pdf_extract, "get_extract_pool", lambda: pool)
+    path = tmp_path / "big.pdf"
+    path.write_bytes(blank_pdf(7))
+    assert len(extract_pdf_pages(str(path))) == 7
+    assert submitted == [(0, 3), (3, 6), (6, 7)]
+    pool.shutdown()
+
+
+def test_parse_page_spec():
+    assert parse_page_spec("1-3, 5,3") == [0, 1, 2, 4]
+    assert parse_page_spec("4-4,,2") == [1, 3]
+    for bad in ("0", "0-2", "3-1", "5-3", "a", "", ",", "1-", "-2", "1-2-3", "1-5001"):
+        with pytest.raises(ValueError):
+            parse_page_spec(bad)
+
+
+def test_out_of_range_pages_are_skipped(tmp_path):
+    path = tmp_path / "three.pdf"
+    path.write_bytes(blank_pdf(3))
+    # parse_page_spec does not know the page count; extraction drops what is not there
+    assert [i for i, _ in iter_pdf_pages(str(path), parse_page_spec("2,3-9"))] == [1, 2]
+    assert list(iter_pdf_pages(str(path), parse_page_spec("7"))) == []
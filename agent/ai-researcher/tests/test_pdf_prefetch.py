@@ -0,0 +1,115 @@
+# test_pdf_prefetch.py - Prefetch scheduling, and cancellation when a chat run ends
+import asyncio
+import importlib
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessage
+
+import pdf_prefetch
+from pdf_prefetch import PdfPrefetcher
+
+
+class BlockingReader:
+    """Stand in for read_full_paper: records each URL, then blocks until released"""
+
+    def __init__(self):
+        self.urls = []
+        self.release = threading.Event()
+
+    def __call__(self, url):
+        self.urls.append(url)
+        self.release.wait(5)
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    reader = BlockingReader()
+    monkeypatch.setattr(pdf_prefetch, "_cached_text", lambda url: None)
+    monkeypatch.setattr(pdf_prefetch, "read_full_paper", reader)
+    yield reader
+    reader.release.set()
+
+
+def test_urls_are_prefetched_once_across_conversations(reads):
+    async def run():
+        prefetcher = PdfPrefetcher(concurrency=2)
+        assert prefetcher.schedule("a", ["u1", "u2", "u1"]) == 2
+        assert prefetcher.schedule("b", ["u2", "u3"]) == 1
+        reads.release.set()
+        await prefetcher.wait_for(["u1", "u2", "u3"], timeout=5)
+        await asyncio.sleep(0)
+        return prefetcher.stats()
+
+    stats = asyncio.run(run())
+    assert sorted(reads.urls) == ["u1", "u2", "u3"]
+    assert (stats["scheduled"], stats["completed"], stats["pending"]) == (3, 3, 0)
+
+
+def test_cancel_drops_queued_prefetches_of_one_conversation(reads):
+    async def run():
+        prefetcher = PdfPrefetcher(concurrency=1)
+        prefetcher.schedule("a", ["u1", "u2"])
+        prefetcher.schedule("b", ["u3"])
+        while not reads.urls:
+            await asyncio.sleep(0.01)
+        prefetcher.cancel("a")
+        await asyncio.sleep(0)
+        reads.release.set()
+        await prefetcher.wait_for(["u3"], timeout=5)
+        await asyncio.sleep(0)
+        return prefetcher.stats()
+
+    stats = asyncio.run(run())
+    # u1 was already downloading and finishes in its thread; u2 never starts
+    assert reads.urls == ["u1", "u3"]
+    assert stats["cancelled"] == 2 and stats["completed"] == 1 and stats["pending"] == 0
+
+
+class FakeGraph:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+
+    async def astream(self, input_data, config, stream_mode=None):
+        if self.fail:
+            raise RuntimeError("model error")
+        yield {"messages": [AIMessage(content="done")]}
+
+    async def astream_events(self, input_data, config, version=None):
+        if self.fail:
+            raise RuntimeError("model error")
+        yield {"event": "on_chat_model_stream", "data": {"chunk": AIMessage(content="done")}}
+
+
+class RecordingPrefetcher:
+    def __init__(self):
+        self.cancelled = []
+
+    def cancel(self, thread_id):
+        self.cancelled.append(thread_id)
+
+
+@pytest.fixture
+def chat(monkeypatch):
+    monkeypatch.setenv("GOOGLE_API_KEY", "test")
+    main = importlib.import_module("main")
+    prefetcher = RecordingPrefetcher()
+    monkeypatch.setattr(main, "get_prefetcher", lambda: prefetcher)
+    monkeypatch.setattr(main, "load_conversation_history", lambda conversation_id: [])
+
+    def post(path: str, fail: bool = False):
+        monkeypatch.setattr(main, "graph", FakeGraph(fail))
+        body = {"user_id": "u", "conversation_id": "conv-1", "message": "hi"}
+        return TestClient(main.app).post(path, json=body)
+
+    post.prefetcher = prefetcher
+    return post
+
+
+@pytest.mark.parametrize("path", ["/api/chat", "/api/chat/stream"])
+@pytest.mark.parametrize("fail", [False, True])
+def test_chat_run_cancels_its_prefetches_when_it_ends(chat, path, fail):
+    response = chat(path, fail=fail)
+    assert response.status_code == (500 if fail and path == "/api/chat" else 200)
+    assert chat.prefetcher.cancelled == ["conv-1"]
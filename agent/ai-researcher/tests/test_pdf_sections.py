@@ -0,0 +1,95 @@
+# test_pdf_sections.py - Heading detection, section extraction and outline-based page narrowing
+import pytest
+
+from pdf_sections import classify_heading, find_sections, list_headings, normalize_section_name, outline_pages
+
+PAGES = [
+    "A Great Paper\nAbstract—We propose a method.\n1 Introduction\nWhy it matters.",
+    "2 Methodology\nWe do things.\nMore method.",
+    "3 Results\nIt works.\n4 Conclusion\nDone.",
+    "References\n[1] Someone.",
+]
+
+
+@pytest.mark.parametrize("name, section", [
+    ("Methodology", "method"),
+    ("related work", "related_work"),
+    ("related_work", "related_work"),
+    (" RESULTS ", "results"),
+    ("chapter 9", None),
+])
+def test_normalize_section_name(name, section):
+    assert normalize_section_name(name) == section
+
+
+@pytest.mark.parametrize("line, section", [
+    ("3 Method", "method"),
+    ("III. EXPERIMENTS", "experiments"),
+    ("A Appendix", "appendix"),
+    ("Conclusions and future work", "conclusion"),
+    ("5 Scaling Laws", "other"),
+    ("scaling laws", None),
+    ("We use the method of Smith et al. (2020), which is standard.", None),
+])
+def test_classify_heading(line, section):
+    assert classify_heading(line) == section
+
+
+def test_find_sections_including_inline_abstract():
+    found = find_sections(enumerate(PAGES), {"abstract", "method"})
+    assert found == {"abstract": "We propose a method.", "method": "We do things.\nMore method."}
+
+
+def test_find_sections_stops_reading_after_the_last_wanted_section():
+    consumed = []
+
+    def pages():
+        for i, text in enumerate(PAGES):
+            consumed.append(i)
+            yield i, text
+
+    assert find_sections(pages(), {"method"}) == {"method": "We do things.\nMore method."}
+    assert consumed == [0, 1, 2]
+
+
+def test_missing_sections_are_left_out():
+    assert find_sections(enumerate(PAGES), {"discussion", "results"}) == {"results": "It works."}
+
+
+def test_list_headings():
+    assert list_headings(enumerate(PAGES)) == [
+        "Abstract", "1 Introduction", "2 Methodology", "3 Results", "4 Conclusion", "References",
+    ]
+
+
+class Bookmark:
+    def __init__(self, title: str, page: int):
+        self.title = title
+        self.page = page
+
+
+class FakeReader:
+    def __init__(self, outline, num_pages: int = 10):
+        self.outline = outline
+        self.pages = [None] * num_pages
+
+    def get_destination_page_number(self, item):
+        return item.page
+
+
+def test_outline_pages_span_each_wanted_section():
+    reader = FakeReader([
+        Bookmark("1 Introduction", 0),
+        Bookmark("2 Method", 2),
+        [Bookmark("2.1 Details", 3)],
+        Bookmark("3 Results", 5),
+        Bookmark("References", 8),
+    ])
+    # Up to and including the first page of the next top-level section
+    assert outline_pages(reader, {"method"}) == [2, 3, 4, 5]
+    assert outline_pages(reader, {"abstract", "references"}) == [0, 8, 9]
+
+
+def test_outline_without_wanted_sections_is_unusable():
+    assert outline_pages(FakeReader([Bookmark("1 Introduction", 0)]), {"results"}) is None
+    assert outline_pages(FakeReader([]), {"results"}) is None
@@ -0,0 +1,63 @@
+# test_pdf_text_cache.py - Memory-mapped extracted-text cache
+import mmap
+import os
+from pathlib import Path
+
+import pdf_text_cache
+from pdf_text_cache import PdfTextCache
+
+SHA_A = "aa" + "0" * 62
+SHA_B = "bb" + "0" * 62
+
+
+def test_round_trip_by_page(tmp_path):
+    cache = PdfTextCache(tmp_path)
+    cache.put(SHA_A, ["first page", "zweite Seite ü", ""])
+    with cache.get(SHA_A) as text:
+        assert text.page_count == 3
+        assert text.page(1) == "zweite Seite ü"
+        assert text.pages(0, 2) == ["first page", "zweite Seite ü"]
+        assert text.text() == "first page\nzweite Seite ü"
+    assert cache.stats()["hits"] == 1
+
+
+def test_corrupt_file_is_a_miss_and_closes_the_mapping(tmp_path, monkeypatch):
+    cache = PdfTextCache(tmp_path)
+    path = cache.put(SHA_A, ["x" * 100] * 3)
+    # Header says 3 pages, but the offsets table is cut short
+    path.write_bytes(path.read_bytes()[:14])
+
+    opened = []
+    real_mmap = mmap.mmap
+
+    def tracking_mmap(*args, **kwargs):
+        m = real_mmap(*args, **kwargs)
+        opened.append(m)
+        return m
+
+    monkeypatch.setattr(pdf_text_cache.mmap, "mmap", tracking_mmap)
+    assert cache.get(SHA_A) is None
+    assert opened and all(m.closed for m in opened)
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = PdfTextCache(tmp_path, max_bytes=600)
+    old = cache.put(SHA_A, ["a" * 400])
+    os.utime(old, (1, 1))
+    cache.put(SHA_B, ["b" * 400])
+    assert cache.get(SHA_A) is None
+    assert cache.get(SHA_B) is not None
+
+
+def test_eviction_tolerates_files_removed_by_another_process(tmp_path, monkeypatch):
+    cache = PdfTextCache(tmp_path, max_bytes=600)
+    gone = cache.put(SHA_A, ["a" * 400])
+    real_stat = Path.stat
+
+    def racing_stat(self, *args, **kwargs):
+        if self == gone:
+            raise FileNotFoundError(self)
+        return real_stat(self, *args, **kwargs)
+
+    monkeypatch.setattr(Path, "stat", racing_stat)
+    cache.put(SHA_B, ["b" * 400])
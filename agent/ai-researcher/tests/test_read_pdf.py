@@ -0,0 +1,129 @@
+# test_read_pdf.py - Page and section selection in read_pdf, and batched reads with read_pdfs
+import asyncio
+import io
+
+import PyPDF2
+import pytest
+
+import read_pdf
+from pdf_text_cache import PdfTextCache
+from read_pdf import iter_pdf_text, read_pdf_content
+
+URL = "https://example.org/paper.pdf"
+PAGES = [
+    "A Great Paper\nAbstract\nWe propose a method.\n1 Introduction\nWhy it matters.",
+    "More introduction.\n2 Method\nMethod on page two.",
+    "Method on page three.\n3 Results\nIt works.",
+    "4 Conclusion\nDone.",
+]
+
+
+def blank_pdf(pages: int) -> bytes:
+    writer = PyPDF2.PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=200, height=200)
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+class FakeResponse:
+    status_code = 200
+    ok = True
+    headers = {}
+
+    def __init__(self, body: bytes):
+        self.body = body
+
+    def iter_content(self, chunk_size):
+        yield self.body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def cached_text(tmp_path, monkeypatch):
+    """Serve PAGES as the already-extracted text of URL"""
+    text_cache = PdfTextCache(tmp_path / "text")
+    text_cache.put("sha", PAGES)
+    monkeypatch.setattr(read_pdf, "_cached_text", lambda url: ("sha", text_cache.get("sha")))
+
+
+@pytest.fixture
+def uncached(monkeypatch):
+    """Download a three-page PDF with no caches in play; returns the requested URLs"""
+    requested = []
+    monkeypatch.setattr(read_pdf, "get_pdf_cache", lambda: None)
+    monkeypatch.setattr(read_pdf, "get_text_cache", lambda: None)
+    monkeypatch.setattr(read_pdf._session, "get", lambda url, **kwargs: requested.append(url) or FakeResponse(blank_pdf(3)))
+    return requested
+
+
+def test_iter_pdf_text_slices_cached_text(cached_text):
+    assert [i for i, _ in iter_pdf_text(URL)] == [0, 1, 2, 3]
+    assert list(iter_pdf_text(URL, pages=[3, 1, 1, 9])) == [(1, PAGES[1]), (3, PAGES[3])]
+
+
+def test_iter_pdf_text_extracts_only_requested_pages(uncached):
+    assert [i for i, _ in iter_pdf_text(URL, pages=[2, 0, 5])] == [0, 2]
+    assert uncached == [URL]
+
+
+def test_sections_within_pages_are_intersected(cached_text):
+    assert read_pdf_content(URL, sections=["method"]) == "## Method\nMethod on page two.\nMethod on page three."
+    # Only the part of the section inside the page range is returned
+    assert read_pdf_content(URL, pages="2", sections=["method"]) == "## Method\nMethod on page two."
+
+
+def test_section_outside_the_pages_is_reported(cached_text):
+    text = read_pdf_content(URL, pages="3-4", sections=["abstract", "conclusion"])
+    assert text.startswith("## Conclusion\nDone.")
+    assert "(Sections not found on pages 3-4: abstract; try other `pages`)" in text
+
+
+def test_pages_outside_the_document(cached_text):
+    assert read_pdf_content(URL, pages="4-6") == f"[Page 4]\n{PAGES[3]}"
+    assert read_pdf_content(URL, pages="7") == "(No pages 7 in this document)"
+    with pytest.raises(ValueError):
+        read_pdf_content(URL, pages="5-3", sections=["method"])
+
+
+@pytest.fixture
+def fake_reads(monkeypatch):
+    """Stand in for read_pdf_content; URLs containing "bad" fail. Returns the calls made."""
+    calls = []
+
+    def read_pdf_content(url, pages=None, sections=None, parallel=None):
+        calls.append((url, sections))
+        if "bad" in url:
+            raise ValueError(f"Failed to download PDF: 404 from {url}")
+        return f"text of {url}"
+
+    monkeypatch.setattr(read_pdf, "read_pdf_content", read_pdf_content)
+    return calls
+
+
+def test_read_pdfs_reads_duplicates_once_and_isolates_errors(fake_reads):
+    urls = ["https://a.example/1.pdf", "https://bad.example/2.pdf", "https://a.example/1.pdf", "https://a.example/3.pdf"]
+    result = asyncio.run(read_pdf.read_pdfs.ainvoke({"urls": urls, "sections": ["abstract"]}))
+    assert sorted(fake_reads) == sorted([
+        ("https://a.example/1.pdf", ["abstract"]),
+        ("https://bad.example/2.pdf", ["abstract"]),
+        ("https://a.example/3.pdf", ["abstract"]),
+    ])
+    assert result == "\n\n".join([
+        "=== [1] https://a.example/1.pdf ===\ntext of https://a.example/1.pdf",
+        "=== [2] https://bad.example/2.pdf ===\nERROR: Failed to download PDF: 404 from https://bad.example/2.pdf",
+        "=== [3] https://a.example/3.pdf ===\ntext of https://a.example/3.pdf",
+    ])
+
+
+def test_read_pdfs_limits_the_batch(fake_reads, monkeypatch):
+    monkeypatch.setattr(read_pdf, "READ_PDFS_MAX_URLS", 2)
+    result = asyncio.run(read_pdf.read_pdfs.ainvoke({"urls": ["u1", "u2", "u3"]}))
+    assert result == "Too many URLs (3); read at most 2 per call."
+    assert fake_reads == []
@@ -0,0 +1,167 @@
+# test_resumable_upload.py - TUS uploads against an in-process fake server
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import resumable_upload
+from resumable_upload import TusUploader, UploadSessionExpired
+
+CHUNK = 1024
+
+
+class FakeTusServer(ThreadingHTTPServer):
+    """Minimal TUS 1.0 server: sessions in memory, scriptable PATCH failures"""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeTusHandler)
+        self.sessions: dict[str, bytearray] = {}
+        self.creates = 0
+        self.patches = 0
+        # Per PATCH number (1-based): "error" answers 500, "expire" forgets the session first
+        self.faults: dict[int, str] = {}
+
+    @property
+    def endpoint(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/upload/resumable"
+
+
+class FakeTusHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, headers: dict = None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        self.server.creates += 1
+        session = f"s{self.server.creates}"
+        self.server.sessions[session] = bytearray()
+        self._reply(201, {"Location": f"/upload/resumable/{session}"})
+
+    def do_HEAD(self):
+        data = self.server.sessions.get(self.path.rsplit("/", 1)[-1])
+        if data is None:
+            self._reply(404)
+        else:
+            self._reply(200, {"Upload-Offset": str(len(data))})
+
+    def do_PATCH(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.patches += 1
+        session = self.path.rsplit("/", 1)[-1]
+        fault = self.server.faults.get(self.server.patches)
+        if fault == "expire":
+            self.server.sessions.pop(session, None)
+        if fault in ("error", "expire"):
+            self._reply(500)
+            return
+        data = self.server.sessions.get(session)
+        if data is None:
+            self._reply(404)
+        elif int(self.headers["Upload-Offset"]) != len(data):
+            self._reply(409)
+        else:
+            data += body
+            self._reply(204, {"Upload-Offset": str(len(data))})
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(resumable_upload.time, "sleep", lambda seconds: None)
+    fake = FakeTusServer()
+    thread = threading.Thread(target=fake.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield fake
+    fake.shutdown()
+    fake.server_close()
+
+
+@pytest.fixture
+def payload(tmp_path):
+    path = tmp_path / "paper.pdf"
+    path.write_bytes(bytes(range(256)) * 14)  # 3.5 chunks
+    return path
+
+
+def uploader(server, **kwargs) -> TusUploader:
+    return TusUploader(server.endpoint, headers={}, chunk_size=CHUNK, session=requests.Session(), **kwargs)
+
+
+def test_uploads_in_chunks(server, payload):
+    sessions = []
+    url = uploader(server).upload(payload, {"objectName": "u/paper.pdf"}, on_session=sessions.append)
+    assert sessions == [url]
+    assert server.sessions["s1"] == payload.read_bytes()
+    assert server.creates == 1 and server.patches == 4
+
+
+def test_resumes_from_the_offset_after_a_server_error(server, payload):
+    server.faults = {2: "error"}
+    tus = uploader(server)
+    tus.upload(payload, {})
+    assert server.sessions["s1"] == payload.read_bytes()
+    assert server.creates == 1 and tus.retries == 1
+
+
+def test_stored_session_continues_in_a_new_attempt(server, payload):
+    server.faults = {3: "error"}
+    sessions = []
+    with pytest.raises(requests.HTTPError):
+        uploader(server, max_retries=0).upload(payload, {}, on_session=sessions.append)
+    assert len(server.sessions["s1"]) == 2 * CHUNK
+
+    # A later attempt (e.g. the outbox retrying) continues the recorded session
+    uploader(server).upload(payload, {}, upload_url=sessions[-1])
+    assert server.creates == 1
+    assert server.sessions["s1"] == payload.read_bytes()
+    assert server.patches == 3 + 2
+
+
+def test_expired_stored_session_starts_over(server, payload):
+    sessions = []
+    uploader(server).upload(payload, {}, upload_url=f"{server.endpoint}/gone", on_session=sessions.append)
+    assert server.creates == 1 and sessions == [f"{server.endpoint}/s1"]
+    assert server.sessions["s1"] == payload.read_bytes()
+
+
+def test_session_expiring_during_the_offset_check_is_recreated(server, payload):
+    # The PATCH fails and the session is gone when the retry asks for the offset
+    server.faults = {2: "expire"}
+    sessions = []
+    uploader(server).upload(payload, {}, on_session=sessions.append)
+    assert server.creates == 2 and len(sessions) == 2
+    assert server.sessions["s2"] == payload.read_bytes()
+
+
+def test_second_expiry_gives_up(server, payload):
+    server.faults = {1: "expire", 2: "expire"}
+    with pytest.raises(UploadSessionExpired):
+        uploader(server).upload(payload, {})
+
+
+@pytest.mark.parametrize("faults, succeeds", [({}, True), ({1: "expire", 2: "expire"}, False)])
+def test_upload_resumable_closes_its_session(server, payload, monkeypatch, faults, succeeds):
+    sessions = []
+
+    class RecordingSession(requests.Session):
+        def __init__(self):
+            super().__init__()
+            self.closed = False
+            sessions.append(self)
+
+        def close(self):
+            self.closed = True
+            super().close()
+
+    server.faults = faults
+    monkeypatch.setattr(resumable_upload.requests, "Session", RecordingSession)
+    supabase_url = f"http://127.0.0.1:{server.server_address[1]}"
+    ok, error = resumable_upload.upload_resumable(supabase_url, "key", "papers", "u/paper.pdf", str(payload))
+    assert ok is succeeds and (error is None) is succeeds
+    assert len(sessions) == 1 and sessions[0].closed
@@ -0,0 +1,148 @@
+# test_supabase_async.py - Listing, bulk signing and bulk deletion against a mock Storage API
+import asyncio
+import importlib
+import json
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import paper_download
+import supabase_async
+from paper_download import ServedPdfCache
+from supabase_async import AsyncSupabaseStorage
+
+USER = "user-1"
+
+
+class FakeStorageApi:
+    """One folder of objects behind the list, sign and delete routes"""
+
+    def __init__(self, names):
+        self.objects = {f"{USER}/{name}": i for i, name in enumerate(names)}
+        self.list_calls = 0
+        self.after_list = None  # hook run after each list request
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        bucket = supabase_async.BUCKET_NAME
+        body = json.loads(request.content) if request.content else {}
+        if request.url.path == f"/storage/v1/object/list/{bucket}":
+            self.list_calls += 1
+            # A subfolder sorts in with the objects and is listed without an id
+            names = sorted(["drafts"] + [path.split("/", 1)[1] for path in self.objects if path.startswith(body["prefix"])])
+            page = names[body["offset"]:body["offset"] + body["limit"]]
+            entries = [
+                {"name": name, "id": None} if name == "drafts" else
+                {"name": name, "id": f"id-{name}", "metadata": {"size": 100 + self.objects[f"{USER}/{name}"]}}
+                for name in page
+            ]
+            if self.after_list:
+                self.after_list(self)
+            return httpx.Response(200, json=entries)
+        if request.url.path == f"/storage/v1/object/sign/{bucket}":
+            return httpx.Response(200, json=[
+                {"path": path, "signedURL": f"/object/sign/{bucket}/{path}?token=t", "error": None}
+                for path in body["paths"]
+            ])
+        if request.method == "DELETE" and request.url.path == f"/storage/v1/object/{bucket}":
+            removed = [path for path in body["prefixes"] if self.objects.pop(path, None) is not None]
+            return httpx.Response(200, json=[{"name": path} for path in removed])
+        return httpx.Response(404)
+
+
+NAMES = [f"paper_{i}.pdf" for i in range(5)]
+
+
+@pytest.fixture
+def api():
+    return FakeStorageApi(NAMES)
+
+
+@pytest.fixture
+def storage(api):
+    return AsyncSupabaseStorage("https://example.supabase.co", "service-key", transport=httpx.MockTransport(api))
+
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(paper_download, "_served_cache", ServedPdfCache(tmp_path / "served"))
+
+
+@pytest.fixture
+def client(monkeypatch, storage):
+    monkeypatch.setenv("GOOGLE_API_KEY", "test")
+    main = importlib.import_module("main")
+    monkeypatch.setattr(supabase_async, "get_async_storage", lambda: storage)
+    return TestClient(main.app)
+
+
+def collect(storage, **kwargs) -> list[str]:
+    async def run():
+        return [entry["name"] async for entry in storage.iter_user_pdfs(USER, **kwargs)]
+
+    return asyncio.run(run())
+
+
+def test_lists_every_page(storage, api):
+    assert collect(storage, page_size=2) == NAMES
+    # Six entries with the folder fill three pages; an empty fourth ends the listing
+    assert api.list_calls == 4
+
+
+def test_each_page_is_yielded_before_the_next_is_requested(storage, api):
+    async def list_calls_per_entry():
+        return [api.list_calls async for _ in storage.iter_user_pdfs(USER, page_size=2)]
+
+    # The folder entry takes a slot on the first page: drafts, paper_0 | paper_1, paper_2 | paper_3, paper_4
+    assert asyncio.run(list_calls_per_entry()) == [1, 2, 2, 3, 3]
+
+
+def test_collecting_names_before_deleting_skips_nothing(storage, api):
+    async def delete_all():
+        names = [entry["name"] async for entry in storage.iter_user_pdfs(USER, page_size=2)]
+        return await storage.delete_pdfs(USER, names)
+
+    deleted, error = asyncio.run(delete_all())
+    assert deleted == NAMES and error is None
+    assert api.objects == {}
+
+
+def test_object_created_between_pages_is_not_repeated(storage, api):
+    def create_first_once(fake):
+        fake.after_list = None
+        fake.objects[f"{USER}/a_new.pdf"] = 99
+
+    api.after_list = create_first_once
+    names = collect(storage, page_size=2)
+    assert len(names) == len(set(names))
+    assert set(NAMES) <= set(names)
+
+
+def test_bad_sort_option_is_rejected(storage):
+    with pytest.raises(ValueError):
+        collect(storage, sort_by="size")
+
+
+def test_list_endpoint_signs_in_bulk(client):
+    response = client.get("/api/papers/storage", params={"user_id": USER, "signed": "true"})
+    assert response.status_code == 200
+    papers = response.json()["papers"]
+    assert [paper["filename"] for paper in papers] == NAMES
+    assert papers[0]["size"] == 100
+    assert papers[0]["url"].startswith("https://example.supabase.co/storage/v1/object/sign/")
+    assert papers[0]["url"].endswith("&download=")
+
+    response = client.get("/api/papers/storage", params={"user_id": USER, "sort_by": "size"})
+    assert response.status_code == 400
+
+
+def test_delete_endpoint(client, api):
+    paper_download.signed_url_cache.put(USER, NAMES[0], "https://signed", 3600, 0)
+    response = client.post("/api/papers/delete", json={"user_id": USER, "filenames": [NAMES[0], "missing.pdf"]})
+    assert response.json() == {"deleted": [NAMES[0]], "count": 1, "requested": 2, "error": None}
+    assert paper_download.signed_url_cache.get(USER, NAMES[0]) is None
+
+    # There is no delete-all: the names are required and must not be empty
+    for body in ({"user_id": USER}, {"user_id": USER, "filenames": []}, {"user_id": USER, "filenames": None}):
+        assert client.post("/api/papers/delete", json=body).status_code == 422
+    assert len(api.objects) == len(NAMES) - 1
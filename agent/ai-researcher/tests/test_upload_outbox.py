@@ -0,0 +1,125 @@
+# test_upload_outbox.py - Claiming, retrying and advancing outbox jobs
+import sqlite3
+import time
+
+import httpx
+
+import supabase_async
+from supabase_async import AsyncSupabaseStorage
+from upload_outbox import UploadOutbox
+
+
+def make_outbox(path, **kwargs) -> UploadOutbox:
+    outbox = UploadOutbox(path, base_delay=10, **kwargs)
+    # Workers are driven by hand; no background thread
+    outbox._upload = lambda job: (True, f"{job['user_id']}/{job['filename']}")
+    outbox._notify = lambda job: (True, None)
+    return outbox
+
+
+def job_row(outbox: UploadOutbox, job_id: int) -> dict:
+    cursor = outbox._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+    return dict(zip((column[0] for column in cursor.description), cursor.fetchone()))
+
+
+def test_only_one_worker_claims_a_job(tmp_path):
+    first = make_outbox(tmp_path / "outbox.sqlite3")
+    second = make_outbox(tmp_path / "outbox.sqlite3")
+    job_id = first.enqueue("user", "paper.pdf", tmp_path / "paper.pdf", "Paper")
+    job = first._next_due()
+    assert job["id"] == job_id and job["lease_owner"] == first.owner
+    assert second._next_due() is None
+    assert second._seconds_until_due() > 0
+
+
+def test_expired_lease_is_reclaimed_and_fences_the_old_owner(tmp_path):
+    crashed = make_outbox(tmp_path / "outbox.sqlite3", lease=-1)
+    other = make_outbox(tmp_path / "outbox.sqlite3")
+    job_id = crashed.enqueue("user", "paper.pdf", tmp_path / "paper.pdf", "Paper")
+    stale = crashed._next_due()
+    job = other._next_due()
+    assert job["id"] == job_id and job["lease_owner"] == other.owner
+    # The worker whose lease expired can no longer move the job on
+    assert crashed._advance(stale, "notify", supabase_path="user/paper.pdf") is False
+    other._process(job)
+    row = job_row(other, job_id)
+    assert row["stage"] == "done" and row["lease_owner"] is None
+    assert row["supabase_path"] == "user/paper.pdf"
+
+
+def test_failed_stage_is_retried_with_backoff_then_given_up(tmp_path):
+    outbox = make_outbox(tmp_path / "outbox.sqlite3", max_attempts=2)
+    outbox._notify = lambda job: (False, "backend down")
+    job_id = outbox.enqueue("user", "paper.pdf", tmp_path / "paper.pdf", "Paper")
+    outbox._process(outbox._next_due())
+    row = job_row(outbox, job_id)
+    # Upload succeeded; only notify is retried, and the claim is released
+    assert row["stage"] == "notify" and row["attempts"] == 1 and row["last_error"] == "backend down"
+    assert row["lease_until"] is None and row["next_attempt"] > time.time() + 5
+    assert outbox._next_due() is None
+
+    outbox._conn.execute("UPDATE jobs SET next_attempt = 0 WHERE id = ?", (job_id,))
+    outbox._process(outbox._next_due())
+    assert job_row(outbox, job_id)["stage"] == "failed"
+    assert outbox.stats()["failed_jobs"] == 1 and outbox.counters["uploaded"] == 0
+    assert [job["id"] for job in outbox.failed_jobs()] == [job_id]
+
+
+def test_resumable_session_is_kept_for_the_next_attempt(tmp_path):
+    outbox = make_outbox(tmp_path / "outbox.sqlite3")
+    job_id = outbox.enqueue("user", "paper.pdf", tmp_path / "paper.pdf", "Paper")
+    job = outbox._next_due()
+    assert job["upload_url"] is None
+    outbox._save_upload_url(job, "https://storage/upload/resumable/abc")
+    outbox._retry(job, "connection reset")
+    outbox._conn.execute("UPDATE jobs SET next_attempt = 0 WHERE id = ?", (job_id,))
+    assert outbox._next_due()["upload_url"] == "https://storage/upload/resumable/abc"
+
+
+def test_existing_database_gains_lease_columns(tmp_path):
+    path = tmp_path / "outbox.sqlite3"
+    conn = sqlite3.connect(str(path))
+    conn.execute(
+        """
+        CREATE TABLE jobs (
+            id INTEGER PRIMARY KEY, user_id TEXT NOT NULL, filename TEXT NOT NULL, pdf_path TEXT NOT NULL,
+            title TEXT NOT NULL, stage TEXT NOT NULL, supabase_path TEXT, attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt REAL NOT NULL, last_error TEXT, created REAL NOT NULL, updated REAL NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        "INSERT INTO jobs (user_id, filename, pdf_path, title, stage, next_attempt, created, updated)"
+        " VALUES ('user', 'old.pdf', '/tmp/old.pdf', 'Old', 'upload', 0, 0, 0)"
+    )
+    conn.commit()
+    conn.close()
+    outbox = make_outbox(path)
+    job = outbox._next_due()
+    assert job["filename"] == "old.pdf" and job["lease_owner"] == outbox.owner
+
+
+def test_upload_goes_through_the_async_client(tmp_path, monkeypatch):
+    requests_seen = []
+
+    def storage_api(request: httpx.Request) -> httpx.Response:
+        requests_seen.append((request.method, request.url.path))
+        return httpx.Response(200, json={})
+
+    def get_async_storage():
+        # Created on the worker's own event loop, as in production
+        return AsyncSupabaseStorage("https://example.supabase.co", "key", transport=httpx.MockTransport(storage_api))
+
+    monkeypatch.setattr(supabase_async, "get_async_storage", get_async_storage)
+    pdf = tmp_path / "paper.pdf"
+    pdf.write_bytes(b"%PDF-1.4 test")
+    outbox = UploadOutbox(tmp_path / "outbox.sqlite3")
+    outbox._notify = lambda job: (True, None)
+    job_id = outbox.enqueue("user", "paper.pdf", pdf, "Paper")
+    try:
+        outbox._process(outbox._next_due())
+    finally:
+        outbox._loop.close()
+    assert ("POST", f"/storage/v1/object/{supabase_async.BUCKET_NAME}/user/paper.pdf") in requests_seen
+    row = job_row(outbox, job_id)
+    assert row["stage"] == "done" and row["supabase_path"] == "user/paper.pdf"
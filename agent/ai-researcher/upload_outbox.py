@@ -0,0 +1,412 @@
+# upload_outbox.py - Durable background pipeline uploading generated PDFs
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import Optional
+
+import requests
+
+DEFAULT_OUTBOX_PATH = Path(__file__).parent / "cache" / "upload_outbox.sqlite3"
+
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BASE_DELAY = float(os.getenv("OUTBOX_BASE_DELAY", "2"))    # seconds, doubled per attempt
+OUTBOX_MAX_DELAY = float(os.getenv("OUTBOX_MAX_DELAY", "300"))
+OUTBOX_RETENTION = float(os.getenv("OUTBOX_RETENTION", str(7 * 24 * 3600)))  # keep finished jobs this long
+# How long a claimed job belongs to one worker; after that another may take it over
+OUTBOX_LEASE = float(os.getenv("OUTBOX_LEASE", "900"))
+
+# Job stages: upload -> notify -> done, or failed once attempts run out
+PENDING_STAGES = ("upload", "notify")
+
+# Columns added after the first release, created on existing databases at startup
+_ADDED_COLUMNS = {"lease_until": "REAL", "lease_owner": "TEXT", "upload_url": "TEXT"}
+
+
+class UploadOutbox:
+    """SQLite-backed queue of generated PDFs to upload and register.
+
+    render_latex_pdf only enqueues a job; a worker thread uploads the PDF to
+    Supabase and then POSTs its metadata to the backend. Uploads use
+    AsyncSupabaseStorage, the one client every upload in the app goes
+    through, on an event loop owned by the worker thread. Each stage is
+    retried with exponential backoff (so a failed notify does not upload
+    again), and because jobs live on disk, a restart resumes where it left
+    off. Recent events are kept in memory for monitoring.
+
+    Every uvicorn worker runs its own outbox thread on the same database.
+    A worker only processes a job after claiming it with a conditional
+    UPDATE that sets a lease; later updates are fenced on the claim token,
+    so two workers never upload or notify the same job at once. A lease
+    left behind by a crashed worker expires after `lease` seconds and the
+    job is picked up again.
+    """
+
+    def __init__(
+        self,
+        path: Path = DEFAULT_OUTBOX_PATH,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+        base_delay: float = OUTBOX_BASE_DELAY,
+        max_delay: float = OUTBOX_MAX_DELAY,
+        lease: float = OUTBOX_LEASE,
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease = lease
+        # Identifies this worker's claims; unique per process and instance
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.events: deque = deque(maxlen=200)
+        self.counters = {"enqueued": 0, "uploaded": 0, "notified": 0, "retried": 0, "failed": 0}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Created on first use by the worker thread; the async storage client is bound to it
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._conn = sqlite3.connect(str(self.path), timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                pdf_path TEXT NOT NULL,
+                title TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                supabase_path TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt REAL NOT NULL,
+                last_error TEXT,
+                created REAL NOT NULL,
+                updated REAL NOT NULL
+            )
+            """
+        )
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, sql_type in _ADDED_COLUMNS.items():
+            if column not in existing:
+                try:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {sql_type}")
+                except sqlite3.OperationalError as e:
+                    # Added concurrently by another worker process
+                    if "duplicate column" not in str(e):
+                        raise
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_due ON jobs(stage, next_attempt)")
+
+    def enqueue(self, user_id: str, filename: str, pdf_path: Path, title: str) -> int:
+        """Queue a generated PDF for upload and metadata registration"""
+        now = time.time()
+        with self._lock:
+            job_id = self._conn.execute(
+                """
+                INSERT INTO jobs (user_id, filename, pdf_path, title, stage, next_attempt, created, updated)
+                VALUES (?, ?, ?, ?, 'upload', ?, ?, ?)
+                """,
+                (user_id, filename, str(pdf_path), title, now, now, now),
+            ).lastrowid
+            self.counters["enqueued"] += 1
+        self._event(job_id, filename, "enqueued")
+        self._wake.set()
+        return job_id
+
+    # ---- worker ----
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="upload-outbox", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 5) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        try:
+            self._work()
+        finally:
+            if self._loop is not None:
+                from supabase_async import close_async_storage
+                self._loop.run_until_complete(close_async_storage())
+                self._loop.close()
+                self._loop = None
+
+    def _run_async(self, coroutine):
+        """Run a coroutine to completion on the worker's event loop"""
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(coroutine)
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            job = self._next_due()
+            if job is None:
+                self._prune()
+                self._wake.clear()
+                self._wake.wait(self._seconds_until_due())
+                continue
+            try:
+                self._process(job)
+            except Exception as e:
+                # Never let one bad job kill the worker
+                print(f"WARNING: Upload outbox job {job['id']} crashed: {e}")
+                self._retry(job, str(e))
+
+    def _next_due(self) -> Optional[dict]:
+        """Claim the next due job for this worker; None if nothing is due or unclaimed"""
+        stages = ", ".join("?" for _ in PENDING_STAGES)
+        with self._lock:
+            # Lost races retry with the next candidate
+            for _ in range(5):
+                now = time.time()
+                cursor = self._conn.execute(
+                    f"""
+                    SELECT * FROM jobs
+                    WHERE stage IN ({stages}) AND next_attempt <= ? AND (lease_until IS NULL OR lease_until < ?)
+                    ORDER BY next_attempt LIMIT 1
+                    """,
+                    (*PENDING_STAGES, now, now),
+                )
+                row = cursor.fetchone()
+                if row is None:
+                    return None
+                job = dict(zip((column[0] for column in cursor.description), row))
+                # Only one worker's UPDATE can match; the others see rowcount 0
+                claimed = self._conn.execute(
+                    """
+                    UPDATE jobs SET lease_until = ?, lease_owner = ?
+                    WHERE id = ? AND stage = ? AND (lease_until IS NULL OR lease_until < ?)
+                    """,
+                    (now + self.lease, self.owner, job["id"], job["stage"], now),
+                ).rowcount
+                if claimed == 1:
+                    if job["lease_owner"] is not None and job["lease_owner"] != self.owner:
+                        print(f"[OUTBOX] Reclaimed {job['filename']} from expired lease of {job['lease_owner']}")
+                    return {**job, "lease_owner": self.owner}
+        return None
+
+    def _seconds_until_due(self) -> float:
+        with self._lock:
+            row = self._conn.execute(
+                f"""
+                SELECT MIN(MAX(next_attempt, COALESCE(lease_until, 0))) FROM jobs
+                WHERE stage IN ({', '.join('?' for _ in PENDING_STAGES)})
+                """,
+                PENDING_STAGES,
+            ).fetchone()
+        if row[0] is None:
+            return 60.0
+        return min(60.0, max(0.0, row[0] - time.time()))
+
+    def _process(self, job: dict) -> None:
+        if job["stage"] == "upload":
+            ok, detail = self._upload(job)
+            if not ok:
+                self._retry(job, detail)
+                return
+            if not self._advance(job, "notify", supabase_path=detail):
+                return
+            job = {**job, "stage": "notify", "supabase_path": detail, "attempts": 0}
+        ok, detail = self._notify(job)
+        if ok:
+            self._advance(job, "done")
+        else:
+            self._retry(job, detail)
+
+    def _upload(self, job: dict) -> tuple[bool, Optional[str]]:
+        """Upload step: (True, supabase_path or None) or (False, error)"""
+        return self._run_async(self._upload_async(job))
+
+    async def _upload_async(self, job: dict) -> tuple[bool, Optional[str]]:
+        try:
+            from supabase_async import get_async_storage
+        except ImportError:
+            get_async_storage = None
+        storage = get_async_storage() if get_async_storage else None
+        if storage is None:
+            # Not configured: nothing to upload, the PDF stays available locally
+            self._event(job["id"], job["filename"], "upload_skipped", "Supabase not configured")
+            return True, None
+        if not await storage.ensure_bucket_exists():
+            return False, "bucket check failed"
+        # Large files resume the resumable session of the previous attempt instead of starting over
+        success, error = await storage.upload_pdf(
+            pdf_path=job["pdf_path"],
+            user_id=job["user_id"],
+            filename=job["filename"],
+            upload_url=job["upload_url"],
+            on_session=lambda url: self._save_upload_url(job, url),
+        )
+        if not success:
+            return False, error
+        with self._lock:
+            self.counters["uploaded"] += 1
+        self._event(job["id"], job["filename"], "uploaded")
+        return True, f"{job['user_id']}/{job['filename']}"
+
+    def _save_upload_url(self, job: dict, upload_url: str) -> None:
+        """Remember the resumable session of a claimed job for its next attempt"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET upload_url = ?, updated = ? WHERE id = ? AND lease_owner = ?",
+                (upload_url, time.time(), job["id"], self.owner),
+            )
+
+    def _notify(self, job: dict) -> tuple[bool, Optional[str]]:
+        """Metadata step: register the paper with the backend"""
+        pdf_path = Path(job["pdf_path"])
+        backend_url = os.getenv("BACKEND_URL", "http://localhost:3001")
+        try:
+            response = requests.post(
+                f"{backend_url}/api/research/papers/metadata",
+                json={
+                    "user_id": job["user_id"],
+                    "filename": job["filename"],
+                    "title": job["title"],
+                    "supabase_path": job["supabase_path"],
+                    "file_size": pdf_path.stat().st_size if pdf_path.exists() else None,
+                },
+                headers={"x-internal-request": "true"},
+                timeout=5,
+            )
+        except requests.RequestException as e:
+            return False, f"metadata request failed: {e}"
+        if response.status_code != 200:
+            return False, f"metadata request returned {response.status_code}"
+        with self._lock:
+            self.counters["notified"] += 1
+        self._event(job["id"], job["filename"], "notified")
+        return True, None
+
+    def _advance(self, job: dict, stage: str, supabase_path: Optional[str] = None) -> bool:
+        """Move a claimed job to its next stage; False if the claim was lost to another worker"""
+        now = time.time()
+        # A job moving on to another pending stage stays claimed by this worker
+        lease_until = now + self.lease if stage in PENDING_STAGES else None
+        with self._lock:
+            updated = self._conn.execute(
+                """
+                UPDATE jobs SET stage = ?, supabase_path = COALESCE(?, supabase_path),
+                    attempts = 0, next_attempt = ?, last_error = NULL, updated = ?,
+                    lease_until = ?, lease_owner = ?
+                WHERE id = ? AND lease_owner = ?
+                """,
+                (stage, supabase_path, now, now, lease_until, self.owner if lease_until else None, job["id"], self.owner),
+            ).rowcount
+        if not updated:
+            self._event(job["id"], job["filename"], "claim_lost", f"{job['stage']} finished after the lease expired")
+            return False
+        if stage == "done":
+            self._event(job["id"], job["filename"], "done")
+        return True
+
+    def _retry(self, job: dict, error: Optional[str]) -> None:
+        attempts = job["attempts"] + 1
+        now = time.time()
+        if attempts >= self.max_attempts:
+            with self._lock:
+                updated = self._conn.execute(
+                    """
+                    UPDATE jobs SET stage = 'failed', attempts = ?, last_error = ?, updated = ?,
+                        lease_until = NULL, lease_owner = NULL
+                    WHERE id = ? AND lease_owner = ?
+                    """,
+                    (attempts, error, now, job["id"], self.owner),
+                ).rowcount
+                if updated:
+                    self.counters["failed"] += 1
+            if updated:
+                self._event(job["id"], job["filename"], "failed", f"{job['stage']}: {error}")
+                print(f"ERROR: Giving up on {job['stage']} of {job['filename']} after {attempts} attempts: {error}")
+            return
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        with self._lock:
+            updated = self._conn.execute(
+                """
+                UPDATE jobs SET attempts = ?, next_attempt = ?, last_error = ?, updated = ?,
+                    lease_until = NULL, lease_owner = NULL
+                WHERE id = ? AND lease_owner = ?
+                """,
+                (attempts, now + delay, error, now, job["id"], self.owner),
+            ).rowcount
+            if updated:
+                self.counters["retried"] += 1
+        if updated:
+            self._event(job["id"], job["filename"], "retry", f"{job['stage']} in {delay:.0f}s: {error}")
+
+    def _prune(self) -> None:
+        """Forget finished jobs older than OUTBOX_RETENTION"""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE stage IN ('done', 'failed') AND updated < ?",
+                (time.time() - OUTBOX_RETENTION,),
+            )
+
+    # ---- monitoring ----
+
+    def _event(self, job_id: int, filename: str, event: str, detail: Optional[str] = None) -> None:
+        self.events.append({"time": time.time(), "job": job_id, "filename": filename, "event": event, "detail": detail})
+        print(f"[OUTBOX] {event}: {filename}" + (f" ({detail})" if detail else ""))
+
+    def stats(self) -> dict:
+        with self._lock:
+            by_stage = dict(self._conn.execute("SELECT stage, COUNT(*) FROM jobs GROUP BY stage").fetchall())
+            claimed = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE lease_until >= ?", (time.time(),)).fetchone()[0]
+        return {
+            **self.counters,
+            "pending_upload": by_stage.get("upload", 0),
+            "pending_notify": by_stage.get("notify", 0),
+            "done": by_stage.get("done", 0),
+            "failed_jobs": by_stage.get("failed", 0),
+            "claimed": claimed,
+            "worker_alive": self._thread is not None and self._thread.is_alive(),
+        }
+
+    def recent_events(self, limit: int = 50) -> list[dict]:
+        return list(self.events)[-limit:]
+
+    def failed_jobs(self, limit: int = 50) -> list[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, filename, user_id, attempts, last_error, updated FROM jobs WHERE stage = 'failed' ORDER BY updated DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [dict(zip(("id", "filename", "user_id", "attempts", "last_error", "updated"), row)) for row in rows]
+
+
+# Global instance - lazy initialization
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox() -> Optional[UploadOutbox]:
+    """Get or create the upload outbox and start its worker (None if it cannot be opened)"""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            path = Path(os.getenv("OUTBOX_PATH", str(DEFAULT_OUTBOX_PATH)))
+            try:
+                _outbox = UploadOutbox(path)
+            except (sqlite3.Error, OSError) as e:
+                print(f"WARNING: Upload outbox unavailable at {path}: {e}")
+                return None
+            _outbox.start()
+        return _outbox
+
+
+def stop_outbox() -> None:
+    with _outbox_lock:
+        if _outbox is not None:
+            _outbox.stop()
@@ -2,21 +2,89 @@
 from langchain_core.tools import tool
 from datetime import datetime
 from pathlib import Path
-import subprocess
+import asyncio
 import shutil
 import os
 from typing import Optional
 
-# Import Supabase storage helper
+from latex_cache import get_compile_cache
+from latex_compiler import get_compile_scheduler, tectonic_version
+from latex_preflight import LatexCompileError, LatexValidationError, parse_tectonic_log, preflight_latex
+from upload_outbox import get_outbox
+
+# Import Supabase storage helper (uploads go through the async client, like the outbox)
 try:
-    from supabase_storage import get_storage
+    from supabase_async import get_async_storage
     SUPABASE_AVAILABLE = True
 except ImportError:
     SUPABASE_AVAILABLE = False
-    get_storage = None
+    get_async_storage = None
+
+async def _publish_pdf(final_pdf: Path, pdf_filename: str, topic: Optional[str], user_id: Optional[str], storage) -> None:
+    """Upload the PDF to Supabase and register its metadata with the backend.
+
+    Single attempt, used only when the upload outbox is unavailable.
+    """
+    # Step5: Upload to Supabase if enabled and user_id is provided
+    supabase_path = None
+    file_size = final_pdf.stat().st_size
+
+    if storage is not None and user_id:
+        try:
+            # Ensure bucket exists
+            await storage.ensure_bucket_exists()
+
+            # Upload to Supabase
+            success, error = await storage.upload_pdf(
+                pdf_path=str(final_pdf),
+                user_id=user_id,
+                filename=pdf_filename
+            )
+
+            if success:
+                supabase_path = f"{user_id}/{pdf_filename}"
+                print(f"SUCCESS: PDF uploaded to Supabase: {pdf_filename}")
+            else:
+                print(f"ERROR: Failed to upload to Supabase: {error}")
+
+        except Exception as upload_error:
+            print(f"WARNING: Supabase upload error (PDF still available locally): {upload_error}")
+
+    elif user_id:
+        print("INFO: Supabase not configured - PDF only available locally")
+
+    # Step6: Notify backend to save paper metadata
+    if user_id:
+        try:
+            import requests
+            backend_url = os.getenv("BACKEND_URL", "http://localhost:3001")
+
+            # Send metadata to backend
+            response = await asyncio.to_thread(
+                requests.post,
+                f"{backend_url}/api/research/papers/metadata",
+                json={
+                    "user_id": user_id,
+                    "filename": pdf_filename,
+                    "title": topic or "Research Paper",
+                    "supabase_path": supabase_path,
+                    "file_size": file_size
+                },
+                headers={"x-internal-request": "true"},
+                timeout=5
+            )
+
+            if response.status_code == 200:
+                print(f"SUCCESS: Paper metadata saved to database")
+            else:
+                print(f"WARNING: Failed to save paper metadata: {response.status_code}")
+
+        except Exception as metadata_error:
+            print(f"WARNING: Failed to save paper metadata (PDF still generated): {metadata_error}")
+
 
 @tool
-def render_latex_pdf(latex_content: str, topic: Optional[str] = None, user_id: Optional[str] = None, user_name: Optional[str] = None) -> str:
+async def render_latex_pdf(latex_content: str, topic: Optional[str] = None, user_id: Optional[str] = None, user_name: Optional[str] = None) -> str:
     """Render a LaTeX document to PDF and optionally upload to Supabase.
 
     Args:
@@ -32,15 +100,15 @@ def render_latex_pdf(latex_content: str, topic: Optional[str] = None, user_id: O
 
     # Get storage instance (lazy initialization)
     storage = None
-    if SUPABASE_AVAILABLE and get_storage:
+    if SUPABASE_AVAILABLE and get_async_storage:
         print(f"DEBUG: Attempting to get storage instance...")
-        storage = get_storage()
+        storage = get_async_storage()
         if storage is None:
-            print(f"DEBUG: get_storage() returned None - Supabase initialization failed")
+            print(f"DEBUG: get_async_storage() returned None - Supabase initialization failed")
         else:
             print(f"DEBUG: Storage instance obtained successfully")
     else:
-        print(f"DEBUG: SUPABASE_AVAILABLE={SUPABASE_AVAILABLE}, get_storage={get_storage}")
+        print(f"DEBUG: SUPABASE_AVAILABLE={SUPABASE_AVAILABLE}, get_async_storage={get_async_storage}")
 
     SUPABASE_ENABLED = storage is not None
     print(f"DEBUG: SUPABASE_ENABLED: {SUPABASE_ENABLED}")
@@ -49,6 +117,15 @@ def render_latex_pdf(latex_content: str, topic: Optional[str] = None, user_id: O
             "tectonic is not installed. Install it first on your system."
         )
 
+    # Catch structural errors in milliseconds instead of after a full tectonic run
+    diagnostics = preflight_latex(latex_content)
+    for warning in (d for d in diagnostics if d.severity == "warning"):
+        print(f"WARNING: LaTeX pre-flight: {warning}")
+    errors = [d for d in diagnostics if d.severity == "error"]
+    if errors:
+        print(f"LaTeX pre-flight rejected the document with {len(errors)} errors")
+        raise LatexValidationError(errors)
+
     try:
         # Step2: Create directory
         output_dir = Path("output").absolute()
@@ -69,76 +146,34 @@ def render_latex_pdf(latex_content: str, topic: Optional[str] = None, user_id: O
             pdf_filename = f"paper_{timestamp}.pdf"
         # Step4: Export as tex & pdf
         tex_file = output_dir / tex_filename
-        tex_file.write_text(latex_content)
-
-        result = subprocess.run(
-                    ["tectonic", tex_filename, "--outdir", str(output_dir)],
-                    cwd=output_dir,
-                    capture_output=True,
-                    text=True,
-                )
+        await asyncio.to_thread(tex_file.write_text, latex_content)
 
         final_pdf = output_dir / pdf_filename
-        if not final_pdf.exists():
-            raise FileNotFoundError("PDF file was not generated")
-
-        print(f"Successfully generated PDF at {final_pdf}")
-
-        # Step5: Upload to Supabase if enabled and user_id is provided
-        supabase_path = None
-        file_size = final_pdf.stat().st_size
-
-        if SUPABASE_ENABLED and user_id:
-            try:
-                # Ensure bucket exists
-                storage.ensure_bucket_exists()
-
-                # Upload to Supabase
-                success, error = storage.upload_pdf(
-                    pdf_path=str(final_pdf),
-                    user_id=user_id,
-                    filename=pdf_filename
-                )
+        compile_cache = get_compile_cache()
+        cache_key = compile_cache.key(latex_content, await tectonic_version()) if compile_cache else None
+        # Identical document and engine: reuse the earlier build under this topic's filename
+        if compile_cache and await asyncio.to_thread(compile_cache.restore, cache_key, final_pdf):
+            print(f"[LATEX CACHE] Reused compiled PDF for identical LaTeX ({cache_key[:12]})")
+        else:
+            # Compile on the shared scheduler so the event loop stays free
+            result = await get_compile_scheduler().compile(tex_filename, output_dir)
+            print(f"tectonic finished in {result.seconds:.1f}s (queued {result.waited:.1f}s)")
 
-                if success:
-                    supabase_path = f"{user_id}/{pdf_filename}"
-                    print(f"SUCCESS: PDF uploaded to Supabase: {pdf_filename}")
-                else:
-                    print(f"ERROR: Failed to upload to Supabase: {error}")
+            if not final_pdf.exists():
+                raise LatexCompileError(parse_tectonic_log(result.stderr + "\n" + result.stdout), result.stderr)
+            if result.returncode != 0:
+                print(f"WARNING: tectonic exited with {result.returncode} but produced a PDF")
+            if compile_cache and result.returncode == 0:
+                await asyncio.to_thread(compile_cache.put, cache_key, final_pdf)
 
-            except Exception as upload_error:
-                print(f"WARNING: Supabase upload error (PDF still available locally): {upload_error}")
+        print(f"Successfully generated PDF at {final_pdf}")
 
+        # Upload and metadata registration happen in the background with retries
+        outbox = get_outbox() if user_id else None
+        if outbox is not None:
+            await asyncio.to_thread(outbox.enqueue, user_id, pdf_filename, final_pdf, topic or "Research Paper")
         elif user_id:
-            print("INFO: Supabase not configured - PDF only available locally")
-
-        # Step6: Notify backend to save paper metadata
-        if user_id:
-            try:
-                import requests
-                backend_url = os.getenv("BACKEND_URL", "http://localhost:3001")
-
-                # Send metadata to backend
-                response = requests.post(
-                    f"{backend_url}/api/research/papers/metadata",
-                    json={
-                        "user_id": user_id,
-                        "filename": pdf_filename,
-                        "title": topic or "Research Paper",
-                        "supabase_path": supabase_path,
-                        "file_size": file_size
-                    },
-                    headers={"x-internal-request": "true"},
-                    timeout=5
-                )
-
-                if response.status_code == 200:
-                    print(f"SUCCESS: Paper metadata saved to database")
-                else:
-                    print(f"WARNING: Failed to save paper metadata: {response.status_code}")
-
-            except Exception as metadata_error:
-                print(f"WARNING: Failed to save paper metadata (PDF still generated): {metadata_error}")
+            await _publish_pdf(final_pdf, pdf_filename, topic, user_id, storage)
 
         return str(final_pdf)
 